@@ -0,0 +1,70 @@
+"""
+Count the memory allocated to evaluate each expression in the corpus
+with JEXL.evaluate, for every backend:
+
+- contexts: the number of Context objects created by one evaluation,
+  such as wrappers for the context data and scopes for relative
+  filters.
+- peak: the most memory, in bytes, held at once during one evaluation
+  on top of what was held before it, measured with tracemalloc.
+
+Run from the repository root with `python -m benchmarks.allocations`.
+"""
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+from benchmarks.corpus import CONTEXT, EXPRESSIONS, make_jexl
+from pyjexl.evaluator import Context
+from pyjexl.jexl import JEXL
+
+
+def peak_size(func):
+    """Return the peak number of bytes allocated while calling func()."""
+    func()  # Warm up any caches used by func.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def contexts_created(func):
+    """Return the number of Contexts created while calling func()."""
+    func()
+    created = [0]
+    init = Context.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created[0] += 1
+        init(self, *args, **kwargs)
+
+    Context.__init__ = counting_init
+    try:
+        func()
+    finally:
+        Context.__init__ = init
+    return created[0]
+
+
+def main():
+    print('{:<16} {:<12} {:>10} {:>10}'.format('expression', 'backend', 'contexts', 'peak'))
+    for name, expression in sorted(EXPRESSIONS.items()):
+        for backend in JEXL.backends:
+            jexl = make_jexl(backend=backend)
+
+            def evaluate():
+                return jexl.evaluate(expression, CONTEXT)
+
+            print('{:<16} {:<12} {:>10} {:>9}B'.format(
+                name, backend, contexts_created(evaluate), peak_size(evaluate)
+            ))
+
+
+if __name__ == '__main__':
+    main()
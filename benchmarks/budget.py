@@ -0,0 +1,47 @@
+"""
+Measure the overhead of evaluating with an EvaluationBudget compared
+with unbounded evaluation by the interpreter.
+
+Run from the repository root with `python -m benchmarks.budget`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from benchmarks.evaluate import CONTEXT, EXPRESSIONS
+from pyjexl.evaluator import EvaluationBudget
+from pyjexl.jexl import JEXL
+
+
+BUDGETS = {
+    'unbounded': None,
+    'limits': EvaluationBudget(
+        max_nodes=100000, max_filter_iterations=100000, max_collection_size=100000,
+        max_depth=100
+    ),
+    'timeout': EvaluationBudget(max_nodes=100000, timeout=1.0),
+}
+COLUMNS = ('unbounded', 'limits', 'timeout')
+
+
+def time_evaluate(budget, expression, number):
+    jexl = JEXL(budget=budget)
+    compiled = jexl.compile(expression)
+    compiled.evaluate(CONTEXT)  # Compile before timing.
+    timer = timeit.repeat(lambda: compiled.evaluate(CONTEXT), number=number, repeat=10)
+    return min(timer) / number
+
+
+def main():
+    print(('{:<12}' + ' {:>14}' * len(COLUMNS) + ' {:>10}').format(
+        'expression', *(COLUMNS + ('overhead',))
+    ))
+    for name, expression in sorted(EXPRESSIONS.items()):
+        times = [time_evaluate(BUDGETS[column], expression, 100) for column in COLUMNS]
+        print(('{:<12}' + ' {:>12.1f}us' * len(COLUMNS) + ' {:>9.0f}%').format(
+            name, *[time * 1e6 for time in times] + [(max(times[1:]) / times[0] - 1) * 100]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compare the memory used by parsed expressions as Node trees and in the
+compact form, and the time taken to evaluate them.
+
+Run from the repository root with `python -m benchmarks.compact`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from benchmarks.corpus import CONTEXT, EXPRESSIONS, make_jexl
+from benchmarks.suite import retained_size
+from pyjexl.compact import compact, CompactEvaluator
+from pyjexl.evaluator import Context, Evaluator
+
+
+def time_evaluate(evaluator, tree, number):
+    timer = timeit.repeat(
+        lambda: evaluator.evaluate(tree, Context(CONTEXT)), number=number, repeat=10
+    )
+    return min(timer) / number
+
+
+def main():
+    jexl = make_jexl(parser='pratt', cache_size=0)
+    evaluator = Evaluator(jexl.config)
+    compact_evaluator = CompactEvaluator(jexl.config)
+
+    print('{:<16} {:>10} {:>10} {:>8} {:>12} {:>12}'.format(
+        'expression', 'nodes', 'compact', 'saved', 'evaluate', 'compact'
+    ))
+    total_nodes = total_compact = 0
+    for name, expression in sorted(EXPRESSIONS.items()):
+        nodes = retained_size(lambda: jexl.parse(expression))
+        compacted = retained_size(lambda: compact(jexl.parse(expression)))
+        total_nodes += nodes
+        total_compact += compacted
+
+        ast = jexl.parse(expression)
+        print('{:<16} {:>9}B {:>9}B {:>7.0f}% {:>10.1f}us {:>10.1f}us'.format(
+            name, nodes, compacted, (1 - compacted / float(nodes)) * 100,
+            time_evaluate(evaluator, ast, 100) * 1e6,
+            time_evaluate(compact_evaluator, compact(ast), 100) * 1e6,
+        ))
+    print('{:<16} {:>9}B {:>9}B {:>7.0f}%'.format(
+        'total', total_nodes, total_compact, (1 - total_compact / float(total_nodes)) * 100
+    ))
+
+
+if __name__ == '__main__':
+    main()
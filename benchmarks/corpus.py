@@ -0,0 +1,100 @@
+"""
+A corpus of realistic expressions, with a context and transforms to
+evaluate them, shared by the benchmark suite.
+"""
+import hashlib
+
+from pyjexl.jexl import JEXL
+
+
+LOCALES = ['en-US', 'en-GB', 'de', 'fr', 'es-ES', 'es-MX', 'it', 'ja', 'pt-BR', 'ru', 'zh-CN']
+
+NORMANDY = {
+    'channel': 'release',
+    'locale': 'en-US',
+    'version': '62.0.3',
+    'userId': 'e4b3a1c2-6f0d-4a8b-9c1e-2d7f5a3b8e90',
+    'searchEngine': 'google',
+    'profile': {
+        'created': 1500000000,
+        'settings': {'theme': {'colors': {'primary': 'blue', 'secondary': 'grey'}}},
+    },
+    'addons': dict(
+        ('addon{}@example.com'.format(i), {'active': i % 2 == 0, 'version': '1.{}'.format(i)})
+        for i in range(20)
+    ),
+}
+NORMANDY.update(('field{}'.format(i), 'value{}'.format(i)) for i in range(50))
+
+CONTEXT = {
+    'normandy': NORMANDY,
+    'events': [
+        {
+            'type': 'click' if i % 3 else 'view',
+            'ts': i,
+            'targets': [{'id': (i + j) % 7} for j in range(3)],
+        }
+        for i in range(200)
+    ],
+}
+
+#: Expressions by name, covering the shapes found in real targeting
+#: rules, from single comparisons to large literals.
+EXPRESSIONS = {
+    'short': 'normandy.channel == "release"',
+    'arithmetic': '(normandy.profile.created / 86400 + 3) % 7 > 2 ? "a" : "b"',
+    'deep_attributes': 'normandy.profile.settings.theme.colors.primary == "blue"',
+    'long_chain': ' && '.join(
+        'normandy.field{0} == "value{0}"'.format(i) for i in range(50)
+    ),
+    'mixed_chain': ' || '.join(
+        '(normandy.channel == "{}" && normandy.locale == "{}")'.format(channel, locale)
+        for channel in ['nightly', 'beta', 'release'] for locale in LOCALES[:5]
+    ),
+    'nested_filters': (
+        'events[.type == "click" && .targets[.id in [1, 2, 3]]|length > 0]'
+        '[.ts > 100]|length'
+    ),
+    'transforms': (
+        'normandy.version|versionCompare("62.0") >= 0 && '
+        '[normandy.userId, "salt"]|stableSample(0.9) && '
+        'normandy.searchEngine|lower|startsWith("goo")'
+    ),
+    'array_literal': 'normandy.locale in [{}]'.format(
+        ', '.join('"{}-{}"'.format(locale, i) for i in range(10) for locale in LOCALES)
+        + ', "en-US"'
+    ),
+    'object_literal': '{{{}}}.key25.value == 25'.format(', '.join(
+        'key{0}: {{value: {0}, name: "name{0}", tags: ["a", "b", {0}]}}'.format(i)
+        for i in range(40)
+    )),
+}
+
+
+def version_compare(left, right):
+    def parts(version):
+        return [int(part) for part in version.split('.')]
+    left, right = parts(left), parts(right)
+    return (left > right) - (left < right)
+
+
+def stable_sample(values, rate):
+    digest = hashlib.sha256(u''.join(values).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) / float(0xffffffff) < rate
+
+
+TRANSFORMS = {
+    'length': len,
+    'lower': lambda value: value.lower(),
+    'startsWith': lambda value, prefix: value.startswith(prefix),
+    'versionCompare': version_compare,
+    'stableSample': stable_sample,
+}
+
+
+def make_jexl(**kwargs):
+    """Return a JEXL instance with the transforms used by the corpus."""
+    jexl = JEXL(**kwargs)
+    for name, func in TRANSFORMS.items():
+        jexl.add_transform(name, func)
+    return jexl
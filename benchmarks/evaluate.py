@@ -0,0 +1,50 @@
+"""
+Compare the evaluation backends on already-parsed expressions.
+
+Run from the repository root with `python -m benchmarks.evaluate`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from pyjexl.jexl import JEXL
+
+
+NORMANDY = {'channel': 'release', 'locale': 'en-US', 'version': 62}
+NORMANDY.update(('field{}'.format(i), 'value{}'.format(i)) for i in range(50))
+
+CONTEXT = {
+    'normandy': NORMANDY,
+    'events': [{'type': 'click' if i % 3 else 'view', 'ts': i} for i in range(200)],
+}
+
+EXPRESSIONS = {
+    'short': 'normandy.channel == "release"',
+    'long_chain': ' && '.join(
+        'normandy.field{0} == "value{0}"'.format(i) for i in range(50)
+    ),
+    'filter': 'events[.type == "click" && .ts > 100][0].ts',
+    'arithmetic': '(normandy.version * 60 * 60 * 24 + 3) % 7 > 2 ? "a" : "b"',
+}
+
+
+def time_evaluate(backend, expression, number):
+    jexl = JEXL(backend=backend)
+    compiled = jexl.compile(expression)
+    compiled.evaluate(CONTEXT)  # Compile before timing.
+    timer = timeit.repeat(lambda: compiled.evaluate(CONTEXT), number=number, repeat=10)
+    return min(timer) / number
+
+
+def main():
+    backends = JEXL.backends
+    print(('{:<12}' + ' {:>14}' * len(backends)).format('expression', *backends))
+    for name, expression in sorted(EXPRESSIONS.items()):
+        times = [time_evaluate(backend, expression, 100) for backend in backends]
+        print(('{:<12}' + ' {:>12.1f}us' * len(backends)).format(
+            name, *[time * 1e6 for time in times]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure the cost of creating many JEXL instances that each parse an
+expression, with grammars shared between instances and with every
+instance building its own, as it did before grammars were cached.
+
+Run from the repository root with `python -m benchmarks.grammar`.
+"""
+from __future__ import print_function
+
+import gc
+import time
+import tracemalloc
+
+from pyjexl import parser
+from pyjexl.jexl import JEXL
+
+
+INSTANCES = 1000
+
+
+def create_instances(shared):
+    instances = []
+    for _ in range(INSTANCES):
+        if not shared:
+            parser._grammars.clear()
+        jexl = JEXL()
+        jexl.parse('normandy.channel == "release"')
+        instances.append(jexl)
+    return instances
+
+
+def measure(shared):
+    parser._grammars.clear()
+    gc.collect()
+    tracemalloc.start()
+    started = time.time()
+    instances = create_instances(shared)
+    elapsed = time.time() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return elapsed, memory
+
+
+def main():
+    print('{} instances'.format(INSTANCES))
+    print('{:<10} {:>10} {:>12}'.format('grammars', 'time', 'memory'))
+    for name, shared in [('separate', False), ('shared', True)]:
+        elapsed, memory = measure(shared)
+        print('{:<10} {:>8.2f}s {:>10.1f}MB'.format(name, elapsed, memory / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compare the parsimonious and Pratt parser backends.
+
+Run from the repository root with `python -m benchmarks.parser`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from pyjexl.jexl import JEXL
+
+
+EXPRESSIONS = {
+    'short': 'normandy.channel == "release"',
+    'long_chain': ' && '.join(
+        'normandy.field{0} == "value{0}"'.format(i) for i in range(50)
+    ),
+    'nested_filters': (
+        'events[.type == "click" && .targets[.id in [1, 2, 3]]|length > 0]'
+        '[.timestamp > 1000].length'
+    ),
+    'transforms': (
+        'normandy.version|versionCompare("62.0") >= 0 && '
+        '[normandy.userId, "salt"]|stableSample(0.5)'
+    ),
+}
+
+
+def time_parse(parser, expression, number):
+    jexl = JEXL(parser=parser, cache_size=0)
+    jexl.parse(expression)  # Warm up any grammar and regex caches.
+    return min(timeit.repeat(lambda: jexl.parse(expression), number=number, repeat=10)) / number
+
+
+def main():
+    print('{:<16} {:>16} {:>16} {:>8}'.format('expression', 'parsimonious', 'pratt', 'speedup'))
+    for name, expression in sorted(EXPRESSIONS.items()):
+        number = 30
+        peg = time_parse('parsimonious', expression, number)
+        pratt = time_parse('pratt', expression, number)
+        print('{:<16} {:>14.1f}us {:>14.1f}us {:>7.1f}x'.format(
+            name, peg * 1e6, pratt * 1e6, peg / pratt
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Compare parsing a catalogue of expressions with loading it from the
+precompiled format.
+
+Run from the repository root with `python -m benchmarks.precompiled`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from benchmarks.parser import EXPRESSIONS
+from pyjexl.jexl import JEXL
+
+
+CATALOGUE = [
+    '({}) || rule == {}'.format(expression, index)
+    for index in range(250)
+    for expression in EXPRESSIONS.values()
+]
+
+
+def parse_all(jexl):
+    for expression in CATALOGUE:
+        jexl.parse(expression)
+
+
+def main():
+    data = JEXL().precompile(CATALOGUE)
+    cases = [
+        ('parsimonious', lambda: parse_all(JEXL(cache_size=None))),
+        ('pratt', lambda: parse_all(JEXL(cache_size=None, parser='pratt'))),
+        ('precompiled', lambda: JEXL(cache_size=None).load_precompiled(data)),
+    ]
+
+    print('{} expressions, {} bytes precompiled'.format(len(CATALOGUE), len(data)))
+    for name, function in cases:
+        time = min(timeit.repeat(function, number=1, repeat=3))
+        print('{:<14} {:>10.1f}ms'.format(name, time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare evaluating a large set of rules one at a time with evaluating
+them as a RuleSet, with and without the rule index.
+
+Run from the repository root with `python -m benchmarks.rules`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from pyjexl.jexl import JEXL
+from pyjexl.rules import RuleSet
+
+
+CHANNELS = ['release', 'beta', 'nightly', 'aurora']
+LOCALES = ['en-US', 'de', 'fr', 'es-ES', 'ja']
+
+RULES = dict(
+    (
+        'rule{}'.format(i),
+        'normandy.channel == "{channel}" && normandy.locale in ["{locale}", "en-US"]'
+        ' && normandy.version >= {version} && normandy.userId|length > {threshold}'.format(
+            channel=CHANNELS[i % len(CHANNELS)],
+            locale=LOCALES[i % len(LOCALES)],
+            version=50 + i % 20,
+            threshold=i % 10,
+        )
+    )
+    for i in range(2000)
+)
+
+CONTEXT = {
+    'normandy': {'channel': 'beta', 'locale': 'de', 'version': 62, 'userId': 'abcdefgh'},
+}
+
+
+def main():
+    jexl = JEXL()
+    jexl.add_transform('length', len, pure=True)
+
+    compiled = [jexl.compile(expression) for expression in RULES.values()]
+    indexed = RuleSet(jexl, RULES)
+    unindexed = RuleSet(jexl, RULES, indexed=False)
+
+    cases = [
+        ('one at a time', lambda: [expression.evaluate(CONTEXT) for expression in compiled]),
+        ('RuleSet', lambda: unindexed.evaluate(CONTEXT)),
+        ('indexed RuleSet', lambda: indexed.evaluate(CONTEXT)),
+    ]
+    for name, function in cases:
+        function()
+        time = min(timeit.repeat(function, number=5, repeat=5)) / 5
+        print('{:<16} {:>10.2f}ms'.format(name, time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
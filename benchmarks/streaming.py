@@ -0,0 +1,49 @@
+"""
+Compare the interpreter with the streaming backend, which evaluates
+relative filters lazily, on filters over a large array.
+
+Run from the repository root with `python -m benchmarks.streaming`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from pyjexl.jexl import JEXL
+
+
+CONTEXT = {
+    'events': [
+        {'type': 'click' if i % 3 else 'view', 'ts': i, 'target': i % 50}
+        for i in range(100000)
+    ],
+}
+
+EXPRESSIONS = {
+    'first_match': 'events[.type == "click" && .ts > 1000][0].ts',
+    'chained_first': 'events[.type == "click"][.target == 7][0].ts',
+    'membership': '{type: "view", ts: 300, target: 0} in events[.type == "view"]',
+    'full_chain': 'events[.type == "click"][.target == 7]|length',
+}
+BACKENDS = ('interpreter', 'streaming')
+
+
+def time_evaluate(backend, expression, number):
+    jexl = JEXL(backend=backend)
+    jexl.add_transform('length', len)
+    compiled = jexl.compile(expression)
+    compiled.evaluate(CONTEXT)  # Compile before timing.
+    timer = timeit.repeat(lambda: compiled.evaluate(CONTEXT), number=number, repeat=3)
+    return min(timer) / number
+
+
+def main():
+    print(('{:<14}' + ' {:>14}' * len(BACKENDS)).format('expression', *BACKENDS))
+    for name, expression in sorted(EXPRESSIONS.items()):
+        times = [time_evaluate(backend, expression, 3) for backend in BACKENDS]
+        print(('{:<14}' + ' {:>12.2f}ms' * len(BACKENDS)).format(
+            name, *[time * 1e3 for time in times]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Benchmark suite for the hot paths of pyjexl, run over the corpus in
+benchmarks.corpus. It measures:
+
+- grammar: building the parsimonious grammar with jexl_grammar, with
+  and without the grammar cache.
+- parse: JEXL.parse with each parser, without the expression cache.
+- evaluate: Evaluator.evaluate on an already parsed tree.
+- end_to_end: JEXL.evaluate on an expression string with each backend,
+  as applications call it, with the expression cache.
+- memory: the bytes retained by each parsed tree, as Nodes and in the
+  compact form from pyjexl.compact.
+
+Timings are the fastest of several repeats, in seconds per call.
+Results are printed as a table, and can be written as JSON to track
+regressions across commits:
+
+    python -m benchmarks.suite --output before.json
+    (change things)
+    python -m benchmarks.suite --compare before.json
+
+Comparing exits with status 1 if any benchmark got slower or bigger by
+more than --threshold.
+"""
+from __future__ import division, print_function
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+from benchmarks.corpus import CONTEXT, EXPRESSIONS, make_jexl
+from pyjexl import parser
+from pyjexl.compact import compact
+from pyjexl.evaluator import Context, Evaluator
+from pyjexl.jexl import JEXL
+from pyjexl.parser import jexl_grammar
+
+
+#: Each repeat runs a benchmark for at least this many seconds.
+MIN_REPEAT_TIME = 0.02
+
+#: Number of trees parsed to measure the memory of a tree.
+MEMORY_SAMPLES = 20
+
+
+def measure(func, repeat):
+    """
+    Time func, calling it enough times per repeat to get a stable
+    measurement, and return the fastest time per call in seconds.
+    """
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= MIN_REPEAT_TIME:
+            break
+        number *= 2 if elapsed * 10 > MIN_REPEAT_TIME else 10
+    times = [elapsed] + timeit.repeat(func, number=number, repeat=repeat - 1)
+    return min(times) / number
+
+
+def bench_grammar():
+    config = JEXL().config
+
+    def build():
+        parser._grammars.clear()
+        jexl_grammar(config)
+
+    yield 'grammar.build', 'seconds', build
+    yield 'grammar.cached', 'seconds', lambda: jexl_grammar(config)
+
+
+def bench_parse():
+    for parser_name in JEXL.parsers:
+        jexl = make_jexl(parser=parser_name, cache_size=0)
+        for name, expression in sorted(EXPRESSIONS.items()):
+            yield (
+                'parse.{}.{}'.format(parser_name, name),
+                'seconds',
+                lambda expression=expression: jexl.parse(expression),
+            )
+
+
+def bench_evaluate():
+    jexl = make_jexl()
+    evaluator = Evaluator(jexl.config)
+    for name, expression in sorted(EXPRESSIONS.items()):
+        yield (
+            'evaluate.{}'.format(name),
+            'seconds',
+            lambda ast=jexl.parse(expression): evaluator.evaluate(ast, Context(CONTEXT)),
+        )
+
+
+def bench_end_to_end():
+    for backend in JEXL.backends:
+        jexl = make_jexl(backend=backend)
+        for name, expression in sorted(EXPRESSIONS.items()):
+            yield (
+                'end_to_end.{}.{}'.format(backend, name),
+                'seconds',
+                lambda expression=expression: jexl.evaluate(expression, CONTEXT),
+            )
+
+
+def retained_size(build):
+    """Return the number of bytes retained by the result of build()."""
+    build()  # Warm up any caches used while building.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = [build() for _ in range(MEMORY_SAMPLES)]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del results
+    return retained // MEMORY_SAMPLES
+
+
+def bench_memory():
+    jexl = make_jexl(parser='pratt', cache_size=0)
+    for name, expression in sorted(EXPRESSIONS.items()):
+        yield 'memory.{}'.format(name), 'bytes', lambda expression=expression: retained_size(
+            lambda: jexl.parse(expression)
+        )
+    for name, expression in sorted(EXPRESSIONS.items()):
+        yield 'memory.compact.{}'.format(name), 'bytes', lambda expression=expression: (
+            retained_size(lambda: compact(jexl.parse(expression)))
+        )
+
+
+BENCHMARKS = [
+    ('grammar', bench_grammar),
+    ('parse', bench_parse),
+    ('evaluate', bench_evaluate),
+    ('end_to_end', bench_end_to_end),
+    ('memory', bench_memory),
+]
+
+
+def git_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def run(groups, repeat, select=None):
+    results = []
+    for group, bench in BENCHMARKS:
+        if group not in groups:
+            continue
+        for name, unit, func in bench():
+            if select is not None and select not in name:
+                continue
+            value = measure(func, repeat) if unit == 'seconds' else func()
+            results.append({'name': name, 'value': value, 'unit': unit})
+            print(format_result(results[-1]), file=sys.stderr)
+    return {
+        'metadata': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'repeat': repeat,
+        },
+        'benchmarks': results,
+    }
+
+
+def format_value(value, unit):
+    if unit == 'seconds':
+        return '{:.2f}us'.format(value * 1e6)
+    return '{}B'.format(value)
+
+
+def format_result(result):
+    return '{:<44} {:>14}'.format(result['name'], format_value(result['value'], result['unit']))
+
+
+def compare(results, baseline, threshold):
+    """
+    Print how each benchmark changed since a baseline, and return the
+    names of the ones that got worse by more than threshold.
+    """
+    old = dict((result['name'], result) for result in baseline['benchmarks'])
+    regressions = []
+    print('{:<44} {:>14} {:>14} {:>8}'.format('benchmark', 'baseline', 'current', 'change'))
+    for result in results['benchmarks']:
+        if result['name'] not in old or not old[result['name']]['value']:
+            continue
+        before = old[result['name']]['value']
+        ratio = result['value'] / before
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(result['name'])
+            flag = '  !'
+        print('{:<44} {:>14} {:>14} {:>+7.1f}%{}'.format(
+            result['name'], format_value(before, result['unit']),
+            format_value(result['value'], result['unit']), (ratio - 1) * 100, flag
+        ))
+    return regressions
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    arguments.add_argument(
+        'groups', nargs='*', metavar='group',
+        help='Groups of benchmarks to run: {} (default: all)'.format(
+            ', '.join(group for group, _ in BENCHMARKS)
+        )
+    )
+    arguments.add_argument(
+        '-k', dest='select', help='Only run benchmarks whose name contains this'
+    )
+    arguments.add_argument('--repeat', type=int, default=5, help='Number of repeats per timing')
+    arguments.add_argument(
+        '--output', help='Write the results as JSON to this file, or - for stdout'
+    )
+    arguments.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    arguments.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='Relative slowdown reported as a regression when comparing (default: 0.1)'
+    )
+    options = arguments.parse_args(argv)
+
+    groups = [group for group, _ in BENCHMARKS]
+    for group in options.groups:
+        if group not in groups:
+            arguments.error('unknown group: {}'.format(group))
+    results = run(options.groups or groups, options.repeat, options.select)
+
+    if options.output == '-':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as baseline:
+            regressions = compare(results, json.load(baseline), options.threshold)
+        if regressions:
+            print('{} benchmarks regressed by more than {:.0%}'.format(
+                len(regressions), options.threshold
+            ))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
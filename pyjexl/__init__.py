@@ -1,3 +1,7 @@
 # flake8: noqa
-from pyjexl.exceptions import EvaluationError, JEXLException, MissingTransformError
+from pyjexl.evaluator import Context, EvaluationBudget, Lazy, LazyMapping
+from pyjexl.exceptions import (
+    BudgetExceededError, EvaluationError, JEXLException, MissingTransformError
+)
 from pyjexl.jexl import JEXL
+from pyjexl.profiling import Hooks, Profiler
@@ -1,3 +1,8 @@
+from collections import namedtuple
+
+from pyjexl.parser import FilterExpression, Identifier
+
+
 class JEXLAnalyzer(object):
     def __init__(self, jexl_config):
         self.config = jexl_config
@@ -11,14 +16,142 @@ class JEXLAnalyzer(object):
 
 
 class ValidatingAnalyzer(JEXLAnalyzer):
+    """
+    Yields a message for each problem found in an expression.
+
+    Like other analyzers, subclasses may override visit_<type> methods
+    and call generic_visit to yield the messages for the children of a
+    node. Nodes handled by the default methods are visited from an
+    explicit stack instead, so that long chains like `a + a + ... + a`
+    can be validated.
+    """
+    def visit(self, expression):
+        return self._visit_nodes([expression])
+
+    def generic_visit(self, expression):
+        return self._visit_nodes(expression.children)
+
     def visit_Transform(self, transform):
+        for message in self.check_Transform(transform):
+            yield message
+        for message in self.generic_visit(transform):
+            yield message
+
+    def check_Transform(self, transform):
+        """Yield the messages for a transform itself, not its children."""
         if transform.name not in self.config.transforms:
             yield "The `{name}` transform is undefined.".format(name=transform.name)
-        for t in self.generic_visit(transform):
-            yield t
 
-    def generic_visit(self, expression):
-        for child in expression.children:
-            assert child is not None
-            for c in self.visit(child):
-                yield c
+    def _visit_nodes(self, nodes):
+        stack = list(nodes)
+        stack.reverse()
+        while stack:
+            node = stack.pop()
+            assert node is not None
+            name = type(node).__name__
+            method = getattr(self, 'visit_' + name, self.generic_visit)
+            if getattr(method, '__func__', None) not in DEFAULT_VISITS:
+                for message in method(node):
+                    yield message
+                continue
+
+            # The default methods check the node and then visit its
+            # children, which is done here rather than by recursing.
+            check = getattr(self, 'check_' + name, None)
+            if check is not None:
+                for message in check(node):
+                    yield message
+            stack.extend(reversed(list(node.children)))
+
+
+DEFAULT_VISITS = frozenset(
+    vars(ValidatingAnalyzer)[name] for name in ('generic_visit', 'visit_Transform')
+)
+
+
+#: The result of a DependencyAnalyzer. paths is a set of tuples of the
+#: keys an expression may read from the context, like
+#: ('normandy', 'channel'). relative_paths is a set of
+#: (collection, path) pairs for the keys read from the elements of a
+#: collection by a filter. collection is the path of the filtered value,
+#: a (collection, path) pair itself if the filtered value was read from
+#: the elements of another collection, or None if it isn't a plain path.
+#: transforms is a set of the names of the transforms the expression
+#: calls.
+Dependencies = namedtuple('Dependencies', ['paths', 'relative_paths', 'transforms'])
+
+
+def identifier_path(identifier):
+    """
+    Return (path, relative, subject) for a chain of identifiers, where
+    subject is the node the chain starts from if it doesn't start from
+    the context or a relative value.
+    """
+    names = []
+    while isinstance(identifier, Identifier):
+        names.append(identifier.value)
+        if identifier.relative or identifier.subject is None:
+            return tuple(reversed(names)), identifier.relative, None
+        identifier = identifier.subject
+    return tuple(reversed(names)), False, identifier
+
+
+class DependencyAnalyzer(JEXLAnalyzer):
+    """
+    Finds the context keys an expression may read and the transforms it
+    may call. Every branch is included, whether or not it would be
+    evaluated for a given context.
+
+    Nodes are visited from an explicit stack rather than by recursion,
+    so that long chains can be analyzed. Each visit_<type> method takes
+    a node and the collection its relative identifiers read from, and
+    returns the (node, collection) pairs to visit next.
+    """
+    def visit(self, expression):
+        self.dependencies = Dependencies(set(), set(), set())
+        stack = [(expression, None)]
+        while stack:
+            node, collection = stack.pop()
+            method = getattr(self, 'visit_' + type(node).__name__, self.generic_visit)
+            stack.extend(method(node, collection))
+        return self.dependencies
+
+    def visit_Identifier(self, identifier, collection):
+        path, relative, subject = identifier_path(identifier)
+        if subject is not None:
+            # Keys read from a computed value, like the result of a
+            # transform, aren't context paths.
+            return [(subject, collection)]
+        elif relative:
+            self.dependencies.relative_paths.add((collection, path))
+        else:
+            self.dependencies.paths.add(path)
+        return []
+
+    def visit_FilterExpression(self, filter_expression, collection):
+        subject = filter_expression.subject
+        if not filter_expression.relative:
+            return [(subject, collection), (filter_expression.expression, collection)]
+
+        # A relative filter keeps some of the elements of its subject, so
+        # filtering its result reads from the same collection.
+        while isinstance(subject, FilterExpression) and subject.relative:
+            subject = subject.subject
+        path, relative, computed = identifier_path(subject)
+        if computed is not None:
+            filtered = None
+        elif relative:
+            filtered = (collection, path)
+        else:
+            filtered = path
+        return [
+            (filter_expression.subject, collection),
+            (filter_expression.expression, filtered),
+        ]
+
+    def visit_Transform(self, transform, collection):
+        self.dependencies.transforms.add(transform.name)
+        return self.generic_visit(transform, collection)
+
+    def generic_visit(self, expression, collection):
+        return [(child, collection) for child in expression.children]
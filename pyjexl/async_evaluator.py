@@ -0,0 +1,189 @@
+"""
+Evaluation of expressions with asyncio.
+
+The AsyncEvaluator awaits transforms that return awaitables, such as
+coroutine functions, and context values that are awaitable. Operands
+that are always evaluated, like both sides of most binary operators,
+the items of array and object literals and the arguments of a
+transform, are evaluated concurrently. &&, || and conditionals still
+short-circuit, so the side they don't need is never evaluated.
+
+An awaitable found in the context is only awaited once per evaluation,
+no matter how many times the expression refers to it.
+
+This module requires Python 3.
+"""
+import asyncio
+import inspect
+
+from pyjexl.evaluator import Context, get_transform, index_filter
+from pyjexl.operators import default_binary_operators
+
+
+class _Unevaluated(BaseException):
+    """
+    Raised by an operand of a lazy operator that hasn't been evaluated
+    yet. See AsyncEvaluator.evaluate_lazy. It isn't an Exception so that
+    operators catching errors from their operands let it through.
+    """
+    def __init__(self, index):
+        self.index = index
+
+
+async def gather(awaitables):
+    """
+    Await awaitables concurrently and return their results, like
+    asyncio.gather. If one of them fails, the others are cancelled
+    before the error is raised, instead of being left running with
+    nobody to retrieve their results.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncEvaluator(object):
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    async def evaluate(self, expression, context=None):
+        if context is None:
+            context = Context()
+        awaited = {}
+        try:
+            return await self.visit(expression, context, awaited)
+        finally:
+            # Context values are shared by every branch, so they aren't
+            # cancelled along with a failing branch. Stop the tasks
+            # created for any that are still running once the
+            # evaluation is over.
+            for value, future in awaited.values():
+                if future is not value:
+                    future.cancel()
+
+    def visit(self, expression, context, awaited):
+        method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
+        return method(expression, context, awaited)
+
+    async def resolve(self, value, awaited):
+        """
+        Return the result of value if it is awaitable, or value itself.
+        Each awaitable is only awaited once; later calls for the same
+        object wait for and return the same result.
+        """
+        if not inspect.isawaitable(value):
+            return value
+
+        key = id(value)
+        if key not in awaited:
+            # The awaitable is kept alongside its future so that its id
+            # can't be reused during the evaluation.
+            awaited[key] = (value, asyncio.ensure_future(value))
+        return await asyncio.shield(awaited[key][1])
+
+    async def visit_all(self, expressions, context, awaited):
+        return await gather([
+            self.visit(expression, context, awaited) for expression in expressions
+        ])
+
+    async def evaluate_lazy(self, operator, operands, context, awaited):
+        """
+        Evaluate an operator that takes its operands as functions. The
+        operator is called with functions that raise until their operand
+        has been evaluated, and called again after evaluating whichever
+        operand it asked for, so that operands it doesn't need are never
+        evaluated.
+        """
+        values = {}
+
+        def operand(index):
+            def get_value():
+                try:
+                    return values[index]
+                except KeyError:
+                    raise _Unevaluated(index)
+            return get_value
+
+        thunks = [operand(index) for index in range(len(operands))]
+        while True:
+            try:
+                return operator.evaluate(*thunks)
+            except _Unevaluated as unevaluated:
+                index = unevaluated.index
+                values[index] = await self.visit(operands[index], context, awaited)
+
+    async def visit_BinaryExpression(self, exp, context, awaited):
+        operator = exp.operator
+        if operator is default_binary_operators.get('&&'):
+            left = await self.visit(exp.left, context, awaited)
+            return await self.visit(exp.right, context, awaited) if left else left
+        elif operator is default_binary_operators.get('||'):
+            left = await self.visit(exp.left, context, awaited)
+            return left if left else await self.visit(exp.right, context, awaited)
+        elif operator._evaluate_lazy:
+            return await self.evaluate_lazy(operator, [exp.left, exp.right], context, awaited)
+
+        left, right = await self.visit_all([exp.left, exp.right], context, awaited)
+        return operator.evaluate(left, right)
+
+    async def visit_UnaryExpression(self, exp, context, awaited):
+        if exp.operator._evaluate_lazy:
+            return await self.evaluate_lazy(exp.operator, [exp.right], context, awaited)
+        return exp.operator.evaluate(await self.visit(exp.right, context, awaited))
+
+    async def visit_Literal(self, literal, context, awaited):
+        return literal.value
+
+    async def visit_Identifier(self, identifier, context, awaited):
+        if identifier.relative:
+            subject = context.relative_value
+        elif identifier.subject:
+            subject = await self.visit(identifier.subject, context, awaited)
+        else:
+            subject = context
+
+        return await self.resolve(subject.get(identifier.value, None), awaited)
+
+    async def visit_ObjectLiteral(self, object_literal, context, awaited):
+        keys = list(object_literal.value.keys())
+        values = await self.visit_all(
+            [object_literal.value[key] for key in keys], context, awaited
+        )
+        return dict(zip(keys, values))
+
+    async def visit_ArrayLiteral(self, array_literal, context, awaited):
+        return list(await self.visit_all(array_literal.value, context, awaited))
+
+    async def visit_Transform(self, transform, context, awaited):
+        transform_func = get_transform(self.config.transforms, transform.name)
+        values = await self.visit_all([transform.subject] + transform.args, context, awaited)
+        return await self.resolve(transform_func(*values), awaited)
+
+    async def visit_FilterExpression(self, filter_expression, context, awaited):
+        if not filter_expression.relative:
+            values, filter_value = await self.visit_all(
+                [filter_expression.subject, filter_expression.expression], context, awaited
+            )
+            return index_filter(values, filter_value)
+
+        # The values are iterated twice, so iterators are read into a
+        # list first.
+        values = list(await self.visit(filter_expression.subject, context, awaited))
+        matches = await gather([
+            self.visit(filter_expression.expression, context.with_relative(value), awaited)
+            for value in values
+        ])
+        return [value for value, match in zip(values, matches) if match]
+
+    async def visit_ConditionalExpression(self, conditional, context, awaited):
+        if await self.visit(conditional.test, context, awaited):
+            return await self.visit(conditional.consequent, context, awaited)
+        return await self.visit(conditional.alternate, context, awaited)
+
+    def generic_visit(self, expression, context, awaited):
+        raise ValueError('Could not evaluate expression: ' + repr(expression))
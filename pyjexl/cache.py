@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from threading import Lock
+
+from pyjexl.evaluator import monotonic
+
+
+class LRUCache(object):
+    """
+    Mapping-like cache that holds at most maxsize entries, discarding
+    the least recently used entry when full.
+
+    A maxsize of None makes the cache unbounded, and a maxsize of 0
+    disables caching entirely. If ttl is given, entries expire that
+    many seconds after they were set, as measured by clock.
+    """
+    def __init__(self, maxsize=128, ttl=None, clock=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._expires = {}
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            if self.ttl is not None and self._expires[key] <= self.clock():
+                del self._expires[key]
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.maxsize == 0:
+            return
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if self.ttl is not None:
+                self._expires[key] = self.clock() + self.ttl
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    oldest, _ = self._data.popitem(last=False)
+                    self._expires.pop(oldest, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            if self.ttl is not None and key in self._expires:
+                return self._expires[key] > self.clock()
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,270 @@
+"""
+Translates parsed expressions into Python source code.
+
+PythonCompiler turns an AST into the source of a single Python function
+and compiles it with the builtin compile(), so that evaluating an
+expression runs as ordinary Python bytecode. Identifiers become chains
+of dict lookups, the default operators become their Python equivalents,
+and relative filters become list comprehensions. Everything else, such
+as custom operators and transforms, is bound by name in the namespace
+the function is compiled in.
+
+Nodes that the generator doesn't know how to translate are evaluated
+with the Evaluator instead.
+"""
+from __future__ import division
+
+import math
+import operator
+
+from pyjexl.evaluator import Context, Evaluator, index_filter, missing_transform
+from pyjexl.operators import default_binary_operators
+from pyjexl.parser import BinaryExpression
+from pyjexl.paths import resolve
+
+
+#: Python operators equivalent to the functions used by the default
+#: JEXL operators.
+PYTHON_OPERATORS = {
+    operator.add: '+',
+    operator.sub: '-',
+    operator.mul: '*',
+    operator.floordiv: '//',
+    operator.truediv: '/',
+    operator.mod: '%',
+    operator.pow: '**',
+    operator.eq: '==',
+    operator.ne: '!=',
+    operator.ge: '>=',
+    operator.gt: '>',
+    operator.le: '<=',
+    operator.lt: '<',
+}
+
+#: Python operators that group from left to right like their JEXL
+#: counterparts. Comparisons chain and ** groups from the right in
+#: Python, so those always get parenthesized.
+LEFT_ASSOCIATIVE_OPERATORS = {'+', '-', '*', '/', '//', '%', 'and', 'or'}
+
+#: Literal types that can be written into source code using repr().
+SOURCE_LITERAL_TYPES = (bool, int, float, type(u''))
+
+
+class UnsupportedExpression(Exception):
+    """Raised by generate methods for nodes they can't translate."""
+
+
+class PythonCompiler(object):
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    def compile(self, expression):
+        """
+        Compile an AST into a function that takes an optional context
+        and returns the value of the expression. If the expression can't
+        be compiled at all, for example because it is nested too deeply
+        for the Python compiler, the function falls back to evaluating
+        it with the Evaluator.
+        """
+        try:
+            source, namespace = self.generate(expression)
+            code = compile(source, '<jexl>', 'exec', division.compiler_flag, True)
+        except (SyntaxError, RuntimeError, MemoryError):
+            evaluator = Evaluator(self.config)
+            return lambda context=None: evaluator.evaluate(expression, context)
+
+        exec(code, namespace)
+        return namespace['jexl_expression']
+
+    def generate(self, expression):
+        """
+        Generate the source of a function implementing an expression.
+        Returns the source and the namespace it must be executed in.
+        """
+        self.namespace = {
+            '_Context': Context,
+            '_evaluate': Evaluator(self.config).evaluate,
+            '_index_filter': index_filter,
+            '_missing_transform': missing_transform,
+            '_resolve': resolve,
+        }
+        self.constants = {}
+        self.relative_names = []
+
+        body = self.visit(expression)
+        source = (
+            'def jexl_expression(context=None):\n'
+            '    if context is None:\n'
+            '        context = _Context()\n'
+            '    return {body}\n'
+        ).format(body=body)
+        return source, self.namespace
+
+    def constant(self, value, prefix='_c'):
+        """Bind a value in the namespace and return its name."""
+        key = id(value)
+        if key not in self.constants:
+            name = '{prefix}{index}'.format(prefix=prefix, index=len(self.namespace))
+            self.namespace[name] = value
+            self.constants[key] = name
+        return self.constants[key]
+
+    def context_source(self):
+        """Source for a Context matching the current relative scope."""
+        if self.relative_names:
+            return 'context.with_relative({})'.format(self.relative_names[-1])
+        return 'context'
+
+    def visit(self, expression):
+        method = getattr(self, 'generate_' + type(expression).__name__, self.generic_visit)
+        try:
+            return method(expression)
+        except UnsupportedExpression:
+            return '_evaluate({node}, {context})'.format(
+                node=self.constant(expression, '_n'),
+                context=self.context_source()
+            )
+
+    def python_operator(self, op):
+        """Return the Python operator equivalent to a binary operator, if any."""
+        if op is default_binary_operators.get('&&'):
+            return 'and'
+        elif op is default_binary_operators.get('||'):
+            return 'or'
+        elif op is default_binary_operators.get('in'):
+            return 'in'
+        elif not op._evaluate_lazy:
+            return PYTHON_OPERATORS.get(op.evaluate)
+        return None
+
+    def generate_BinaryExpression(self, exp):
+        op = exp.operator
+        python_operator = self.python_operator(op)
+        if python_operator is None:
+            left = self.visit(exp.left)
+            right = self.visit(exp.right)
+            if op._evaluate_lazy:
+                return '{}(lambda: {}, lambda: {})'.format(self.constant(op.evaluate), left, right)
+            return '{}({}, {})'.format(self.constant(op.evaluate), left, right)
+
+        # Chains of the same left-associative operator, like a long
+        # series of &&, are written without nested parentheses so that
+        # they don't run into the Python parser's nesting limit.
+        operands = [exp.right]
+        left = exp.left
+        if python_operator in LEFT_ASSOCIATIVE_OPERATORS:
+            while (isinstance(left, BinaryExpression)
+                   and self.python_operator(left.operator) == python_operator):
+                operands.append(left.right)
+                left = left.left
+        operands.append(left)
+
+        separator = ' {} '.format(python_operator)
+        return '({})'.format(separator.join(self.visit(operand) for operand in reversed(operands)))
+
+    def generate_UnaryExpression(self, exp):
+        op = exp.operator
+        right = self.visit(exp.right)
+
+        if op._evaluate_lazy:
+            return '{}(lambda: {})'.format(self.constant(op.evaluate), right)
+        elif op.evaluate is operator.not_:
+            return '(not {})'.format(right)
+        return '{}({})'.format(self.constant(op.evaluate), right)
+
+    def generate_Literal(self, literal):
+        value = literal.value
+        if type(value) in SOURCE_LITERAL_TYPES:
+            if not isinstance(value, float) or not (math.isinf(value) or math.isnan(value)):
+                source = repr(value)
+                # Negative numbers bind looser than ** in Python, so
+                # -2 ^ 2 must not become -2 ** 2.
+                return '({})'.format(source) if source.startswith('-') else source
+        return self.constant(value)
+
+    def generate_Identifier(self, identifier):
+        if identifier.relative:
+            if self.relative_names:
+                subject = self.relative_names[-1]
+            else:
+                subject = 'context.relative_value'
+        elif identifier.subject:
+            subject = '({})'.format(self.visit(identifier.subject))
+        else:
+            subject = 'context'
+
+        return '{}.get({}, None)'.format(subject, repr(identifier.value))
+
+    def generate_Path(self, path):
+        if path.relative:
+            if self.relative_names:
+                subject = self.relative_names[-1]
+            else:
+                subject = 'context.relative_value'
+        elif path.subject:
+            subject = '({})'.format(self.visit(path.subject))
+        else:
+            subject = 'context'
+
+        if path.attributes:
+            return '_resolve({}, {}, True)'.format(subject, repr(path.names))
+        return subject + ''.join('.get({}, None)'.format(repr(name)) for name in path.names)
+
+    def generate_ObjectLiteral(self, object_literal):
+        return '{{{}}}'.format(', '.join(
+            '{}: {}'.format(repr(key), self.visit(value))
+            for key, value in object_literal.value.items()
+        ))
+
+    def generate_ArrayLiteral(self, array_literal):
+        return '[{}]'.format(', '.join(self.visit(value) for value in array_literal.value))
+
+    def generate_Transform(self, transform):
+        try:
+            transform_func = self.config.transforms[transform.name]
+        except KeyError:
+            return '_missing_transform({})'.format(repr(transform.name))
+
+        args = [self.visit(transform.subject)]
+        args.extend(self.visit(arg) for arg in transform.args)
+        return '{}({})'.format(self.constant(transform_func, '_t'), ', '.join(args))
+
+    def generate_FilterExpression(self, filter_expression):
+        subject = self.visit(filter_expression.subject)
+        if not filter_expression.relative:
+            expression = self.visit(filter_expression.expression)
+            return '_index_filter({}, {})'.format(subject, expression)
+
+        name = '_r{}'.format(len(self.relative_names))
+        self.relative_names.append(name)
+        try:
+            expression = self.visit(filter_expression.expression)
+        finally:
+            self.relative_names.pop()
+        return '[{name} for {name} in {subject} if {expression}]'.format(
+            name=name,
+            subject=subject,
+            expression=expression
+        )
+
+    def generate_ConditionalExpression(self, conditional):
+        return '({} if {} else {})'.format(
+            self.visit(conditional.consequent),
+            self.visit(conditional.test),
+            self.visit(conditional.alternate)
+        )
+
+    def generic_visit(self, expression):
+        raise UnsupportedExpression(expression)
+
+
+class PythonEvaluator(object):
+    """
+    Drop-in replacement for Evaluator that compiles each expression
+    with the PythonCompiler before evaluating it.
+    """
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    def evaluate(self, expression, context=None):
+        return PythonCompiler(self.config).compile(expression)(context)
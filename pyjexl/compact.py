@@ -0,0 +1,245 @@
+"""
+A compact, immutable form of parsed expressions, for applications that
+keep many of them in memory.
+
+Compact trees are nested tuples whose first item names the node type.
+Compared with Node trees they have no parent links or cached NodeInfo,
+chains of identifiers like `a.b.c` are flattened into a single Path
+with a tuple of names, lists are stored as tuples, and identifier and
+transform names are interned so that expressions share them:
+
+    ('Literal', value)
+    ('Path', subject, names, relative)
+    ('BinaryExpression', operator, left, right)
+    ('UnaryExpression', operator, right)
+    ('ArrayLiteral', items)
+    ('ObjectLiteral', ((key, value), ...))
+    ('Transform', name, subject, args)
+    ('FilterExpression', subject, expression, relative)
+    ('ConditionalExpression', test, consequent, alternate)
+
+The subject of a Path is None for names read from the context. Use
+compact and expand to convert from and to Node trees, and the
+CompactEvaluator to evaluate compact trees directly. Both conversions
+work without recursion, so they handle chains of any length.
+"""
+import sys
+from functools import partial
+
+from pyjexl.evaluator import (
+    AND,
+    Context,
+    evaluates_left_first,
+    get_transform,
+    index_filter,
+    OR,
+    relative_filter,
+)
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    ConditionalExpression,
+    FilterExpression,
+    Identifier,
+    Literal,
+    ObjectLiteral,
+    Transform,
+    UnaryExpression,
+)
+from pyjexl.utils import rebuild
+
+
+def intern(value):
+    """Intern a string, so that equal strings share memory."""
+    try:
+        return sys.intern(value)
+    except (AttributeError, TypeError):
+        # Python 2.7 compat: only byte strings can be interned.
+        return value
+
+
+def node_children(node):
+    """The children of a Node that become children of its compact form."""
+    if isinstance(node, Identifier):
+        while isinstance(node.subject, Identifier):
+            node = node.subject
+        return [] if node.subject is None else [node.subject]
+    return [child for child in node.children if child is not None]
+
+
+def compact_node(node, children):
+    """Build the compact form of a Node from the compact forms of its children."""
+    if isinstance(node, Literal):
+        return ('Literal', node.value)
+    elif isinstance(node, Identifier):
+        names = []
+        while True:
+            names.append(intern(node.value))
+            if not isinstance(node.subject, Identifier):
+                break
+            node = node.subject
+        subject = children[0] if children else None
+        return ('Path', subject, tuple(reversed(names)), bool(node.relative))
+    elif isinstance(node, BinaryExpression):
+        return ('BinaryExpression', node.operator, children[0], children[1])
+    elif isinstance(node, UnaryExpression):
+        return ('UnaryExpression', node.operator, children[0])
+    elif isinstance(node, ArrayLiteral):
+        return ('ArrayLiteral', tuple(children))
+    elif isinstance(node, ObjectLiteral):
+        return ('ObjectLiteral', tuple(
+            (intern(key), child) for key, child in zip(node.value.keys(), children)
+        ))
+    elif isinstance(node, Transform):
+        if node.subject is None:
+            return ('Transform', intern(node.name), None, tuple(children))
+        return ('Transform', intern(node.name), children[0], tuple(children[1:]))
+    elif isinstance(node, FilterExpression):
+        # Node.children lists the expression before the subject.
+        return ('FilterExpression', children[1], children[0], bool(node.relative))
+    elif isinstance(node, ConditionalExpression):
+        return ('ConditionalExpression', children[0], children[1], children[2])
+    raise ValueError('Cannot compact node: ' + repr(node))
+
+
+def tree_children(tree):
+    """The compact trees nested in a compact tree, in order."""
+    kind = tree[0]
+    if kind == 'Literal':
+        return ()
+    elif kind == 'Path':
+        return () if tree[1] is None else (tree[1],)
+    elif kind == 'BinaryExpression':
+        return tree[2:]
+    elif kind == 'UnaryExpression':
+        return (tree[2],)
+    elif kind == 'ArrayLiteral':
+        return tree[1]
+    elif kind == 'ObjectLiteral':
+        return tuple(value for key, value in tree[1])
+    elif kind == 'Transform':
+        return tree[3] if tree[2] is None else (tree[2],) + tree[3]
+    elif kind == 'FilterExpression':
+        return tree[1:3]
+    elif kind == 'ConditionalExpression':
+        return tree[1:]
+    raise ValueError('Not a compact tree: ' + repr(tree))
+
+
+def expand_tree(tree, children):
+    """Build the Node for a compact tree from the Nodes of its children."""
+    kind = tree[0]
+    if kind == 'Literal':
+        return Literal(tree[1])
+    elif kind == 'Path':
+        node = children[0] if children else None
+        names = tree[2]
+        for index, name in enumerate(names):
+            node = Identifier(name, subject=node, relative=tree[3] and index == 0)
+        return node
+    elif kind == 'BinaryExpression':
+        node = BinaryExpression(tree[1], children[0], children[1])
+        node.left.parent = node
+        node.right.parent = node
+        return node
+    elif kind == 'UnaryExpression':
+        return UnaryExpression(tree[1], children[0])
+    elif kind == 'ArrayLiteral':
+        return ArrayLiteral(children)
+    elif kind == 'ObjectLiteral':
+        return ObjectLiteral(dict(zip([key for key, value in tree[1]], children)))
+    elif kind == 'Transform':
+        if tree[2] is None:
+            return Transform(tree[1], children, None)
+        return Transform(tree[1], children[1:], children[0])
+    elif kind == 'FilterExpression':
+        return FilterExpression(children[1], children[0], tree[3])
+    return ConditionalExpression(children[0], children[1], children[2])
+
+
+def compact(node):
+    """Return the compact form of a Node tree."""
+    return rebuild(node, node_children, compact_node)
+
+
+def expand(tree):
+    """Return the Node tree for a compact tree."""
+    return rebuild(tree, tree_children, expand_tree)
+
+
+class CompactEvaluator(object):
+    """Evaluates compact trees, with the same results as the Evaluator."""
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    def evaluate(self, tree, context=None):
+        if context is None:
+            context = Context()
+        return getattr(self, 'visit_' + tree[0])(tree, context)
+
+    def visit_Literal(self, tree, context):
+        return tree[1]
+
+    def visit_Path(self, tree, context):
+        subject, names, relative = tree[1:]
+        if relative:
+            value = context.relative_value
+        elif subject is not None:
+            value = self.evaluate(subject, context)
+        else:
+            value = context
+        for name in names:
+            value = value.get(name, None)
+        return value
+
+    def visit_BinaryExpression(self, tree, context):
+        operator = tree[1]
+        if not evaluates_left_first(operator):
+            return operator.evaluate(
+                lambda: self.evaluate(tree[2], context),
+                lambda: self.evaluate(tree[3], context)
+            )
+
+        # Left-nested chains are evaluated in a loop, like the Evaluator does.
+        chain = [tree]
+        while tree[2][0] == 'BinaryExpression' and evaluates_left_first(tree[2][1]):
+            tree = tree[2]
+            chain.append(tree)
+
+        value = self.evaluate(tree[2], context)
+        for tree in reversed(chain):
+            operator = tree[1]
+            if operator is AND:
+                value = value and self.evaluate(tree[3], context)
+            elif operator is OR:
+                value = value or self.evaluate(tree[3], context)
+            else:
+                value = operator.evaluate(value, self.evaluate(tree[3], context))
+        return value
+
+    def visit_UnaryExpression(self, tree, context):
+        return tree[1].do_evaluate(lambda: self.evaluate(tree[2], context))
+
+    def visit_ArrayLiteral(self, tree, context):
+        return [self.evaluate(item, context) for item in tree[1]]
+
+    def visit_ObjectLiteral(self, tree, context):
+        return dict((key, self.evaluate(value, context)) for key, value in tree[1])
+
+    def visit_Transform(self, tree, context):
+        name, subject, args = tree[1:]
+        subject = self.evaluate(subject, context)
+        transform_func = get_transform(self.config.transforms, name)
+        return transform_func(subject, *[self.evaluate(arg, context) for arg in args])
+
+    def visit_FilterExpression(self, tree, context):
+        subject, expression, relative = tree[1:]
+        values = self.evaluate(subject, context)
+        if relative:
+            return relative_filter(values, partial(self.evaluate, expression), context)
+        return index_filter(values, self.evaluate(expression, context))
+
+    def visit_ConditionalExpression(self, tree, context):
+        if self.evaluate(tree[1], context):
+            return self.evaluate(tree[2], context)
+        return self.evaluate(tree[3], context)
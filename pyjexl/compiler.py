@@ -0,0 +1,164 @@
+"""
+Compiles parsed expressions into trees of nested Python closures.
+
+Where the Evaluator dispatches on node type for every node of every
+evaluation, the ClosureCompiler walks the AST once and resolves
+operators, transforms and literal values up front, so evaluating the
+result is nothing but plain function calls.
+"""
+from pyjexl.evaluator import (
+    Context,
+    Evaluator,
+    index_filter,
+    missing_transform,
+    relative_filter,
+)
+from pyjexl.operators import default_binary_operators
+from pyjexl.parser import Literal
+from pyjexl.paths import resolve
+from pyjexl.utils import RecursionError
+
+
+def path_reader(names, attributes):
+    """Return a function reading a path from a value, see pyjexl.paths."""
+    if attributes:
+        return lambda value: resolve(value, names, True)
+    elif len(names) == 1:
+        name, = names
+        return lambda value: value.get(name, None)
+    elif len(names) == 2:
+        first, second = names
+        return lambda value: value.get(first, None).get(second, None)
+    return lambda value: resolve(value, names)
+
+
+class ClosureCompiler(object):
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    def compile(self, expression):
+        """
+        Compile an AST into a function that takes an optional context
+        and returns the value of the expression. Expressions nested too
+        deeply to compile, like very long chains of operators, are
+        evaluated with the Evaluator instead.
+        """
+        try:
+            function = self.visit(expression)
+        except RecursionError:
+            evaluator = Evaluator(self.config)
+            return lambda context=None: evaluator.evaluate(expression, context)
+
+        def evaluate(context=None):
+            return function(Context() if context is None else context)
+        return evaluate
+
+    def visit(self, expression):
+        method = getattr(self, 'compile_' + type(expression).__name__, self.generic_visit)
+        return method(expression)
+
+    def compile_BinaryExpression(self, exp):
+        operator = exp.operator
+        func = operator.evaluate
+        left = self.visit(exp.left)
+        right = self.visit(exp.right)
+
+        if operator is default_binary_operators.get('&&'):
+            return lambda context: left(context) and right(context)
+        elif operator is default_binary_operators.get('||'):
+            return lambda context: left(context) or right(context)
+        elif operator._evaluate_lazy:
+            return lambda context: func(lambda: left(context), lambda: right(context))
+
+        if isinstance(exp.left, Literal):
+            left_value = exp.left.value
+            return lambda context: func(left_value, right(context))
+        elif isinstance(exp.right, Literal):
+            right_value = exp.right.value
+            return lambda context: func(left(context), right_value)
+        return lambda context: func(left(context), right(context))
+
+    def compile_UnaryExpression(self, exp):
+        func = exp.operator.evaluate
+        right = self.visit(exp.right)
+        if exp.operator._evaluate_lazy:
+            return lambda context: func(lambda: right(context))
+        return lambda context: func(right(context))
+
+    def compile_Literal(self, literal):
+        value = literal.value
+        return lambda context: value
+
+    def compile_Identifier(self, identifier):
+        name = identifier.value
+        if identifier.relative:
+            return lambda context: context.relative_value.get(name, None)
+        elif identifier.subject:
+            subject = self.visit(identifier.subject)
+            return lambda context: subject(context).get(name, None)
+        return lambda context: context.get(name, None)
+
+    def compile_Path(self, path):
+        read = path_reader(path.names, path.attributes)
+        if path.relative:
+            return lambda context: read(context.relative_value)
+        elif path.subject is not None:
+            subject = self.visit(path.subject)
+            return lambda context: read(subject(context))
+        return read
+
+    def compile_ObjectLiteral(self, object_literal):
+        items = [(key, self.visit(value)) for key, value in object_literal.value.items()]
+        return lambda context: dict((key, value(context)) for key, value in items)
+
+    def compile_ArrayLiteral(self, array_literal):
+        values = [self.visit(value) for value in array_literal.value]
+        return lambda context: [value(context) for value in values]
+
+    def compile_Transform(self, transform):
+        try:
+            transform_func = self.config.transforms[transform.name]
+        except KeyError:
+            # The error is raised when the transform is evaluated, not
+            # when the expression is compiled.
+            name = transform.name
+            return lambda context: missing_transform(name)
+
+        subject = self.visit(transform.subject)
+        args = [self.visit(arg) for arg in transform.args]
+        if not args:
+            return lambda context: transform_func(subject(context))
+
+        def call_transform(context):
+            arg_values = [arg(context) for arg in args]
+            return transform_func(subject(context), *arg_values)
+        return call_transform
+
+    def compile_FilterExpression(self, filter_expression):
+        subject = self.visit(filter_expression.subject)
+        expression = self.visit(filter_expression.expression)
+
+        if filter_expression.relative:
+            return lambda context: relative_filter(subject(context), expression, context)
+        return lambda context: index_filter(subject(context), expression(context))
+
+    def compile_ConditionalExpression(self, conditional):
+        test = self.visit(conditional.test)
+        consequent = self.visit(conditional.consequent)
+        alternate = self.visit(conditional.alternate)
+        return lambda context: consequent(context) if test(context) else alternate(context)
+
+    def generic_visit(self, expression):
+        raise ValueError('Could not compile expression: ' + repr(expression))
+
+
+class ClosureEvaluator(object):
+    """
+    Drop-in replacement for Evaluator that compiles each expression
+    with the ClosureCompiler before evaluating it.
+    """
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+
+    def evaluate(self, expression, context=None):
+        return ClosureCompiler(self.config).compile(expression)(context)
@@ -1,27 +1,93 @@
 try:
-    from collections.abc import MutableMapping
+    from collections.abc import Mapping, MutableMapping
 except ImportError:
     # Python 2.7 compat
     # TODO: Decide if we stop supporting 2.7
     # as it's been EOL for a while now
-    from collections import MutableMapping
+    from collections import Mapping, MutableMapping
 
-from pyjexl.exceptions import MissingTransformError
+import time
+from functools import partial
 
+from pyjexl.exceptions import BudgetExceededError, MissingTransformError
+from pyjexl.operators import default_binary_operators
+from pyjexl.parser import BinaryExpression, FilterExpression, Identifier, Path, Transform
+from pyjexl.paths import resolve
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2.7 compat
+    monotonic = time.time
+
+
+class Lazy(object):
+    """
+    A value in a LazyMapping or Context that is only computed, by
+    calling provider with no arguments, if an expression reads it.
+    """
+    __slots__ = ('provider',)
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __repr__(self):
+        return 'Lazy({})'.format(repr(self.provider))
 
-class Context(MutableMapping):
-    def __init__(self, context_data=None):
-        self.data = context_data or {}
-        self.relative_value = {}
+
+class LazyMapping(Mapping):
+    """
+    A read-only mapping that computes its Lazy values when they are
+    first read and remembers them afterwards. Use it for nested values
+    that should be resolved lazily, like the user in user.profile.country.
+
+    resolver, if given, is called with any key that isn't in data and
+    should return its value or raise KeyError. Like Lazy values, it's
+    only called for keys that are read, and at most once per key.
+    """
+    def __init__(self, data=None, resolver=None):
+        self.data = data or {}
+        self.resolver = resolver
+        # Created when the first value is resolved, since most mappings
+        # never resolve anything.
+        self.resolved = None
 
     def __getitem__(self, key):
-        return self.data[key]
+        try:
+            value = self.data[key]
+        except KeyError:
+            if self.resolver is None:
+                raise
+            value = None
+        else:
+            if not isinstance(value, Lazy):
+                return value
 
-    def __setitem__(self, key, value):
-        self.data[key] = value
+        if self.resolved is None:
+            self.resolved = {}
+        try:
+            return self.resolved[key]
+        except KeyError:
+            result = value.provider() if value is not None else self.resolver(key)
+            self.resolved[key] = result
+            return result
 
-    def __delitem__(self, key):
-        del self.data[key]
+    def get(self, key, default=None):
+        # Mapping.get goes through __getitem__, which is slower for the
+        # plain values that make up most lookups.
+        try:
+            value = self.data[key]
+        except KeyError:
+            if self.resolver is None:
+                return default
+        else:
+            if not isinstance(value, Lazy):
+                return value
+
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
     def __iter__(self):
         return iter(self.data)
@@ -29,26 +95,357 @@ class Context(MutableMapping):
     def __len__(self):
         return len(self.data)
 
+
+class EmptyMapping(Mapping):
+    """A read-only mapping without any keys."""
+    def __getitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def __reduce__(self):
+        return 'EMPTY_MAPPING'
+
+
+#: An empty mapping shared by every Context as its relative value
+#: outside of any filter.
+EMPTY_MAPPING = EmptyMapping()
+
+
+class Context(LazyMapping, MutableMapping):
+    def __init__(self, context_data=None, resolver=None):
+        """
+        Lazy values in context_data, and the resolver, are resolved once
+        per Context, so a Context should not be reused for a different
+        client. See LazyMapping.
+        """
+        self.data = context_data or {}
+        self.resolver = resolver
+        self.resolved = None
+        self.relative_value = EMPTY_MAPPING
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        if self.resolved:
+            self.resolved.pop(key, None)
+
+    def __delitem__(self, key):
+        del self.data[key]
+        if self.resolved:
+            self.resolved.pop(key, None)
+
+    def reset(self, context_data):
+        """
+        Replace the data of this context, forgetting any lazy values that
+        were resolved for the old data.
+        """
+        self.data = context_data
+        if self.resolved:
+            self.resolved = {}
+
     def with_relative(self, relative_value):
-        new_context = Context(self.data)
+        """
+        Return a Context for the same data with another relative value.
+        Lazy values resolved by either context are shared with the other.
+        To evaluate an expression against many relative values, create
+        one scope with with_relative and set its relative_value for each
+        of them, rather than creating a Context per value.
+        """
+        if self.resolved is None:
+            self.resolved = {}
+        new_context = Context(self.data, self.resolver)
         new_context.relative_value = relative_value
+        new_context.resolved = self.resolved
         return new_context
 
 
+def relative_scope(context):
+    """
+    Return a Context to evaluate the expression of a relative filter in,
+    by setting its relative_value to each element in turn. context may
+    also be a plain mapping, whose values are read as they are.
+    """
+    if isinstance(context, Context):
+        return context.with_relative(None)
+    return Context(context)
+
+
+# The semantics of transforms and filters are shared by every backend
+# through the helpers below, so that they can't drift apart.
+
+def missing_transform(name):
+    raise MissingTransformError('No transform found with the name "{name}"'.format(name=name))
+
+
+def get_transform(transforms, name):
+    """Return the transform called name, or raise MissingTransformError."""
+    try:
+        return transforms[name]
+    except KeyError:
+        missing_transform(name)
+
+
+def relative_filter(values, predicate, context):
+    """
+    Return the elements of values for which predicate(scope) is truthy,
+    where scope is a Context for context with the element as its
+    relative value. values is iterated once.
+    """
+    scope = relative_scope(context)
+    results = []
+    for value in values:
+        scope.relative_value = value
+        if predicate(scope):
+            results.append(value)
+    return results
+
+
+def index_filter(values, filter_value):
+    """
+    Apply a filter whose expression isn't relative: true keeps all of
+    values, false none of them, and anything else is an index or key
+    into values, giving None if it's missing.
+    """
+    if filter_value is True:
+        return values
+    elif filter_value is False:
+        return None
+    try:
+        return values[filter_value]
+    except (IndexError, KeyError):
+        return None
+
+
+class EvaluationBudget(object):
+    """
+    Limits on the work done to evaluate an expression, for expressions
+    that can't be trusted to be cheap. Each limit is disabled if None:
+
+    max_nodes is the number of AST nodes evaluated, counting each
+    evaluation of the expression in a filter once per element.
+    max_filter_iterations is the total number of elements that filters
+    iterate over. max_collection_size is the largest list, dict or
+    string any part of the expression may evaluate to. max_depth is how
+    deeply nested evaluation may get. timeout is the number of seconds
+    evaluation may take.
+    """
+    def __init__(self, max_nodes=None, max_filter_iterations=None, max_collection_size=None,
+                 max_depth=None, timeout=None):
+        self.max_nodes = max_nodes
+        self.max_filter_iterations = max_filter_iterations
+        self.max_collection_size = max_collection_size
+        self.max_depth = max_depth
+        self.timeout = timeout
+
+    def __repr__(self):
+        return (
+            'EvaluationBudget(max_nodes={}, max_filter_iterations={}, '
+            'max_collection_size={}, max_depth={}, timeout={})'
+        ).format(
+            self.max_nodes, self.max_filter_iterations, self.max_collection_size,
+            self.max_depth, self.timeout
+        )
+
+
+#: How many nodes are evaluated between checks of the timeout.
+DEADLINE_CHECK_INTERVAL = 64
+
+SIZED_RESULT_TYPES = frozenset([list, dict, type(u''), bytes])
+
+
+def unlimited(limit):
+    """Turn a limit of None into one that is never reached."""
+    return float('inf') if limit is None else limit
+
+
+AND = default_binary_operators['&&']
+OR = default_binary_operators['||']
+
+
+def evaluates_left_first(operator):
+    """
+    Whether an operator always evaluates its left operand before
+    anything else, so that its left operand can be evaluated up front.
+    """
+    return not operator._evaluate_lazy or operator is AND or operator is OR
+
+
+def has_subject(node):
+    """
+    Whether a node is an identifier, path, transform or filter applied to
+    the value of another node, its subject.
+    """
+    return (isinstance(node, (Identifier, Path, Transform, FilterExpression))
+            and node.subject is not None)
+
+
 class Evaluator(object):
-    def __init__(self, jexl_config):
+    def __init__(self, jexl_config, budget=None):
+        """
+        If budget is given, evaluating raises a BudgetExceededError as
+        soon as any of the limits of the EvaluationBudget is exceeded.
+        An Evaluator with a budget keeps track of the current evaluation,
+        so it must not be used by several threads at once.
+        """
         self.config = jexl_config
+        self.budget = budget
+        if budget is not None:
+            # Shadow the methods with budgeted versions, so that
+            # evaluating without a budget has no overhead at all.
+            self.evaluate = self._evaluate_with_budget
+            self.iterate_filter = self._iterate_filter_with_budget
+            self.count_nodes = self._count_nodes_with_budget
+            self._depth = 0
 
     def evaluate(self, expression, context=None):
         method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
-        context = context or Context()
+        if context is None:
+            context = Context()
         return method(expression, context)
 
+    def visit(self, expression, context):
+        """Evaluate a node with the visit_ method for its type."""
+        method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
+        return method(expression, context)
+
+    def iterate_filter(self, values):
+        """Return the values a relative filter iterates over."""
+        return values
+
+    def inline(self, node):
+        """
+        Whether a node may be evaluated as a link of a chain, see
+        visit_BinaryExpression and evaluate_subject, rather than by
+        calling evaluate.
+        """
+        return True
+
+    def count_nodes(self, count):
+        """
+        Account for nodes that are evaluated without going through
+        evaluate, like the operators of a chain of binary expressions.
+        """
+
+    def _evaluate_with_budget(self, expression, context=None):
+        if self._depth == 0:
+            self._start_budget()
+            if context is None:
+                context = Context()
+
+        self._nodes += 1
+        if self._nodes > self._checkpoint:
+            self._check_budget()
+        if self._depth >= self._max_depth:
+            raise BudgetExceededError(
+                'Evaluation nested deeper than {} levels.'.format(self.budget.max_depth)
+            )
+
+        self._depth += 1
+        try:
+            result = self.visit(expression, context)
+        finally:
+            self._depth -= 1
+
+        if type(result) in SIZED_RESULT_TYPES and len(result) > self._max_collection_size:
+            raise BudgetExceededError(
+                'Result of {} has more than {} items.'.format(
+                    type(expression).__name__, self.budget.max_collection_size
+                )
+            )
+        return result
+
+    def _start_budget(self):
+        """Reset the counters at the start of a new evaluation."""
+        budget = self.budget
+        self._nodes = 0
+        self._filter_iterations = 0
+        self._deadline = None if budget.timeout is None else monotonic() + budget.timeout
+        self._max_depth = unlimited(budget.max_depth)
+        self._max_collection_size = unlimited(budget.max_collection_size)
+        self._update_checkpoint()
+
+    def _update_checkpoint(self):
+        """
+        Set the node count at which _check_budget is next called: when
+        the node limit is exceeded, or when it is time to check the
+        deadline again.
+        """
+        self._checkpoint = unlimited(self.budget.max_nodes)
+        if self._deadline is not None:
+            self._checkpoint = min(self._checkpoint, self._nodes + DEADLINE_CHECK_INTERVAL)
+
+    def _check_budget(self):
+        budget = self.budget
+        if budget.max_nodes is not None and self._nodes > budget.max_nodes:
+            raise BudgetExceededError(
+                'Evaluated more than {} nodes.'.format(budget.max_nodes)
+            )
+        if self._deadline is not None and monotonic() > self._deadline:
+            raise BudgetExceededError(
+                'Evaluation took longer than {} seconds.'.format(budget.timeout)
+            )
+        self._update_checkpoint()
+
+    def _count_nodes_with_budget(self, count):
+        self._nodes += count
+        if self._nodes > self._checkpoint:
+            self._check_budget()
+
+    def _iterate_filter_with_budget(self, values):
+        limit = self.budget.max_filter_iterations
+        if limit is None:
+            return values
+        return self._count_filter_iterations(values, limit)
+
+    def _count_filter_iterations(self, values, limit):
+        # Elements are counted as they're reached, since values may be
+        # any iterable, like a generator returned by a transform.
+        for value in values:
+            self._filter_iterations += 1
+            if self._filter_iterations > limit:
+                raise BudgetExceededError(
+                    'Filters iterated over more than {} elements.'.format(limit)
+                )
+            yield value
+
     def visit_BinaryExpression(self, exp, context):
-        return exp.operator.do_evaluate(
-            lambda: self.evaluate(exp.left, context),
-            lambda: self.evaluate(exp.right, context)
-        )
+        if not evaluates_left_first(exp.operator):
+            return exp.operator.evaluate(
+                lambda: self.evaluate(exp.left, context),
+                lambda: self.evaluate(exp.right, context)
+            )
+
+        # The parser nests chains like `a + b + c` to the left. They are
+        # evaluated bottom-up in a loop, so that a long chain doesn't
+        # need a stack frame per operator.
+        chain = []
+        left = exp.left
+        while (isinstance(left, BinaryExpression) and evaluates_left_first(left.operator)
+               and self.inline(left)):
+            chain.append(left)
+            left = left.left
+        self.count_nodes(len(chain))
+
+        value = self.evaluate(left, context)
+        for link in reversed(chain):
+            value = self.apply_link(link, value, context)
+        return self.apply_BinaryExpression(exp, value, context)
+
+    def apply_BinaryExpression(self, exp, left, context):
+        """
+        Evaluate a binary expression whose operator evaluates its left
+        operand first, given the value of that operand.
+        """
+        operator = exp.operator
+        if operator is AND:
+            return left and self.evaluate(exp.right, context)
+        elif operator is OR:
+            return left or self.evaluate(exp.right, context)
+        return operator.evaluate(left, self.evaluate(exp.right, context))
 
     def visit_UnaryExpression(self, exp, context):
         return exp.operator.do_evaluate(lambda: self.evaluate(exp.right, context))
@@ -56,16 +453,66 @@ class Evaluator(object):
     def visit_Literal(self, literal, context):
         return literal.value
 
+    def evaluate_subject(self, node, context):
+        """
+        Evaluate the subject of an identifier, transform or filter.
+        Chains like `a.b.c` or `a[.x][.y]` nest through their subjects,
+        and are evaluated bottom-up in a loop so that a long chain
+        doesn't need a stack frame per link.
+        """
+        subject = node.subject
+        if not (has_subject(subject) and self.inline(subject)):
+            return self.evaluate(subject, context)
+
+        chain = []
+        while has_subject(subject) and self.inline(subject):
+            chain.append(subject)
+            subject = subject.subject
+        self.count_nodes(len(chain))
+
+        value = self.evaluate(subject, context)
+        for link in reversed(chain):
+            value = self.apply_link(link, value, context)
+        return value
+
+    def apply_link(self, link, value, context):
+        """
+        Evaluate a link of a chain walked in a loop, given the value of
+        the link below it, with the apply_ method for its type. See
+        visit_BinaryExpression and evaluate_subject.
+        """
+        return getattr(self, 'apply_' + type(link).__name__)(link, value, context)
+
     def visit_Identifier(self, identifier, context):
         if identifier.relative:
             subject = context.relative_value
         elif identifier.subject:
-            subject = self.evaluate(identifier.subject, context)
+            subject = self.evaluate_subject(identifier, context)
         else:
             subject = context
 
         return subject.get(identifier.value, None)
 
+    def apply_Identifier(self, identifier, subject, context):
+        return subject.get(identifier.value, None)
+
+    def visit_Path(self, path, context):
+        if path.relative:
+            value = context.relative_value
+        elif path.subject is not None:
+            value = self.evaluate_subject(path, context)
+        else:
+            value = context
+
+        if path.attributes:
+            return resolve(value, path.names, True)
+        for name in path.names:
+            value = value.get(name, None)
+        return value
+
+    def apply_Path(self, path, subject, context):
+        return resolve(subject, path.names, path.attributes)
+
     def visit_ObjectLiteral(self, object_literal, context):
         return dict(
             (key, self.evaluate(value, context))
@@ -76,34 +523,24 @@ class Evaluator(object):
         return [self.evaluate(value, context) for value in array_literal.value]
 
     def visit_Transform(self, transform, context):
-        try:
-            transform_func = self.config.transforms[transform.name]
-        except KeyError:
-            raise MissingTransformError(
-                'No transform found with the name "{name}"'.format(name=transform.name)
-            )
+        return self.apply_Transform(transform, self.evaluate_subject(transform, context), context)
 
-        args = [self.evaluate(arg) for arg in transform.args]
-        return transform_func(self.evaluate(transform.subject, context), *args)
+    def apply_Transform(self, transform, subject, context):
+        transform_func = get_transform(self.config.transforms, transform.name)
+        args = [self.evaluate(arg, context) for arg in transform.args]
+        return transform_func(subject, *args)
 
     def visit_FilterExpression(self, filter_expression, context):
-        values = self.evaluate(filter_expression.subject, context)
+        values = self.evaluate_subject(filter_expression, context)
+        return self.apply_FilterExpression(filter_expression, values, context)
+
+    def apply_FilterExpression(self, filter_expression, values, context):
+        expression = filter_expression.expression
         if filter_expression.relative:
-            return [
-                value for value in values
-                if self.evaluate(filter_expression.expression, context.with_relative(value))
-            ]
-        else:
-            filter_value = self.evaluate(filter_expression.expression, context)
-            if filter_value is True:
-                return values
-            elif filter_value is False:
-                return None
-            else:
-                try:
-                    return values[filter_value]
-                except (IndexError, KeyError):
-                    return None
+            return relative_filter(
+                self.iterate_filter(values), partial(self.evaluate, expression), context
+            )
+        return index_filter(values, self.evaluate(expression, context))
 
     def visit_ConditionalExpression(self, conditional, context):
         if self.evaluate(conditional.test, context):
@@ -10,9 +10,21 @@ class InvalidOperatorError(ParseError):
     """An invalid operator was used."""
 
 
+class ExpressionTooComplexError(ParseError):
+    """An expression is too long or too deeply nested to be parsed."""
+
+
 class EvaluationError(JEXLException):
     """An error during evaluation of a parsed expression."""
 
 
 class MissingTransformError(EvaluationError):
     """An unregistered transform was used."""
+
+
+class BudgetExceededError(EvaluationError):
+    """Evaluating an expression exceeded a limit of its EvaluationBudget."""
+
+
+class PrecompiledError(JEXLException):
+    """Precompiled expressions are invalid or don't match the configuration."""
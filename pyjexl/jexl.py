@@ -4,36 +4,282 @@ from functools import wraps
 
 from parsimonious.exceptions import ParseError as ParsimoniousParseError
 
+from pyjexl import serialization
 from pyjexl.analysis import ValidatingAnalyzer
-from pyjexl.evaluator import Context, Evaluator
-from pyjexl.exceptions import ParseError
+from pyjexl.cache import LRUCache
+from pyjexl.codegen import PythonCompiler
+from pyjexl.compiler import ClosureCompiler
+from pyjexl.evaluator import Context, EMPTY_MAPPING, Evaluator
+from pyjexl.exceptions import ExpressionTooComplexError, ParseError
+from pyjexl.memoize import batched, BATCH, MemoizedTransform, Scope, scoped, scoped_policies
 from pyjexl.operators import default_binary_operators, default_unary_operators, Operator
-from pyjexl.parser import jexl_grammar, Parser
+from pyjexl.optimizer import ConstantFolder, flatten_paths
+from pyjexl.parallel import ParallelEvaluator
+from pyjexl.parser import check_limits, jexl_grammar, Parser
+from pyjexl.pratt import PrattParser
+from pyjexl.profiling import InstrumentedEvaluator
+from pyjexl.streaming import StreamingEvaluator
+from pyjexl.utils import chunked, RecursionError
+from pyjexl.vectorized import VectorizedEvaluator
 
 
 #: Encapsulates the variable parts of JEXL that affect parsing and
-#: evaluation.
-JEXLConfig = namedtuple('JEXLConfig', ['transforms', 'unary_operators', 'binary_operators'])
+#: evaluation. pure_transforms holds the names of transforms that may be
+#: evaluated ahead of time by the optimizer.
+JEXLConfig = namedtuple('JEXLConfig', [
+    'transforms', 'unary_operators', 'binary_operators', 'pure_transforms'
+])
+JEXLConfig.__new__.__defaults__ = (frozenset(),)
+
+
+def invalidates_compiled(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self._config_version += 1
+        return func(self, *args, **kwargs)
+    return wrapper
 
 
 def invalidates_grammar(func):
     @wraps(func)
     def wrapper(self, *args, **kwargs):
         self._grammar = None
+        self._cache.clear()
+        self._config_version += 1
         return func(self, *args, **kwargs)
     return wrapper
 
 
+class CompiledExpression(object):
+    """
+    A parsed expression bound to the JEXL instance that parsed it, ready
+    to be evaluated against any number of contexts.
+    """
+    def __init__(self, jexl, expression, ast):
+        self.jexl = jexl
+        self.expression = expression
+        self.ast = ast
+
+        self._function = None
+        self._policies = None
+        self._config_version = None
+
+    def evaluate(self, context=None):
+        """
+        Evaluate the expression against a Context or a plain mapping.
+
+        Plain mappings are read through a wrapper Context, which resolves
+        their Lazy values. Wrappers are kept in a pool on the JEXL
+        instance and reused, rather than created for every evaluation.
+        """
+        if context is None:
+            return self.function(self.jexl.context)
+        elif isinstance(context, Context):
+            return self.function(context)
+
+        # list.pop and list.append are atomic, so each wrapper is only
+        # used by one thread, or one nested evaluation, at a time.
+        contexts = self.jexl._contexts
+        try:
+            wrapper = contexts.pop()
+        except IndexError:
+            wrapper = Context()
+        wrapper.reset(context)
+        try:
+            return self.function(wrapper)
+        finally:
+            # Don't keep the data alive while the wrapper is in the pool.
+            wrapper.reset(EMPTY_MAPPING)
+            contexts.append(wrapper)
+
+    def evaluate_many(self, contexts, chunksize=1000, on_error=None):
+        """
+        Evaluate the expression against each context in an iterable and
+        yield the results in order.
+
+        Contexts are consumed chunksize at a time, so any iterable,
+        including a generator of millions of records, can be processed
+        in constant memory.
+
+        If on_error is given, a context that fails to evaluate doesn't
+        stop the iteration: instead, on_error(index, context, error) is
+        called and no result is yielded for that context.
+        """
+        wrapper = Context()
+        index = 0
+        for chunk in chunked(contexts, chunksize):
+            function = batched(self.function, self._policies)
+            for record in chunk:
+                if isinstance(record, Context):
+                    context = record
+                else:
+                    wrapper.reset(record)
+                    context = wrapper
+
+                try:
+                    result = function(context)
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    on_error(index, record, error)
+                else:
+                    yield result
+                index += 1
+
+    @property
+    def function(self):
+        """
+        The function that evaluates this expression against a Context.
+        """
+        if self._config_version != self.jexl._config_version:
+            self._policies = scoped_policies(self.jexl.config.transforms)
+            self._function = scoped(self._compile(), self._policies)
+            self._config_version = self.jexl._config_version
+        return self._function
+
+    def _compile(self):
+        """
+        Build the function used to evaluate this expression with the
+        backend chosen on the JEXL instance. Compiled functions capture
+        the current transforms, so this is repeated whenever the JEXL
+        configuration changes.
+        """
+        config = self.jexl.config
+        ast = self.ast
+        if self.jexl.optimize:
+            try:
+                ast = ConstantFolder(config).visit(ast)
+            except RecursionError:
+                # Too deeply nested to optimize, but it can still be
+                # evaluated as is.
+                pass
+        if self.jexl.optimize or self.jexl.attribute_access:
+            ast = flatten_paths(ast, self.jexl.attribute_access)
+
+        budget = self.jexl.budget
+        hooks = self.jexl.hooks
+        if hooks is not None:
+            return self._instrument(ast, hooks, budget)
+        elif budget is not None:
+            # Budgets are enforced by the interpreter, which tracks each
+            # evaluation separately so expressions stay thread-safe.
+            return lambda context: Evaluator(config, budget).evaluate(ast, context)
+
+        if self.jexl.backend == 'closure':
+            return ClosureCompiler(config).compile(ast)
+        elif self.jexl.backend == 'python':
+            return PythonCompiler(config).compile(ast)
+        elif self.jexl.backend == 'streaming':
+            evaluator = StreamingEvaluator(config)
+        else:
+            evaluator = Evaluator(config)
+        return lambda context: evaluator.evaluate(ast, context)
+
+    def _instrument(self, ast, hooks, budget):
+        """
+        Build an evaluation function that runs through hooks. Every node
+        has to be visited, so the interpreter is used for every backend.
+        """
+        config = self.jexl.config
+        expression = self.expression
+        if budget is not None:
+            def evaluate(context):
+                return InstrumentedEvaluator(config, hooks, budget).evaluate(ast, context)
+        else:
+            evaluator = InstrumentedEvaluator(config, hooks)
+
+            def evaluate(context):
+                return evaluator.evaluate(ast, context)
+
+        return lambda context: hooks.around_evaluate(expression, ast, context, evaluate)
+
+    def __repr__(self):
+        return 'CompiledExpression({})'.format(repr(self.expression))
+
+
 class JEXL(object):
-    def __init__(self, context=None):
+    #: Parser backends that can be selected with the parser argument.
+    parsers = ('parsimonious', 'pratt')
+
+    #: Evaluation backends that can be selected with the backend argument.
+    backends = ('interpreter', 'closure', 'python', 'streaming')
+
+    def __init__(self, context=None, cache_size=256, parser='parsimonious',
+                 backend='interpreter', optimize=False, budget=None, max_length=None,
+                 max_depth=None, hooks=None, attribute_access=False):
+        """
+        cache_size is the maximum number of parsed expressions to keep
+        around for reuse. Use None for an unbounded cache, or 0 to
+        disable caching.
+
+        parser selects how expressions are parsed: 'parsimonious' uses
+        the PEG grammar from pyjexl.parser, while 'pratt' uses the
+        faster hand-written parser from pyjexl.pratt. Both produce the
+        same AST.
+
+        backend selects how compiled expressions are evaluated:
+        'interpreter' walks the AST with the Evaluator on every call,
+        'closure' compiles it once into nested Python closures with the
+        ClosureCompiler, 'python' generates and compiles Python
+        source code for it with the PythonCompiler, and 'streaming' is
+        the interpreter with relative filters evaluated lazily by the
+        StreamingEvaluator.
+
+        If optimize is True, compiled expressions are simplified with the
+        ConstantFolder before they are evaluated, and chains of
+        identifiers like `a.b.c` are read in one step, see
+        pyjexl.optimizer.flatten_paths.
+
+        If attribute_access is True, identifiers also read the
+        attributes of values that aren't mappings, like dataclasses and
+        other objects, except for attributes starting with an
+        underscore. See pyjexl.paths.
+
+        budget is an optional EvaluationBudget limiting the work done by
+        each evaluation of a compiled expression. Expressions with a
+        budget are always evaluated by the interpreter. RuleSets enforce
+        the budget for each rule, while evaluate_async and
+        evaluate_columns can't enforce it and raise a ValueError instead.
+
+        hooks is an optional pyjexl.profiling.Hooks instance called
+        around parsing, evaluation, and every node and transform call,
+        such as a Profiler. It can also be set later through the hooks
+        attribute.
+        """
+        if parser not in self.parsers:
+            raise ValueError('Unknown parser: {}'.format(parser))
+        if backend not in self.backends:
+            raise ValueError('Unknown backend: {}'.format(backend))
+
         self.context = Context(context or {})
+        self.parser = parser
+        self.backend = backend
+        self.optimize = optimize
+        self.budget = budget
+        self.max_length = max_length
+        self.max_depth = max_depth
+        self._hooks = hooks
+        self.attribute_access = attribute_access
         self.config = JEXLConfig(
             transforms={},
             unary_operators=default_unary_operators.copy(),
-            binary_operators=default_binary_operators.copy()
+            binary_operators=default_binary_operators.copy(),
+            pure_transforms=set()
         )
 
         self._grammar = None
+        self._cache = LRUCache(cache_size)
+        self._config_version = 0
+        self._contexts = []
+
+    @property
+    def hooks(self):
+        return self._hooks
+
+    @hooks.setter
+    @invalidates_compiled
+    def hooks(self, hooks):
+        self._hooks = hooks
 
     @property
     def grammar(self):
@@ -42,38 +288,125 @@ class JEXL(object):
         return self._grammar
 
     @invalidates_grammar
-    def add_binary_operator(self, operator, precedence, func):
-        self.config.binary_operators[operator] = Operator(operator, precedence, func)
+    def add_binary_operator(self, operator, precedence, func, pure=False):
+        self.config.binary_operators[operator] = Operator(operator, precedence, func, pure=pure)
 
     @invalidates_grammar
     def remove_binary_operator(self, operator):
         del self.config.binary_operators[operator]
 
     @invalidates_grammar
-    def add_unary_operator(self, operator, func):
-        self.config.unary_operators[operator] = Operator(operator, 1000, func)
+    def add_unary_operator(self, operator, func, pure=False):
+        self.config.unary_operators[operator] = Operator(operator, 1000, func, pure=pure)
 
     @invalidates_grammar
     def remove_unary_operator(self, operator):
         del self.config.unary_operators[operator]
 
-    def add_transform(self, name, func):
+    @invalidates_compiled
+    def add_transform(self, name, func, pure=False, cache=None, maxsize=128, ttl=None):
+        """
+        Register a transform. Pass pure=True if the transform has no side
+        effects and always returns the same result for the same
+        arguments, so that it may be evaluated ahead of time.
+
+        The results of pure transforms can also be memoized, by passing
+        a cache policy: 'evaluation', 'batch', or 'global' for an LRU
+        cache holding at most maxsize results for at most ttl seconds.
+        See pyjexl.memoize.
+        """
+        if cache is not None:
+            if not pure:
+                raise ValueError('Only pure transforms can be memoized')
+            func = MemoizedTransform(func, cache, maxsize, ttl)
+
         self.config.transforms[name] = func
+        if pure:
+            self.config.pure_transforms.add(name)
+        else:
+            self.config.pure_transforms.discard(name)
 
+    @invalidates_compiled
     def remove_transform(self, name):
         del self.config.transforms[name]
+        self.config.pure_transforms.discard(name)
 
-    def transform(self, name=None):
+    def transform(self, name=None, pure=False, cache=None, maxsize=128, ttl=None):
         def wrapper(func):
-            self.config.transforms[name or func.__name__] = func
+            self.add_transform(name or func.__name__, func, pure, cache, maxsize, ttl)
             return func
         return wrapper
 
+    def transform_cache_info(self):
+        """
+        Return a dict mapping the names of memoized transforms to a
+        CacheInfo with their cache hits and misses.
+        """
+        return dict(
+            (name, func.cache_info()) for name, func in self.config.transforms.items()
+            if isinstance(func, MemoizedTransform)
+        )
+
     def parse(self, expression):
+        """
+        Parse an expression into an AST. Results are cached, so the
+        returned tree is shared and must not be modified.
+        """
+        return self.compile(expression).ast
+
+    def compile(self, expression):
+        """
+        Parse an expression into a CompiledExpression that can be
+        evaluated repeatedly without re-parsing.
+        """
+        compiled = self._cache.get(expression)
+        if compiled is None:
+            compiled = CompiledExpression(self, expression, self._parse(expression))
+            self._cache.set(expression, compiled)
+        return compiled
+
+    def precompile(self, expressions):
+        """
+        Parse an iterable of expressions and return them serialized as
+        bytes that load_precompiled can read back without parsing them
+        again. See pyjexl.serialization.
+        """
+        return serialization.dumps(
+            dict((expression, self.parse(expression)) for expression in expressions),
+            self.config
+        )
+
+    def load_precompiled(self, data):
+        """
+        Load expressions serialized by precompile into the cache, and
+        return a dict mapping them to CompiledExpressions. Raises
+        PrecompiledError if the data was written with a different
+        configuration, such as other operators or transforms.
+        """
+        compiled = {}
+        for expression, ast in serialization.loads(data, self.config).items():
+            compiled[expression] = CompiledExpression(self, expression, ast)
+            self._cache.set(expression, compiled[expression])
+        return compiled
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _parse(self, expression):
+        if self._hooks is not None:
+            return self._hooks.around_parse(expression, self._parse_expression)
+        return self._parse_expression(expression)
+
+    def _parse_expression(self, expression):
+        check_limits(expression, self.max_length, self.max_depth)
         try:
+            if self.parser == 'pratt':
+                return PrattParser(self.config).parse(expression)
             return Parser(self.config).visit(self.grammar.parse(expression))
         except ParsimoniousParseError:
             raise ParseError('Could not parse expression: ' + expression)
+        except RecursionError:
+            raise ExpressionTooComplexError('Expression is nested too deeply to parse.')
 
     def analyze(self, expression, AnalyzerClass):
         parsed_expression = self.parse(expression)
@@ -88,6 +421,53 @@ class JEXL(object):
             yield str(err)
 
     def evaluate(self, expression, context=None):
-        parsed_expression = self.parse(expression)
-        context = Context(context) if context is not None else self.context
-        return Evaluator(self.config).evaluate(parsed_expression, context)
+        return self.compile(expression).evaluate(context)
+
+    def evaluate_async(self, expression, context=None):
+        """
+        Return an awaitable that evaluates an expression with the
+        AsyncEvaluator, awaiting asynchronous transforms and context
+        values. Requires Python 3. Not available with a budget.
+        """
+        # Imported here because the module uses syntax that doesn't
+        # exist in Python 2.
+        from pyjexl.async_evaluator import AsyncEvaluator
+
+        self._check_no_budget('evaluate_async')
+
+        if context is None:
+            context = self.context
+        elif not isinstance(context, Context):
+            context = Context(context)
+        return AsyncEvaluator(self.config).evaluate(self.parse(expression), context)
+
+    def evaluate_many(self, expression, contexts, chunksize=1000, on_error=None):
+        """
+        Evaluate an expression against each context in an iterable,
+        parsing it only once. See CompiledExpression.evaluate_many.
+        """
+        return self.compile(expression).evaluate_many(contexts, chunksize, on_error)
+
+    def parallel(self, expressions, processes=None, chunksize=1000, max_pending=None):
+        """
+        Return a ParallelEvaluator for evaluating expressions against
+        many contexts in worker processes. See pyjexl.parallel.
+        """
+        return ParallelEvaluator(self, expressions, processes, chunksize, max_pending)
+
+    def evaluate_columns(self, expression, columns):
+        """
+        Evaluate an expression for every row of a batch of records
+        stored as a dict of columns, and return a NumPy array of the
+        results. Requires NumPy; see pyjexl.vectorized. Not available
+        with a budget.
+        """
+        self._check_no_budget('evaluate_columns')
+        with Scope(BATCH):
+            return VectorizedEvaluator(self.config).evaluate(self.parse(expression), columns)
+
+    def _check_no_budget(self, method):
+        # The AsyncEvaluator and VectorizedEvaluator don't track the work
+        # they do, so they would silently ignore the budget.
+        if self.budget is not None:
+            raise ValueError('{} cannot enforce an EvaluationBudget.'.format(method))
@@ -0,0 +1,206 @@
+"""
+Memoization of pure transforms, registered with
+JEXL.add_transform(name, func, pure=True, cache=policy).
+
+The cache policy decides how long results are remembered:
+
+- 'evaluation': for one evaluation, such as a call to JEXL.evaluate,
+  a context in evaluate_many, or every rule of a RuleSet evaluated
+  against a context.
+- 'batch': for a chunk of contexts in evaluate_many or a
+  ParallelEvaluator, or a call to JEXL.evaluate_columns.
+- 'global': in an LRUCache shared by every evaluation, holding at most
+  maxsize results, each for at most ttl seconds.
+
+Results are keyed on the subject and arguments of the transform. Lists,
+tuples and dicts are keyed by their contents, and values of different
+types are never confused, even if they compare equal, like 1 and True.
+Calls with arguments that can't be keyed, or made outside of a scope
+for their policy, like in the AsyncEvaluator, aren't memoized.
+
+Memoized results are shared, so transforms must not return values that
+are modified later.
+"""
+import inspect
+import threading
+from collections import namedtuple
+
+from pyjexl.cache import LRUCache
+
+
+EVALUATION = 'evaluation'
+BATCH = 'batch'
+GLOBAL = 'global'
+
+#: Cache policies that can be passed to JEXL.add_transform.
+POLICIES = (EVALUATION, BATCH, GLOBAL)
+
+#: Statistics about the calls to a memoized transform. uncached counts
+#: calls that weren't memoized, and size is the number of results held
+#: by a global cache, or None for the other policies.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'uncached', 'size'])
+
+_scopes = threading.local()
+_missing = object()
+
+
+def freeze(value):
+    """
+    Return a hashable key for a value, including its type, or raise
+    TypeError if it has none.
+    """
+    value_type = type(value)
+    if value_type is list or value_type is tuple:
+        return value_type, tuple(freeze(item) for item in value)
+    elif value_type is dict:
+        return value_type, frozenset((key, freeze(item)) for key, item in value.items())
+    hash(value)
+    return value_type, value
+
+
+class Scope(object):
+    """
+    Memoizes the results of transforms with a policy while it's entered,
+    on the current thread. If a scope for the same policy is already
+    active, it's used instead, so results live as long as the outermost
+    scope. A Scope may be entered many times to share its results, for
+    example once for each context in a batch.
+    """
+    def __init__(self, policy):
+        self.policy = policy
+        self.memo = {}
+        self._entered = []
+
+    def __enter__(self):
+        active = getattr(_scopes, self.policy, None) is None
+        if active:
+            setattr(_scopes, self.policy, self.memo)
+        self._entered.append(active)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._entered.pop():
+            setattr(_scopes, self.policy, None)
+
+
+def scoped_policies(transforms):
+    """Return the set of scoped policies used by a dict of transforms."""
+    return set(
+        func.policy for func in transforms.values()
+        if isinstance(func, MemoizedTransform) and func.policy != GLOBAL
+    )
+
+
+def scoped(function, policies):
+    """
+    Wrap a function that evaluates an expression against a context so
+    that each call is an evaluation for transforms memoized per
+    evaluation.
+    """
+    if EVALUATION not in policies:
+        return function
+
+    def evaluate(context):
+        with Scope(EVALUATION):
+            return function(context)
+    return evaluate
+
+
+def batched(function, policies):
+    """
+    Wrap a function that evaluates an expression against a context so
+    that every call belongs to one batch, for transforms memoized per
+    batch.
+    """
+    if BATCH not in policies:
+        return function
+
+    batch = Scope(BATCH)
+
+    def evaluate(context):
+        with batch:
+            return function(context)
+    return evaluate
+
+
+class MemoizedTransform(object):
+    """
+    A transform that remembers its results according to a cache policy.
+    See the module docstring.
+    """
+    def __init__(self, func, policy=EVALUATION, maxsize=128, ttl=None):
+        if policy not in POLICIES:
+            raise ValueError('Unknown cache policy: {}'.format(policy))
+        iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+        if iscoroutinefunction is not None and iscoroutinefunction(func):
+            raise ValueError('Asynchronous transforms cannot be memoized')
+
+        self.func = self.__wrapped__ = func
+        self.policy = policy
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache = LRUCache(maxsize, ttl=ttl) if policy == GLOBAL else None
+        # The statistics are shared by every thread calling the
+        # transform, so they're updated under the lock of the cache.
+        self._lock = self.cache._lock if self.cache is not None else threading.Lock()
+        self.hits = self.misses = self.uncached = 0
+
+    def __call__(self, *args):
+        try:
+            key = freeze(args)
+        except TypeError:
+            with self._lock:
+                self.uncached += 1
+            return self.func(*args)
+
+        if self.cache is not None:
+            result = self.cache.get(key, _missing)
+            if result is _missing:
+                with self._lock:
+                    self.misses += 1
+                result = self.func(*args)
+                self.cache.set(key, result)
+            else:
+                with self._lock:
+                    self.hits += 1
+            return result
+
+        memo = getattr(_scopes, self.policy, None)
+        if memo is None:
+            with self._lock:
+                self.uncached += 1
+            return self.func(*args)
+        try:
+            results = memo[self]
+        except KeyError:
+            results = memo[self] = {}
+        try:
+            result = results[key]
+        except KeyError:
+            with self._lock:
+                self.misses += 1
+            result = results[key] = self.func(*args)
+        else:
+            with self._lock:
+                self.hits += 1
+        return result
+
+    def __reduce__(self):
+        # Caches and statistics stay behind, for example when the
+        # transform is sent to the workers of a ParallelEvaluator.
+        return MemoizedTransform, (self.func, self.policy, self.maxsize, self.ttl)
+
+    def cache_info(self):
+        with self._lock:
+            size = len(self.cache) if self.cache is not None else None
+            return CacheInfo(self.hits, self.misses, self.uncached, size)
+
+    def cache_clear(self):
+        """Forget the results of a global cache and reset the statistics."""
+        if self.cache is not None:
+            self.cache.clear()
+        with self._lock:
+            self.hits = self.misses = self.uncached = 0
+
+    def __repr__(self):
+        return 'MemoizedTransform({!r}, {!r})'.format(self.func, self.policy)
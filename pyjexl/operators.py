@@ -2,50 +2,72 @@ import operator
 
 
 class Operator(object):
-    __slots__ = ('symbol', 'precedence', 'evaluate', '_evaluate_lazy')
+    __slots__ = ('symbol', 'precedence', 'evaluate', '_evaluate_lazy', 'pure')
 
-    def __init__(self, symbol, precedence, evaluate, evaluate_lazy=False):
+    def __init__(self, symbol, precedence, evaluate, evaluate_lazy=False, pure=False):
         """Operator definition.
 
         If evaluate_lazy is set to True, the `evaluate()` method will receive
         it's parameters as a lambda expression that needs to be called to
         receive the value of the expression. Otherwise, the values will
         already be evaluated.
+
+        If pure is set to True, the operator promises to have no side
+        effects and to always return the same result for the same
+        operands, which allows it to be evaluated ahead of time.
         """
         self.symbol = symbol
         self.precedence = precedence
         self.evaluate = evaluate
         self._evaluate_lazy = evaluate_lazy
+        self.pure = pure
 
     def do_evaluate(self, *args):
         if self._evaluate_lazy:
             return self.evaluate(*args)
         return self.evaluate(*(arg() for arg in args))
 
+    def __reduce__(self):
+        # The default operators are pickled by reference, so that they
+        # unpickle as the same objects and their lambdas don't need to
+        # be pickled at all.
+        if default_binary_operators.get(self.symbol) is self:
+            return (default_operator, (self.symbol,))
+        elif default_unary_operators.get(self.symbol) is self:
+            return (default_operator, (self.symbol, True))
+        return (Operator, (
+            self.symbol, self.precedence, self.evaluate, self._evaluate_lazy, self.pure
+        ))
+
     def __repr__(self):
         return 'Operator({})'.format(repr(self.symbol))
 
 
+def default_operator(symbol, unary=False):
+    operators = default_unary_operators if unary else default_binary_operators
+    return operators[symbol]
+
+
 default_binary_operators = {
-    '+': Operator('+', 30, operator.add),
-    '-': Operator('-', 30, operator.sub),
-    '*': Operator('*', 40, operator.mul),
-    '//': Operator('//', 40, operator.floordiv),
-    '/': Operator('/', 40, operator.truediv),
-    '%': Operator('%', 50, operator.mod),
-    '^': Operator('^', 50, operator.pow),
-    '==': Operator('==', 20, operator.eq),
-    '!=': Operator('!=', 20, operator.ne),
-    '>=': Operator('>=', 20, operator.ge),
-    '>': Operator('>', 20, operator.gt),
-    '<=': Operator('<=', 20, operator.le),
-    '<': Operator('<', 20, operator.lt),
-    '&&': Operator('&&', 10, lambda a, b: a() and b(), evaluate_lazy=True),
-    '||': Operator('||', 10, lambda a, b: a() or b(), evaluate_lazy=True),
-    'in': Operator('in', 20, lambda a, b: a in b),
+    '+': Operator('+', 30, operator.add, pure=True),
+    '-': Operator('-', 30, operator.sub, pure=True),
+    '*': Operator('*', 40, operator.mul, pure=True),
+    '//': Operator('//', 40, operator.floordiv, pure=True),
+    '/': Operator('/', 40, operator.truediv, pure=True),
+    '%': Operator('%', 50, operator.mod, pure=True),
+    '^': Operator('^', 50, operator.pow, pure=True),
+    '==': Operator('==', 20, operator.eq, pure=True),
+    '!=': Operator('!=', 20, operator.ne, pure=True),
+    '>=': Operator('>=', 20, operator.ge, pure=True),
+    '>': Operator('>', 20, operator.gt, pure=True),
+    '<=': Operator('<=', 20, operator.le, pure=True),
+    '<': Operator('<', 20, operator.lt, pure=True),
+    '&&': Operator('&&', 10, lambda a, b: a() and b(), evaluate_lazy=True, pure=True),
+    '||': Operator('||', 10, lambda a, b: a() or b(), evaluate_lazy=True, pure=True),
+    'in': Operator('in', 20, lambda a, b: a in b, pure=True),
 }
 
 
 default_unary_operators = {
-    '!': Operator('!', 1000, operator.not_),
+    '!': Operator('!', 1000, operator.not_, pure=True),
 }
@@ -0,0 +1,263 @@
+from future.builtins.misc import super
+
+from pyjexl.analysis import identifier_path, JEXLAnalyzer
+from pyjexl.evaluator import Context, Evaluator
+from pyjexl.operators import default_binary_operators, default_unary_operators
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    ConditionalExpression,
+    FilterExpression,
+    Identifier,
+    Literal,
+    ObjectLiteral,
+    Path,
+    Transform,
+    UnaryExpression,
+)
+from pyjexl.utils import rebuild
+
+
+def replace(node, **fields):
+    """Return a copy of an AST node with some of its fields replaced."""
+    values = dict((field, getattr(node, field)) for field in node.fields if field != 'parent')
+    values.update(fields)
+    return type(node)(**values)
+
+
+def is_default_operator(operator):
+    return (
+        default_binary_operators.get(operator.symbol) is operator
+        or default_unary_operators.get(operator.symbol) is operator
+    )
+
+
+class ConstantFolder(JEXLAnalyzer):
+    """
+    Simplifies an AST by evaluating the parts of it that don't depend on
+    the context ahead of time.
+
+    Subtrees whose operands are all literals are replaced by a Literal
+    of their value, conditionals with a constant test are replaced by
+    the branch they pick, and && / || with a constant left operand are
+    reduced to whichever side they would return. Operators and
+    transforms are only evaluated ahead of time when they are marked as
+    pure, and anything that raises an error is left for evaluation to
+    report.
+
+    The input tree is never modified; simplified nodes are copies.
+    """
+    def __init__(self, jexl_config):
+        super().__init__(jexl_config)
+        self.evaluator = Evaluator(jexl_config)
+        self.in_failed_constant = False
+
+    def visit(self, expression):
+        return self.unshare(self.fold(expression))
+
+    def fold(self, expression):
+        method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
+        if (self.in_failed_constant or not expression.info.constant
+                or isinstance(expression, Literal)):
+            return method(expression)
+
+        # A constant subtree is evaluated in one go. If that fails, its
+        # parts are folded one by one instead, without trying the same
+        # shortcut again below.
+        folded = self.evaluate(expression)
+        if isinstance(folded, Literal):
+            return folded
+        self.in_failed_constant = True
+        try:
+            return method(expression)
+        finally:
+            self.in_failed_constant = False
+
+    def unshare(self, node):
+        """
+        Folded arrays and objects are stored as a Literal of a list or
+        dict, and a Literal always evaluates to the same object. That's
+        fine where the value is only read, like the operands of `==` or
+        `in`, but anywhere it could be returned to the caller it would
+        be shared between evaluations. In those positions, turn the
+        value back into literal nodes that build a fresh copy.
+        """
+        if not isinstance(node, Literal):
+            return node
+        elif isinstance(node.value, list):
+            return ArrayLiteral([self.unshare(Literal(value)) for value in node.value])
+        elif isinstance(node.value, dict):
+            return ObjectLiteral(dict(
+                (key, self.unshare(Literal(value))) for key, value in node.value.items()
+            ))
+        return node
+
+    def evaluate(self, expression):
+        """
+        Evaluate a folded node whose operands are all literals. Returns
+        the node unchanged if evaluating it fails.
+        """
+        try:
+            return Literal(self.evaluator.evaluate(expression, Context()))
+        except Exception:
+            return expression
+
+    def visit_BinaryExpression(self, exp):
+        operator = exp.operator
+        left = self.fold(exp.left)
+        right = self.fold(exp.right)
+
+        if isinstance(left, Literal):
+            if operator is default_binary_operators.get('&&'):
+                return self.unshare(right) if left.value else left
+            elif operator is default_binary_operators.get('||'):
+                return left if left.value else self.unshare(right)
+
+        if not is_default_operator(operator) or operator._evaluate_lazy:
+            left = self.unshare(left)
+            right = self.unshare(right)
+
+        folded = BinaryExpression(operator=operator, left=left, right=right)
+        if operator.pure and isinstance(left, Literal) and isinstance(right, Literal):
+            return self.evaluate(folded)
+        return folded
+
+    def visit_UnaryExpression(self, exp):
+        right = self.fold(exp.right)
+        if not is_default_operator(exp.operator) or exp.operator._evaluate_lazy:
+            right = self.unshare(right)
+
+        folded = replace(exp, right=right)
+        if exp.operator.pure and isinstance(right, Literal):
+            return self.evaluate(folded)
+        return folded
+
+    def visit_Literal(self, literal):
+        return literal
+
+    def visit_Identifier(self, identifier):
+        if identifier.subject is None:
+            return identifier
+
+        subject = self.fold(identifier.subject)
+        if isinstance(subject, Literal):
+            folded = self.evaluate(replace(identifier, subject=subject))
+            if isinstance(folded, Literal):
+                return folded
+        return replace(identifier, subject=self.unshare(subject))
+
+    def visit_ObjectLiteral(self, object_literal):
+        value = dict((key, self.fold(child)) for key, child in object_literal.value.items())
+        if all(isinstance(child, Literal) for child in value.values()):
+            return Literal(dict((key, child.value) for key, child in value.items()))
+        return ObjectLiteral(dict((key, self.unshare(child)) for key, child in value.items()))
+
+    def visit_ArrayLiteral(self, array_literal):
+        value = [self.fold(child) for child in array_literal.value]
+        if all(isinstance(child, Literal) for child in value):
+            return Literal([child.value for child in value])
+        return ArrayLiteral([self.unshare(child) for child in value])
+
+    def visit_Transform(self, transform):
+        subject = self.fold(transform.subject)
+        args = [self.fold(arg) for arg in transform.args]
+
+        if (transform.name in self.config.pure_transforms
+                and transform.name in self.config.transforms
+                and all(isinstance(child, Literal) for child in [subject] + args)):
+            folded = self.evaluate(replace(transform, subject=subject, args=args))
+            if isinstance(folded, Literal):
+                return folded
+
+        return replace(
+            transform,
+            subject=self.unshare(subject),
+            args=[self.unshare(arg) for arg in args]
+        )
+
+    def visit_FilterExpression(self, filter_expression):
+        subject = self.fold(filter_expression.subject)
+        expression = self.fold(filter_expression.expression)
+
+        if (not filter_expression.relative
+                and isinstance(subject, Literal)
+                and isinstance(expression, Literal)):
+            folded = self.evaluate(replace(
+                filter_expression,
+                subject=subject,
+                expression=expression
+            ))
+            if isinstance(folded, Literal):
+                return folded
+
+        return replace(
+            filter_expression,
+            subject=self.unshare(subject),
+            expression=self.unshare(expression)
+        )
+
+    def visit_ConditionalExpression(self, conditional):
+        test = self.fold(conditional.test)
+        if isinstance(test, Literal):
+            branch = conditional.consequent if test.value else conditional.alternate
+            return self.fold(branch)
+
+        return replace(
+            conditional,
+            test=test,
+            consequent=self.unshare(self.fold(conditional.consequent)),
+            alternate=self.unshare(self.fold(conditional.alternate))
+        )
+
+    def generic_visit(self, expression):
+        return expression
+
+
+def path_children(node):
+    """The children of a node, skipping the links of identifier chains."""
+    if isinstance(node, Identifier):
+        subject = identifier_path(node)[2]
+        return [] if subject is None else [subject]
+    return [child for child in node.children if child is not None]
+
+
+def with_children(node, children):
+    """Return a node with its children, as listed by path_children, replaced."""
+    if isinstance(node, BinaryExpression):
+        fields = ['left', 'right']
+    elif isinstance(node, ConditionalExpression):
+        fields = ['test', 'consequent', 'alternate']
+    elif isinstance(node, UnaryExpression):
+        fields = ['right']
+    elif isinstance(node, FilterExpression):
+        fields = ['expression', 'subject']
+    elif isinstance(node, Transform):
+        if node.subject is None:
+            return replace(node, args=children)
+        return replace(node, subject=children[0], args=children[1:])
+    elif isinstance(node, ArrayLiteral):
+        return ArrayLiteral(children)
+    elif isinstance(node, ObjectLiteral):
+        return ObjectLiteral(dict(zip(node.value.keys(), children)))
+    else:
+        return node
+    return replace(node, **dict(zip(fields, children)))
+
+
+def flatten_paths(ast, attributes=False):
+    """
+    Return a copy of an AST with each chain of identifiers, like
+    `a.b.c`, replaced by a Path that reads the whole chain in one loop.
+    If attributes is True, the paths also read attributes of values that
+    aren't mappings, see pyjexl.paths. Subtrees without identifiers are
+    shared with the input tree.
+    """
+    def build(node, children):
+        if isinstance(node, Identifier):
+            names, relative, subject = identifier_path(node)
+            return Path(names, children[0] if children else None, relative, attributes)
+        elif all(new is old for new, old in zip(children, path_children(node))):
+            return node
+        return with_children(node, children)
+
+    return rebuild(ast, path_children, build)
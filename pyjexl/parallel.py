@@ -0,0 +1,198 @@
+"""
+Evaluation of expressions against large numbers of contexts using a pool
+of worker processes.
+
+The parsed expressions and the configuration of the JEXL instance they
+came from are sent to each worker once, when it starts. After that, only
+chunks of contexts and their results travel between processes. Because
+of that, transforms and custom operators must be picklable, for example
+functions defined at the top level of a module, unless the pool starts
+its workers by forking.
+"""
+import multiprocessing
+from collections import deque
+
+from pyjexl.evaluator import Context
+from pyjexl.memoize import BATCH, EVALUATION, Scope
+from pyjexl.utils import chunked
+
+
+#: Seconds to wait for the oldest pending chunk before checking whether
+#: any other chunk has finished, in ParallelEvaluator.imap_unordered.
+POLL_INTERVAL = 0.01
+
+#: Expressions compiled by the initializer of a worker process.
+_worker_expressions = None
+
+
+def _initialize_worker(jexl_options, config, asts):
+    """Recreate the parsed expressions in a worker process."""
+    global _worker_expressions
+    from pyjexl.jexl import CompiledExpression, JEXL
+
+    jexl = JEXL(**jexl_options)
+    jexl.config = config
+    _worker_expressions = dict(
+        (key, CompiledExpression(jexl, None, ast)) for key, ast in asts.items()
+    )
+
+
+def _evaluate_chunk(chunk):
+    """
+    Evaluate every expression against each context in a chunk. Returns
+    a list of (error, result) pairs, one per context.
+    """
+    results = []
+    wrapper = Context()
+    batch = Scope(BATCH)
+    for record in chunk:
+        if isinstance(record, Context):
+            context = record
+        else:
+            wrapper.reset(record)
+            context = wrapper
+
+        try:
+            with batch, Scope(EVALUATION):
+                result = dict(
+                    (key, expression.function(context))
+                    for key, expression in _worker_expressions.items()
+                )
+        except Exception as error:
+            results.append((error, None))
+        else:
+            results.append((None, result))
+    return results
+
+
+class ParallelEvaluator(object):
+    """
+    Evaluates one or more expressions against many contexts using a pool
+    of worker processes.
+
+    expressions is either a single expression, in which case each result
+    is the value of that expression, or a dict mapping keys to
+    expressions, in which case each result is a dict mapping the same
+    keys to their values.
+
+    processes is the number of worker processes, and defaults to the
+    number of CPUs. Contexts are sent to the workers chunksize at a
+    time, and at most max_pending chunks are queued up at once, so that
+    contexts can be read from a generator in constant memory.
+
+    Use it as a context manager, or call close() when done, to shut the
+    workers down.
+    """
+    def __init__(self, jexl, expressions, processes=None, chunksize=1000, max_pending=None):
+        self.single = not isinstance(expressions, dict)
+        if self.single:
+            expressions = {None: expressions}
+
+        asts = dict((key, jexl.parse(expression)) for key, expression in expressions.items())
+        jexl_options = {
+            'backend': jexl.backend,
+            'optimize': jexl.optimize,
+            'budget': jexl.budget,
+            'attribute_access': jexl.attribute_access,
+            'cache_size': 0,
+        }
+
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.max_pending = max_pending or 2 * self.processes
+        self.pool = multiprocessing.Pool(
+            self.processes,
+            initializer=_initialize_worker,
+            initargs=(jexl_options, jexl.config, asts)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def imap(self, contexts, on_error=None):
+        """
+        Evaluate against each context in an iterable and yield the
+        results in the same order.
+
+        If on_error is given, a context that fails to evaluate doesn't
+        stop the iteration: instead, on_error(index, context, error) is
+        called and no result is yielded for that context.
+        """
+        pending = deque()
+        for start, chunk in self._numbered_chunks(contexts):
+            pending.append((start, chunk, self.pool.apply_async(_evaluate_chunk, (chunk,))))
+            if len(pending) >= self.max_pending:
+                start, chunk, async_result = pending.popleft()
+                for index, result in self._results(start, chunk, async_result.get(), on_error):
+                    yield result
+
+        while pending:
+            start, chunk, async_result = pending.popleft()
+            for index, result in self._results(start, chunk, async_result.get(), on_error):
+                yield result
+
+    def imap_unordered(self, contexts, on_error=None):
+        """
+        Evaluate against each context in an iterable and yield
+        (index, result) pairs as soon as they are available, where index
+        is the position of the context in the iterable. See imap for
+        on_error.
+        """
+        pending = []
+        for start, chunk in self._numbered_chunks(contexts):
+            if len(pending) >= self.max_pending:
+                for item in self._results(*self._next_finished(pending), on_error=on_error):
+                    yield item
+            pending.append((start, chunk, self.pool.apply_async(_evaluate_chunk, (chunk,))))
+
+        while pending:
+            for item in self._results(*self._next_finished(pending), on_error=on_error):
+                yield item
+
+    def _next_finished(self, pending):
+        """
+        Wait for any of the pending (start, chunk, async_result) to
+        finish, remove it, and return (start, chunk, results), or
+        (start, chunk, error) if the chunk failed altogether.
+
+        Results are polled for rather than delivered by callbacks,
+        because Python 2 has no callback for chunks that fail, such as
+        when a result can't be pickled.
+        """
+        while True:
+            for item in pending:
+                start, chunk, async_result = item
+                if async_result.ready():
+                    pending.remove(item)
+                    try:
+                        return start, chunk, async_result.get()
+                    except Exception as error:
+                        return start, chunk, error
+            pending[0][2].wait(POLL_INTERVAL)
+
+    def _numbered_chunks(self, contexts):
+        """Yield (index of the first context, chunk) for each chunk."""
+        start = 0
+        for chunk in chunked(contexts, self.chunksize):
+            yield start, chunk
+            start += len(chunk)
+
+    def _results(self, start, chunk, results, on_error):
+        """Yield (index, result) pairs for a chunk evaluated by a worker."""
+        if isinstance(results, Exception):
+            raise results
+
+        for offset, (record, (error, result)) in enumerate(zip(chunk, results)):
+            if error is not None:
+                if on_error is None:
+                    raise error
+                on_error(start + offset, record, error)
+                continue
+            yield start + offset, result[None] if self.single else result
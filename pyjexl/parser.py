@@ -1,11 +1,15 @@
 import ast
+import re
+from collections import namedtuple
+
 from future.builtins.misc import super
 from future.utils import with_metaclass
 
 from parsimonious import Grammar, NodeVisitor
 
-from pyjexl.exceptions import InvalidOperatorError
+from pyjexl.exceptions import ExpressionTooComplexError, InvalidOperatorError
 from pyjexl.operators import Operator
+from pyjexl.utils import rebuild
 
 
 def operator_pattern(operators):
@@ -19,7 +23,63 @@ def operator_pattern(operators):
     return ' / '.join(operator_literals)
 
 
+_grammars = {}
+
+#: Matches string literals, which are skipped, and brackets.
+BRACKET_PATTERN = re.compile(
+    r'"[^"\\\n\r]*(?:\\.[^"\\\n\r]*)*"|'
+    r"'[^'\\\n\r]*(?:\\.[^'\\\n\r]*)*'|"
+    r'(?P<open>[(\[{])|(?P<close>[)\]}])'
+)
+
+
+def check_limits(expression, max_length=None, max_depth=None):
+    """
+    Raise an ExpressionTooComplexError if an expression is longer than
+    max_length characters, or nests parentheses, brackets and braces
+    deeper than max_depth. This is a single scan of the expression, so
+    it is cheap enough to run before parsing untrusted input.
+    """
+    if max_length is not None and len(expression) > max_length:
+        raise ExpressionTooComplexError(
+            'Expression is longer than {} characters.'.format(max_length)
+        )
+    if max_depth is None:
+        return
+
+    depth = 0
+    for match in BRACKET_PATTERN.finditer(expression):
+        if match.group('open'):
+            depth += 1
+            if depth > max_depth:
+                raise ExpressionTooComplexError(
+                    'Expression is nested deeper than {} levels.'.format(max_depth)
+                )
+        elif match.group('close'):
+            depth -= 1
+
+
 def jexl_grammar(jexl_config):
+    """
+    Return the grammar for a configuration. Grammars only depend on the
+    operator symbols and are never modified, so they are cached and
+    shared by every configuration with the same symbols.
+    """
+    key = (
+        frozenset(jexl_config.binary_operators),
+        frozenset(jexl_config.unary_operators)
+    )
+    try:
+        return _grammars[key]
+    except KeyError:
+        grammar = _grammars[key] = _build_grammar(
+            jexl_config.binary_operators.values(),
+            jexl_config.unary_operators.values()
+        )
+        return grammar
+
+
+def _build_grammar(binary_operators, unary_operators):
     return Grammar(r"""
         expression = (
             _ (conditional_expression / binary_expression / unary_expression / complex_value) _
@@ -73,8 +133,8 @@ def jexl_grammar(jexl_config):
 
         _ = ~r"\s*"
     """.format(
-        binary_op_pattern=operator_pattern(jexl_config.binary_operators.values()),
-        unary_op_pattern=operator_pattern(jexl_config.unary_operators.values())
+        binary_op_pattern=operator_pattern(binary_operators),
+        unary_op_pattern=operator_pattern(unary_operators)
     ))
 
 
@@ -209,7 +269,7 @@ class Parser(NodeVisitor):
 
     def visit_filter_expression(self, node, children):
         (left_bracket, _, expression, _, right_bracket) = children
-        return FilterExpression(expression=expression, relative=expression.contains_relative())
+        return FilterExpression(expression=expression, relative=expression.info.relative)
 
     def visit_identifier(self, node, children):
         return Identifier(value=node.text, relative=False)
@@ -249,12 +309,237 @@ class NodeMeta(type):
     def __new__(meta, classname, bases, classdict):
         if 'parent' not in classdict['fields']:
             classdict['fields'].append('parent')
+        slots = list(classdict['fields'])
+        if not any(isinstance(base, NodeMeta) for base in bases):
+            # The base Node class also caches the node's NodeInfo, which
+            # isn't a field.
+            slots.append('_info')
         classdict.update({
-            '__slots__': classdict['fields'],
+            '__slots__': slots,
         })
         return type.__new__(meta, classname, bases, classdict)
 
 
+#: Facts about the subtree under a node, see Node.info. relative is
+#: whether it reads the relative value of an enclosing filter, constant
+#: whether it only contains literals and pure operators, so that its
+#: value doesn't depend on the context or the configuration, depth is
+#: the number of nodes on its longest branch and size its number of
+#: nodes. identifiers is a frozenset of the context keys it reads
+#: directly, like normandy in `normandy.channel`.
+NodeInfo = namedtuple('NodeInfo', ['relative', 'constant', 'depth', 'size', 'identifiers'])
+
+EMPTY = frozenset()
+
+
+def node_info(node, children):
+    """Build the NodeInfo of a node from the nodes under it."""
+    relative = False
+    constant = True
+    depth = 0
+    size = 1
+    identifiers = EMPTY
+    for child in children:
+        info = child._info
+        relative = relative or info.relative
+        constant = constant and info.constant
+        if info.depth > depth:
+            depth = info.depth
+        size += info.size
+        if info.identifiers and not info.identifiers <= identifiers:
+            if identifiers <= info.identifiers:
+                identifiers = info.identifiers
+            else:
+                identifiers = identifiers | info.identifiers
+
+    node_type = type(node)
+    if node_type is Identifier:
+        constant = False
+        if node.relative:
+            relative = True
+        elif node.subject is None:
+            identifiers = frozenset([node.value])
+    elif node_type is Path:
+        constant = False
+        if node.relative:
+            relative = True
+        elif node.subject is None:
+            identifiers = frozenset([node.names[0]])
+    elif node_type is Transform:
+        constant = False
+    elif node_type is FilterExpression:
+        # Relative identifiers in the filter expression refer to the
+        # elements of the filter's own subject.
+        relative = node.subject._info.relative
+    elif node_type is BinaryExpression or node_type is UnaryExpression:
+        constant = constant and node.operator.pure
+
+    return NodeInfo(relative, constant, depth + 1, size, identifiers)
+
+
+def hashable(value):
+    """
+    Convert a node field value into something hashable that compares
+    equal whenever the original values do.
+    """
+    if isinstance(value, list):
+        return tuple(hashable(item) for item in value)
+    elif isinstance(value, dict):
+        return frozenset((key, hashable(item)) for key, item in value.items())
+    return value
+
+
+def node_fields(node):
+    """The fields of a node other than its parent."""
+    return [field for field in node.fields if field != 'parent']
+
+
+def child_nodes(node):
+    """
+    The nodes held by the fields of a node, in order, including the
+    items of lists and the values of dicts.
+    """
+    nodes = []
+    for field in node_fields(node):
+        value = getattr(node, field)
+        if isinstance(value, Node):
+            nodes.append(value)
+        elif isinstance(value, list):
+            nodes.extend(item for item in value if isinstance(item, Node))
+        elif isinstance(value, dict):
+            nodes.extend(item for item in value.values() if isinstance(item, Node))
+    return nodes
+
+
+#: Stands for a child node in the output of node_structure.
+CHILD = object()
+
+
+def node_structure(root):
+    """
+    Describe the tree under root as a flat list, without recursion: one
+    tuple per node, in pre-order, holding its type and the values of its
+    fields, with CHILD in place of child nodes. Two trees are equal
+    exactly when their structures are.
+    """
+    structure = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        children = []
+
+        def mark(value):
+            if isinstance(value, Node):
+                children.append(value)
+                return CHILD
+            return value
+
+        values = [type(node)]
+        for field in node_fields(node):
+            value = getattr(node, field)
+            if isinstance(value, list):
+                value = [mark(item) for item in value]
+            elif isinstance(value, dict):
+                # Dicts compare equal in any order, so their items are
+                # described in a fixed one.
+                value = (dict, tuple(
+                    (key, mark(value[key])) for key in sorted(value, key=repr)
+                ))
+            else:
+                value = mark(value)
+            values.append(value)
+        structure.append(tuple(values))
+        stack.extend(reversed(children))
+    return structure
+
+
+def node_repr(node, children):
+    """Build the repr of a node from the reprs of its child nodes."""
+    children = iter(children)
+
+    def show(value):
+        if isinstance(value, Node):
+            return next(children)
+        elif isinstance(value, list):
+            return '[' + ', '.join(show(item) for item in value) + ']'
+        elif isinstance(value, dict):
+            return '{' + ', '.join(
+                '{!r}: {}'.format(key, show(item)) for key, item in value.items()
+            ) + '}'
+        return repr(value)
+
+    return '{name}({kwargs})'.format(
+        name=type(node).__name__,
+        kwargs=', '.join(
+            '{}={}'.format(field, show(getattr(node, field))) for field in node_fields(node)
+        )
+    )
+
+
+class NodeRef(object):
+    """Stands for the node at index in the output of flatten."""
+    __slots__ = ['index']
+
+    def __init__(self, index):
+        self.index = index
+
+    def __reduce__(self):
+        return NodeRef, (self.index,)
+
+
+def flatten(root):
+    """
+    Return a flat list of (node type, state) pairs for the nodes of a
+    tree, breadth first, with a NodeRef in place of each child node.
+    See unflatten.
+    """
+    nodes = [root]
+    entries = []
+
+    def ref(value):
+        if isinstance(value, Node):
+            nodes.append(value)
+            return NodeRef(len(nodes) - 1)
+        return value
+
+    for node in nodes:
+        state = {}
+        for field in node_fields(node):
+            value = getattr(node, field)
+            if isinstance(value, list):
+                value = [ref(item) for item in value]
+            elif isinstance(value, dict):
+                value = dict((key, ref(item)) for key, item in value.items())
+            else:
+                value = ref(value)
+            state[field] = value
+        entries.append((type(node), state))
+    return entries
+
+
+def unflatten(entries):
+    """Rebuild a tree from the output of flatten, without recursion."""
+    nodes = [None] * len(entries)
+
+    def resolve(value):
+        return nodes[value.index] if isinstance(value, NodeRef) else value
+
+    # Children come after their parent, so they're built first.
+    for index in reversed(range(len(entries))):
+        node_type, state = entries[index]
+        for field, value in state.items():
+            if isinstance(value, list):
+                state[field] = [resolve(item) for item in value]
+            elif isinstance(value, dict):
+                state[field] = dict((key, resolve(item)) for key, item in value.items())
+            else:
+                state[field] = resolve(value)
+        node = node_type.__new__(node_type)
+        node.__setstate__(state)
+        nodes[index] = node
+    return nodes[0]
+
+
 class Node(with_metaclass(NodeMeta, object)):
     """
     Base class for AST Nodes.
@@ -270,44 +555,91 @@ class Node(with_metaclass(NodeMeta, object)):
         Accepts values for this node's fields as both positional (in the
         order defined in self.fields) and keyword arguments.
         """
-        for index, field in enumerate(self.fields):
-            if len(args) > index:
-                setattr(self, field, args[index])
-            else:
-                setattr(self, field, kwargs.get(field, None))
+        for field, value in zip(self.fields, args):
+            setattr(self, field, value)
+        for field in self.fields[len(args):]:
+            setattr(self, field, kwargs.get(field))
+        self._info = None
+
+    # Comparing, hashing, printing and pickling nodes walk the whole
+    # tree, so they're done without recursion to handle long chains.
 
     def __repr__(self):
-        kwargs = [
-            '='.join([field, repr(getattr(self, field))])
-            for field in self.fields if field != 'parent'
-        ]
-
-        return '{name}({kwargs})'.format(
-            name=type(self).__name__,
-            kwargs=', '.join(kwargs)
-        )
+        return rebuild(self, child_nodes, node_repr)
 
     def __eq__(self, other):
-        return isinstance(other, type(self)) and all(
-            getattr(self, field) == getattr(other, field)
-            for field in self.fields if field != 'parent'
+        return isinstance(other, type(self)) and node_structure(self) == node_structure(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        """
+        Nodes hash by structure, consistently with __eq__. Like any
+        mutable object used as a dict key, a node must not be modified
+        while it is stored in a dict or set.
+        """
+        return hash(tuple(
+            (values[0].__name__,) + tuple(hashable(value) for value in values[1:])
+            for values in node_structure(self)
+        ))
+
+    def __reduce__(self):
+        return unflatten, (flatten(self),)
+
+    def __getstate__(self):
+        # The parent is left out so that pickling a node doesn't pull in
+        # the tree above it; it's restored on the children instead.
+        return dict(
+            (field, getattr(self, field)) for field in self.fields if field != 'parent'
         )
 
+    def __setstate__(self, state):
+        for field in self.fields:
+            setattr(self, field, state.get(field))
+        self._info = None
+        for child in self.children:
+            if child is not None:
+                child.parent = self
+
     @property
     def children(self):
         return iter(())
 
     def root(self):
-        if self.parent is None:
-            return self
-        else:
-            return self.parent.root()
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    @property
+    def info(self):
+        """
+        The NodeInfo of this node. It is computed for the whole subtree
+        the first time it's needed, bottom-up and without recursion, and
+        then kept, so nodes must not be modified once it has been read.
+        The parsers read it for the expression of every filter, so
+        nested filters are only scanned once.
+        """
+        if self._info is None:
+            stack = [(self, None)]
+            while stack:
+                node, children = stack.pop()
+                if children is not None:
+                    node._info = node_info(node, children)
+                elif node._info is None:
+                    children = [child for child in node.children if child is not None]
+                    stack.append((node, children))
+                    stack.extend((child, None) for child in children if child._info is None)
+        return self._info
 
     def contains_relative(self):
-        children_relative = any(
-            child.contains_relative() for child in self.children if child is not None
-        )
-        return getattr(self, 'relative', children_relative)
+        """
+        Whether evaluating this node reads the relative value of an
+        enclosing filter, through a relative identifier that isn't
+        inside a filter of its own.
+        """
+        return self.info.relative
 
 
 class BinaryExpression(Node):
@@ -344,13 +676,37 @@ class Identifier(Node):
             yield self.subject
 
 
+class Path(Node):
+    """
+    A chain of identifiers like `a.b.c`, read in one step. The parsers
+    never produce Paths; see pyjexl.optimizer.flatten_paths. names are
+    read in order from subject, or from the relative value or the
+    context if there is no subject. If attributes is True, values that
+    aren't mappings have their attributes read, see pyjexl.paths.
+    """
+    fields = ['names', 'subject', 'relative', 'attributes']
+
+    @property
+    def children(self):
+        if self.subject is not None:
+            yield self.subject
+
+
 class ObjectLiteral(Node):
     fields = ['value']
 
+    @property
+    def children(self):
+        return iter(self.value.values())
+
 
 class ArrayLiteral(Node):
     fields = ['value']
 
+    @property
+    def children(self):
+        return iter(self.value)
+
 
 class Transform(Node):
     fields = ['name', 'args', 'subject']
@@ -374,9 +730,6 @@ class FilterExpression(Node):
         yield self.expression
         yield self.subject
 
-    def contains_relative(self):
-        return self.subject.contains_relative()
-
 
 class ConditionalExpression(Node):
     fields = ['test', 'consequent', 'alternate']
@@ -0,0 +1,77 @@
+"""
+Lookup of paths like `a.b.c`, for the Path nodes created by
+pyjexl.optimizer.flatten_paths.
+
+By default each name is read with value.get(name, None), exactly like
+chained Identifiers. Paths with attribute access enabled pick how to
+read names from each value by its type, and remember the choice:
+
+- types with a get method, like dicts and Contexts, use get;
+- None, numbers, strings and the builtin collections have nothing to
+  read, so every name is missing;
+- any other type, like dataclasses and plain objects, uses getattr.
+
+Missing names read as None either way, but without attribute access,
+reading a name from a value that has no get method, like None, raises
+AttributeError. Attributes whose name starts with an underscore are
+never read, so expressions can't reach into the internals of the
+objects they're given.
+"""
+from numbers import Number
+
+
+#: Types that attribute access never reads attributes of, along with
+#: numbers. Subclasses, like namedtuples, have their attributes read.
+OPAQUE_TYPES = frozenset([type(None), type(u''), bytes, list, tuple, set, frozenset])
+
+_accessors = {}
+
+
+def get_item(value, name):
+    return value.get(name, None)
+
+
+def get_attribute(value, name):
+    if name.startswith('_'):
+        return None
+    return getattr(value, name, None)
+
+
+def get_nothing(value, name):
+    return None
+
+
+def accessor(value_type):
+    """
+    Return the function used to read a name from values of a type when
+    attribute access is enabled.
+    """
+    try:
+        return _accessors[value_type]
+    except KeyError:
+        if hasattr(value_type, 'get'):
+            get = get_item
+        elif value_type in OPAQUE_TYPES or issubclass(value_type, Number):
+            get = get_nothing
+        else:
+            get = get_attribute
+        _accessors[value_type] = get
+        return get
+
+
+def resolve(value, names, attributes=False):
+    """Read each of names in turn, starting from value."""
+    if not attributes:
+        for name in names:
+            value = value.get(name, None)
+        return value
+
+    accessors = _accessors
+    for name in names:
+        value_type = type(value)
+        try:
+            get = accessors[value_type]
+        except KeyError:
+            get = accessor(value_type)
+        value = get(value, name)
+    return value
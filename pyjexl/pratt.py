@@ -0,0 +1,408 @@
+"""
+Hand-written alternative to the parsimonious-based parser.
+
+The lexer turns an expression into a flat list of tokens in a single
+regex-driven pass, and PrattParser builds the same AST nodes as
+:class:`pyjexl.parser.Parser` from them, resolving binary operators by
+precedence climbing over the precedences in the JEXLConfig.
+"""
+import ast
+import re
+from collections import namedtuple
+
+from pyjexl.exceptions import ParseError
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    ConditionalExpression,
+    FilterExpression,
+    Identifier,
+    Literal,
+    ObjectLiteral,
+    Transform,
+    UnaryExpression,
+)
+
+
+#: A single lexical token. spaced is True when whitespace separated the
+#: token from the one before it, which matters for modifiers like
+#: `foo.bar` or `foo|bar` that must be written without spaces.
+Token = namedtuple('Token', ['type', 'value', 'spaced'])
+
+#: Token types that may name an operator.
+OPERATOR_TOKEN_TYPES = frozenset(['symbol', 'identifier'])
+
+PUNCTUATION = ['.', '|', '[', ']', '(', ')', '{', '}', ',', ':', '?', '-']
+
+WHITESPACE_PATTERN = r'\s*'
+STRING_PATTERN = (
+    r'"[^"\\\n\r]*(?:\\.[^"\\\n\r]*)*"|'
+    r"'[^'\\\n\r]*(?:\\.[^'\\\n\r]*)*'"
+)
+NUMBER_PATTERN = r'[0-9]+(?:\.[0-9]+)?'
+IDENTIFIER_PATTERN = r'[a-zA-Z_\$][a-zA-Z0-9_\$]*'
+
+BOOLEANS = ('true', 'false')
+
+
+_token_patterns = {}
+_word_symbols = {}
+
+
+def token_pattern(jexl_config):
+    """
+    Return a regex that matches a single token, preceded by optional
+    whitespace. Patterns are cached by the set of operator symbols.
+    """
+    symbols = frozenset(PUNCTUATION).union(
+        jexl_config.binary_operators,
+        jexl_config.unary_operators
+    )
+    try:
+        return _token_patterns[symbols]
+    except KeyError:
+        pattern = _token_patterns[symbols] = _compile_token_pattern(symbols)
+        return pattern
+
+
+def _compile_token_pattern(symbols):
+    # Word-like operators such as `in` are lexed as identifiers and
+    # recognized by the parser. The remaining symbols are sorted longest
+    # first so that `<=` is not matched as `<` followed by `=`.
+    symbols = sorted(
+        (symbol for symbol in symbols if not re.match(IDENTIFIER_PATTERN + '$', symbol)),
+        key=lambda symbol: (-len(symbol), symbol)
+    )
+
+    return re.compile(
+        r'(?P<space>{space})(?:'
+        r'(?P<string>{string})|'
+        r'(?P<number>{number})|'
+        r'(?P<identifier>{identifier})|'
+        r'(?P<symbol>{symbols})|'
+        r'(?P<error>\S)'
+        r')'.format(
+            space=WHITESPACE_PATTERN,
+            string=STRING_PATTERN,
+            number=NUMBER_PATTERN,
+            identifier=IDENTIFIER_PATTERN,
+            symbols='|'.join(re.escape(symbol) for symbol in symbols),
+        ),
+        re.DOTALL
+    )
+
+
+# Parsing creates many nodes, so the most common ones are built here
+# without Node.__init__, which spends most of its time handling keyword
+# arguments.
+
+def make_literal(value):
+    node = Literal.__new__(Literal)
+    node.value = value
+    node.parent = node._info = None
+    return node
+
+
+def make_identifier(value, relative):
+    node = Identifier.__new__(Identifier)
+    node.value = value
+    node.relative = relative
+    node.subject = node.parent = node._info = None
+    return node
+
+
+def make_binary_expression(operator, left, right):
+    node = BinaryExpression.__new__(BinaryExpression)
+    node.operator = operator
+    node.left = left
+    node.right = right
+    node.parent = node._info = None
+    left.parent = right.parent = node
+    return node
+
+
+def make_filter_expression(expression):
+    node = FilterExpression.__new__(FilterExpression)
+    node.expression = expression
+    node.relative = expression.info.relative
+    node.subject = node.parent = node._info = None
+    return node
+
+
+def make_transform(name):
+    node = Transform.__new__(Transform)
+    node.name = name
+    node.args = []
+    node.subject = node.parent = node._info = None
+    return node
+
+
+def word_symbols(operators):
+    """
+    Return the symbols of a dict of operators that are made of
+    identifier characters, like `in`, in the order the parsimonious
+    grammar tries them. Cached by the set of symbols.
+    """
+    symbols = frozenset(operators)
+    try:
+        return _word_symbols[symbols]
+    except KeyError:
+        words = _word_symbols[symbols] = tuple(sorted(
+            (symbol for symbol in symbols if re.match(IDENTIFIER_PATTERN + '$', symbol)),
+            reverse=True
+        ))
+        return words
+
+
+class PrattParser(object):
+    """
+    Parses JEXL expressions into the AST defined in pyjexl.parser
+    without building an intermediate parse tree.
+
+    Like the parsimonious grammar, operators and booleans don't need a
+    word boundary after them: `trueina` reads as `true in a`, and
+    `truex` is an error since `true` is followed by `x`.
+    """
+    def __init__(self, jexl_config):
+        self.config = jexl_config
+        self.pattern = token_pattern(jexl_config)
+        self.binary_words = word_symbols(jexl_config.binary_operators)
+        self.value_words = word_symbols(jexl_config.unary_operators) + BOOLEANS
+
+    def tokenize(self, expression):
+        tokens = []
+        append = tokens.append
+        # Tokens are built with tuple.__new__, which skips the Python
+        # level __new__ of the namedtuple.
+        new = tuple.__new__
+        for space, string, number, identifier, symbol, error in self.pattern.findall(expression):
+            spaced = bool(space)
+            if identifier:
+                append(new(Token, ('identifier', identifier, spaced)))
+            elif symbol:
+                append(new(Token, ('symbol', symbol, spaced)))
+            elif string:
+                append(new(Token, ('string', string, spaced)))
+            elif number:
+                append(new(Token, ('number', number, spaced)))
+            else:
+                raise ParseError('Could not parse expression: ' + expression)
+
+        append(Token('end', None, True))
+        return tokens
+
+    def parse(self, expression):
+        self.expression = expression
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+
+        result = self.parse_expression()
+        if self.peek().type != 'end':
+            self.fail()
+        return result
+
+    def fail(self):
+        raise ParseError('Could not parse expression: ' + self.expression)
+
+    def peek(self, offset=0):
+        return self.tokens[self.position + offset]
+
+    def advance(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        token = self.advance()
+        if token.type != 'symbol' or token.value != value:
+            self.fail()
+        return token
+
+    def at_symbol(self, value, spaced=None):
+        token = self.tokens[self.position]
+        return (
+            token.type == 'symbol' and token.value == value
+            and (spaced is None or token.spaced == spaced)
+        )
+
+    def parse_expression(self):
+        test = self.parse_binary_expression()
+        if not self.at_symbol('?'):
+            return test
+
+        self.advance()
+        consequent = self.parse_expression()
+        self.expect(':')
+        alternate = self.parse_expression()
+        return ConditionalExpression(test=test, consequent=consequent, alternate=alternate)
+
+    def parse_binary_expression(self, min_precedence=None):
+        """
+        Parse a chain of binary operations, consuming only operators that
+        bind tighter than min_precedence. Operators of equal precedence
+        are grouped from left to right.
+        """
+        left = self.parse_operand()
+        tokens = self.tokens
+        binary_operators = self.config.binary_operators
+        while True:
+            token = tokens[self.position]
+            if token.type not in OPERATOR_TOKEN_TYPES:
+                return left
+
+            operator = binary_operators.get(token.value)
+            if operator is None:
+                if token.type != 'identifier' or not self.split_identifier(self.binary_words):
+                    return left
+                operator = binary_operators[tokens[self.position].value]
+            if min_precedence is not None and operator.precedence <= min_precedence:
+                return left
+
+            self.position += 1
+            right = self.parse_binary_expression(operator.precedence)
+            left = make_binary_expression(operator, left, right)
+
+    def parse_operand(self):
+        token = self.tokens[self.position]
+        if token.type == 'identifier' and token.value.startswith(self.value_words):
+            self.split_identifier(self.value_words)
+            token = self.tokens[self.position]
+
+        if token.type in OPERATOR_TOKEN_TYPES:
+            operator = self.config.unary_operators.get(token.value)
+            if operator is not None:
+                self.position += 1
+                return UnaryExpression(operator, self.parse_operand())
+
+        return self.parse_complex_value()
+
+    def parse_complex_value(self):
+        current = self.parse_value()
+        while True:
+            token = self.peek()
+            if token.type != 'symbol' or token.spaced:
+                return current
+
+            if token.value == '|':
+                self.advance()
+                modifier = self.parse_transform()
+            elif token.value == '.' and self.is_unspaced_identifier(1):
+                self.advance()
+                modifier = make_identifier(self.advance().value, False)
+            elif token.value == '[':
+                self.advance()
+                expression = self.parse_expression()
+                self.expect(']')
+                modifier = make_filter_expression(expression)
+            else:
+                return current
+
+            modifier.subject = current
+            current = modifier
+
+    def parse_transform(self):
+        if not self.is_unspaced_identifier(0):
+            self.fail()
+
+        node = make_transform(self.advance().value)
+        if self.at_symbol('(', spaced=False):
+            self.advance()
+            node.args = self.parse_value_list(')')
+            if not node.args:
+                self.fail()
+        return node
+
+    def split_identifier(self, prefixes):
+        """
+        Split the identifier at the current position after the first of
+        prefixes it starts with, if any, and return whether it was
+        split. The rest is tokenized again.
+        """
+        token = self.tokens[self.position]
+        for prefix in prefixes:
+            if token.value.startswith(prefix) and token.value != prefix:
+                rest = self.tokenize(token.value[len(prefix):])[:-1]
+                rest[0] = rest[0]._replace(spaced=False)
+                self.tokens[self.position:self.position + 1] = (
+                    [Token('identifier', prefix, token.spaced)] + rest
+                )
+                return True
+        return False
+
+    def is_unspaced_identifier(self, offset):
+        token = self.peek(offset)
+        return token.type == 'identifier' and not token.spaced
+
+    def parse_value_list(self, closing_symbol):
+        values = []
+        if self.at_symbol(closing_symbol):
+            self.advance()
+            return values
+
+        while True:
+            values.append(self.parse_expression())
+            token = self.advance()
+            if token.type != 'symbol':
+                self.fail()
+            if token.value == closing_symbol:
+                return values
+            if token.value != ',':
+                self.fail()
+
+    def parse_value(self):
+        token = self.advance()
+        if token.type == 'identifier':
+            if token.value == 'true':
+                return make_literal(True)
+            elif token.value == 'false':
+                return make_literal(False)
+            return make_identifier(token.value, False)
+        elif token.type == 'string':
+            if '\\' in token.value:
+                return make_literal(ast.literal_eval(token.value))
+            return make_literal(token.value[1:-1])
+        elif token.type == 'number':
+            return self.number_literal(token.value)
+        elif token.type == 'symbol':
+            if token.value == '-':
+                next_token = self.peek()
+                if next_token.type == 'number' and not next_token.spaced:
+                    self.advance()
+                    return self.number_literal('-' + next_token.value)
+            elif token.value == '(':
+                expression = self.parse_expression()
+                self.expect(')')
+                return expression
+            elif token.value == '{':
+                return self.parse_object_literal()
+            elif token.value == '[':
+                return ArrayLiteral(value=self.parse_value_list(']'))
+            elif token.value == '.' and self.is_unspaced_identifier(0):
+                return make_identifier(self.advance().value, True)
+
+        self.fail()
+
+    def number_literal(self, text):
+        number_type = float if '.' in text else int
+        return make_literal(number_type(text))
+
+    def parse_object_literal(self):
+        value = {}
+        if self.at_symbol('}'):
+            self.advance()
+            return ObjectLiteral(value=value)
+
+        while True:
+            key = self.advance()
+            if key.type != 'identifier':
+                self.fail()
+            self.expect(':')
+            value[key.value] = self.parse_expression()
+
+            token = self.advance()
+            if token.type != 'symbol':
+                self.fail()
+            if token.value == '}':
+                return ObjectLiteral(value=value)
+            if token.value != ',':
+                self.fail()
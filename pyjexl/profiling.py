@@ -0,0 +1,286 @@
+"""
+Hooks for instrumenting parsing and evaluation, and a Profiler built on
+them.
+
+Hooks are installed on a JEXL instance with JEXL(hooks=...) or by
+setting jexl.hooks. Each hook method wraps one step and must call
+through to it and return its result:
+
+    class LoggingHooks(Hooks):
+        def around_transform(self, name, transform, args):
+            print('calling', name)
+            return transform(*args)
+
+While hooks are installed, compiled expressions are evaluated by the
+InstrumentedEvaluator, whatever the backend. Without hooks nothing is
+instrumented, so they cost nothing when they aren't used.
+"""
+from timeit import default_timer
+
+from future.builtins.misc import super
+
+from pyjexl.evaluator import Context, Evaluator, get_transform
+from pyjexl.parser import (
+    BinaryExpression,
+    FilterExpression,
+    Identifier,
+    Literal,
+    Node,
+    Path,
+    Transform,
+    UnaryExpression,
+)
+
+
+class Hooks(object):
+    """
+    Base class for instrumentation hooks. The default implementations
+    only call through; override the ones you need.
+    """
+    def around_parse(self, expression, parse):
+        """Called when the JEXL instance parses an expression string."""
+        return parse(expression)
+
+    def around_evaluate(self, expression, ast, context, evaluate):
+        """
+        Called for each evaluation of a compiled expression. ast is the
+        tree being evaluated, after optimization if it is enabled.
+        """
+        return evaluate(context)
+
+    def around_visit(self, node, context, visit):
+        """Called for every node that is evaluated."""
+        return visit(node, context)
+
+    def around_transform(self, name, transform, args):
+        """
+        Called for every call of a transform. args holds the subject
+        followed by the arguments of the transform.
+        """
+        return transform(*args)
+
+
+class InstrumentedEvaluator(Evaluator):
+    """
+    An Evaluator that runs every node and every transform call through
+    a Hooks instance. Chains are walked in a loop like in Evaluator,
+    and each of their links is run through the hooks as it is applied
+    to the value of the link below it.
+    """
+    def __init__(self, jexl_config, hooks, budget=None):
+        super().__init__(jexl_config, budget)
+        self.hooks = hooks
+        self._visit = super().visit
+
+    def evaluate(self, expression, context=None):
+        if context is None:
+            context = Context()
+        return self.visit(expression, context)
+
+    def visit(self, expression, context):
+        return self.hooks.around_visit(expression, context, self._visit)
+
+    def apply_link(self, link, value, context):
+        apply_link = super().apply_link
+        return self.hooks.around_visit(
+            link, context, lambda link, context: apply_link(link, value, context))
+
+    def apply_Transform(self, transform, subject, context):
+        transform_func = get_transform(self.config.transforms, transform.name)
+        args = [subject] + [self.evaluate(arg, context) for arg in transform.args]
+        return self.hooks.around_transform(transform.name, transform_func, args)
+
+
+class Stats(object):
+    """The number of calls of something and the total seconds they took."""
+    __slots__ = ('count', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+
+    def __repr__(self):
+        return 'Stats(count={}, total={})'.format(self.count, self.total)
+
+
+def describe(node):
+    """A short description of a node for reports."""
+    name = type(node).__name__
+    if isinstance(node, (BinaryExpression, UnaryExpression)):
+        return '{} {}'.format(name, node.operator.symbol)
+    elif isinstance(node, Identifier):
+        return '{} {}{}'.format(name, '.' if node.relative else '', node.value)
+    elif isinstance(node, Path):
+        return '{} {}{}'.format(name, '.' if node.relative else '', '.'.join(node.names))
+    elif isinstance(node, Transform):
+        return '{} |{}'.format(name, node.name)
+    elif isinstance(node, Literal):
+        value = repr(node.value)
+        return '{} {}'.format(name, value if len(value) <= 30 else value[:27] + '...')
+    elif isinstance(node, FilterExpression):
+        return '{} {}'.format(name, 'relative' if node.relative else 'index')
+    return name
+
+
+def positions(ast):
+    """
+    Yield (position, depth, node) for every node of a tree, in order.
+    A position is the path of field names from the root to the node,
+    like `left.subject` or `args[0]`.
+    """
+    stack = [('', 0, ast)]
+    while stack:
+        position, depth, node = stack.pop()
+        yield position or '(root)', depth, node
+
+        children = []
+        prefix = position + '.' if position else ''
+        for field in node.fields:
+            value = getattr(node, field)
+            if field == 'parent':
+                continue
+            elif isinstance(value, Node):
+                children.append((prefix + field, value))
+            elif isinstance(value, list):
+                children.extend(
+                    ('{}{}[{}]'.format(prefix, field, index), child)
+                    for index, child in enumerate(value) if isinstance(child, Node)
+                )
+            elif isinstance(value, dict):
+                children.extend(
+                    ('{}{}[{}]'.format(prefix, field, key), child)
+                    for key, child in sorted(value.items()) if isinstance(child, Node)
+                )
+        stack.extend((child_position, depth + 1, child)
+                     for child_position, child in reversed(children))
+
+
+def milliseconds(seconds):
+    return '{:.3f}ms'.format(seconds * 1000)
+
+
+class Profiler(Hooks):
+    """
+    Hooks that count calls and measure their cumulative time, per
+    expression, per node of each expression, per transform name and per
+    operator symbol. Node and operator times include the time taken to
+    evaluate their operands, except for the left operand or subject of a
+    link in a chain like `a + b + c` or `a.b.c`, which is timed on its
+    own. Use report() to print the results.
+
+    A Profiler is not thread-safe, and keeps the trees it has seen
+    alive until reset() is called.
+    """
+    def __init__(self, clock=default_timer):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        #: Maps expression strings to the Stats of parsing them.
+        self.parses = {}
+        #: Maps expression strings to the Stats of evaluating them.
+        self.expressions = {}
+        #: Maps transform names to the Stats of calling them.
+        self.transforms = {}
+        #: Maps operator symbols to the Stats of evaluating them.
+        self.operators = {}
+        self._trees = {}
+        self._nodes = {}
+
+    def node_stats(self, node):
+        """The Stats of evaluating a node, or None if it wasn't evaluated."""
+        entry = self._nodes.get(id(node))
+        return entry[1] if entry is not None and entry[0] is node else None
+
+    def around_parse(self, expression, parse):
+        start = self.clock()
+        try:
+            return parse(expression)
+        finally:
+            self._stats(self.parses, expression).add(self.clock() - start)
+
+    def around_evaluate(self, expression, ast, context, evaluate):
+        self._trees[expression] = ast
+        start = self.clock()
+        try:
+            return evaluate(context)
+        finally:
+            self._stats(self.expressions, expression).add(self.clock() - start)
+
+    def around_visit(self, node, context, visit):
+        start = self.clock()
+        try:
+            return visit(node, context)
+        finally:
+            elapsed = self.clock() - start
+            entry = self._nodes.get(id(node))
+            if entry is None:
+                # Keep the node, so that its id isn't reused.
+                entry = self._nodes[id(node)] = (node, Stats())
+            entry[1].add(elapsed)
+            if isinstance(node, (BinaryExpression, UnaryExpression)):
+                self._stats(self.operators, node.operator.symbol).add(elapsed)
+
+    def around_transform(self, name, transform, args):
+        start = self.clock()
+        try:
+            return transform(*args)
+        finally:
+            self._stats(self.transforms, name).add(self.clock() - start)
+
+    def _stats(self, stats, key):
+        try:
+            return stats[key]
+        except KeyError:
+            stats[key] = Stats()
+            return stats[key]
+
+    def report(self, expression=None):
+        """
+        Return a text report of the time spent evaluating an expression,
+        broken down by node. Without an expression, report on every
+        evaluated expression, slowest first, followed by the totals for
+        each transform and operator.
+        """
+        if expression is not None:
+            return '\n'.join(self._expression_report(expression))
+
+        lines = []
+        expressions = sorted(self.expressions, key=lambda e: -self.expressions[e].total)
+        for expression in expressions:
+            lines.extend(self._expression_report(expression))
+            lines.append('')
+        for title, stats in (('transform', self.transforms), ('operator', self.operators)):
+            if stats:
+                lines.append('{:>8} {:>12}  {}'.format('calls', 'total', title))
+                for key in sorted(stats, key=lambda k: -stats[k].total):
+                    lines.append('{:>8} {:>12}  {}'.format(
+                        stats[key].count, milliseconds(stats[key].total), key
+                    ))
+                lines.append('')
+        return '\n'.join(lines).rstrip('\n')
+
+    def _expression_report(self, expression):
+        if expression not in self.expressions:
+            raise KeyError('Expression was not evaluated: {}'.format(expression))
+
+        stats = self.expressions[expression]
+        summary = 'evaluated {} times in {}'.format(stats.count, milliseconds(stats.total))
+        if expression in self.parses:
+            summary += ', parsed in {}'.format(milliseconds(self.parses[expression].total))
+        lines = [
+            'expression: {}'.format(expression),
+            summary,
+            '{:>8} {:>12}  {}'.format('calls', 'total', 'node'),
+        ]
+        for position, depth, node in positions(self._trees[expression]):
+            node_stats = self.node_stats(node) or Stats()
+            lines.append('{:>8} {:>12}  {}{} at {}'.format(
+                node_stats.count, milliseconds(node_stats.total), '  ' * depth,
+                describe(node), position
+            ))
+        return lines
@@ -0,0 +1,423 @@
+"""
+Evaluation of many expressions against the same context.
+
+A RuleSet parses each of its rules and merges identical subtrees across
+all of them into a single shared node. When the rules are evaluated,
+every shared subtree that only depends on the context is evaluated once
+and its value reused by every rule that contains it.
+"""
+from collections import OrderedDict
+
+from future.builtins.misc import super
+
+from pyjexl.analysis import identifier_path
+from pyjexl.evaluator import Context, Evaluator
+from pyjexl.memoize import EVALUATION, Scope
+from pyjexl.operators import default_binary_operators
+from pyjexl.optimizer import ConstantFolder, replace
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    child_nodes,
+    FilterExpression,
+    Identifier,
+    Literal,
+    Node,
+    node_fields,
+    ObjectLiteral,
+    Transform,
+)
+from pyjexl.utils import rebuild, RecursionError
+
+
+def literal_key(value):
+    """
+    Key for a literal value that, unlike ==, tells apart values of
+    different types such as 1, 1.0 and true, which don't always
+    evaluate the same way.
+    """
+    if isinstance(value, list):
+        return (list, tuple(literal_key(item) for item in value))
+    elif isinstance(value, dict):
+        return (dict, frozenset((key, literal_key(item)) for key, item in value.items()))
+    return (type(value), value)
+
+
+class MemoizingEvaluator(Evaluator):
+    """
+    Evaluator that remembers the value of a set of nodes, so that each
+    of them is evaluated at most once until the memo is cleared.
+    """
+    def __init__(self, jexl_config, memoized, budget=None):
+        super().__init__(jexl_config, budget)
+        self.memoized = memoized
+        self.memo = {}
+        # A budget replaces evaluate on the instance with its budgeted
+        # version, see Evaluator. The memo is checked before either one.
+        self._evaluate = self.__dict__.pop('evaluate', None) or super().evaluate
+        self.evaluate = self._evaluate_memoized
+
+    def _evaluate_memoized(self, expression, context=None):
+        key = id(expression)
+        if key not in self.memoized:
+            return self._evaluate(expression, context)
+
+        try:
+            return self.memo[key]
+        except KeyError:
+            value = self.memo[key] = self._evaluate(expression, context)
+            return value
+
+    def inline(self, node):
+        return id(node) not in self.memoized
+
+
+def conjuncts(node):
+    """Split a chain of default && operators into its operands."""
+    operands = []
+    while (isinstance(node, BinaryExpression)
+           and node.operator is default_binary_operators.get('&&')):
+        operands.append(node.right)
+        node = node.left
+    operands.append(node)
+    return list(reversed(operands))
+
+
+def literal_values(node):
+    """Return the values of an array of literals, or None."""
+    if isinstance(node, Literal) and isinstance(node.value, list):
+        return node.value
+    elif isinstance(node, ArrayLiteral) and all(isinstance(v, Literal) for v in node.value):
+        return [value.value for value in node.value]
+    return None
+
+
+def constraint(node):
+    """
+    Return (identifier, values) for an equality or membership test of
+    a context path against literals, like `channel == "beta"` or
+    `locale in ["en-US", "de"]`, which is true exactly when the value
+    at the path is one of values. Returns None for anything else.
+    """
+    if not isinstance(node, BinaryExpression):
+        return None
+
+    operator = node.operator
+    if operator is default_binary_operators.get('=='):
+        if isinstance(node.right, Literal):
+            identifier, values = node.left, [node.right.value]
+        elif isinstance(node.left, Literal):
+            identifier, values = node.right, [node.left.value]
+        else:
+            return None
+    elif operator is default_binary_operators.get('in'):
+        identifier, values = node.left, literal_values(node.right)
+        if values is None:
+            return None
+    else:
+        return None
+
+    path, relative, subject = identifier_path(identifier)
+    if not path or relative or subject is not None:
+        return None
+    try:
+        return identifier, frozenset(values)
+    except TypeError:
+        return None
+
+
+class RuleIndex(object):
+    """
+    Finds the rules that may be true for a context without evaluating
+    them all.
+
+    A rule that starts with equality or membership tests of context
+    paths against literals, like `channel == "beta" && locale in
+    ["en-US", "de"] && ...`, evaluates to false whenever one of those
+    tests fails, since the tests themselves return true or false. The
+    index maps each tested (path, value) to the rules that accept it, so
+    only the rules whose leading tests all pass, and the rules without
+    such tests, need to be evaluated.
+
+    Only leading tests are used: in `a && channel == "beta"`, a falsy a
+    would be the result, so the rule can't be skipped based on the
+    channel.
+    """
+    def __init__(self, rules):
+        self.unconstrained = []
+        self.constraint_counts = {}
+
+        #: Maps a path to (identifier, {value: {rule_id: count}}).
+        self.paths = OrderedDict()
+
+        for rule_id, node in rules.items():
+            constraints = []
+            for operand in conjuncts(node):
+                found = constraint(operand)
+                if found is None:
+                    break
+                constraints.append(found)
+
+            if not constraints:
+                self.unconstrained.append(rule_id)
+                continue
+
+            self.constraint_counts[rule_id] = len(constraints)
+            for identifier, values in constraints:
+                path, _, _ = identifier_path(identifier)
+                _, table = self.paths.setdefault(path, (identifier, {}))
+                for value in values:
+                    rule_counts = table.setdefault(value, {})
+                    rule_counts[rule_id] = rule_counts.get(rule_id, 0) + 1
+
+    def candidates(self, evaluator, context):
+        """
+        Return the set of ids of the rules that may be true for a
+        context. Every other rule evaluates to false.
+
+        If the value at a path can't be looked up, or can't be hashed,
+        the rules testing it are kept as candidates so that evaluating
+        them gives the same result, or error, as usual.
+        """
+        candidates = set(self.unconstrained)
+        satisfied = {}
+        for identifier, table in self.paths.values():
+            try:
+                rule_counts = table.get(evaluator.evaluate(identifier, context), {})
+            except Exception:
+                rule_counts = {}
+                for counts in table.values():
+                    for rule_id in counts:
+                        rule_counts[rule_id] = self.constraint_counts[rule_id]
+
+            for rule_id, count in rule_counts.items():
+                satisfied[rule_id] = satisfied.get(rule_id, 0) + count
+
+        candidates.update(
+            rule_id for rule_id, count in satisfied.items()
+            if count >= self.constraint_counts[rule_id]
+        )
+        return candidates
+
+
+class RuleSet(object):
+    """
+    A collection of expressions, identified by rule ids, that are
+    evaluated together against one context at a time.
+
+    Subtrees that appear more than once, in one rule or across several,
+    are evaluated once per context as long as they don't depend on a
+    relative value and only use pure operators and transforms (see
+    JEXL.add_transform). Their value is shared as well, so a rule must
+    not expect a list or dict it gets from a shared subtree to be a
+    fresh copy.
+
+    Unless indexed is False, rules are also looked up in a RuleIndex
+    first, and only the ones that could be true for a context are
+    evaluated. The results are the same either way.
+
+    The EvaluationBudget of the JEXL instance, if any, applies to each
+    rule separately. Shared subtrees count towards the budget of the
+    first rule that evaluates them.
+    """
+    def __init__(self, jexl, rules=None, indexed=True):
+        self.jexl = jexl
+        self.rules = OrderedDict()
+        self.indexed = indexed
+
+        self._nodes = {}
+        self._index = None
+        self._memoized = None
+        self._config_version = None
+        for rule_id, expression in (rules or {}).items():
+            self.add(rule_id, expression)
+
+    def add(self, rule_id, expression):
+        """Parse an expression and add it as the rule rule_id."""
+        ast = self.jexl.parse(expression)
+        if self.jexl.optimize:
+            try:
+                ast = ConstantFolder(self.jexl.config).visit(ast)
+            except RecursionError:
+                # Too deeply nested to optimize, but it can still be
+                # evaluated as is.
+                pass
+        self.rules[rule_id] = self.intern(ast)
+        self._index = None
+        self._memoized = None
+
+    def remove(self, rule_id):
+        del self.rules[rule_id]
+        self._index = None
+        self._memoized = None
+
+    def __contains__(self, rule_id):
+        return rule_id in self.rules
+
+    def __len__(self):
+        return len(self.rules)
+
+    def intern(self, node):
+        """
+        Return the shared node structurally identical to node, creating
+        it if no rule contains one yet. The children of shared nodes are
+        shared nodes themselves, so each one is only compared by
+        identity here. The tree is interned bottom-up without recursion,
+        so that long chains can be added.
+        """
+        return rebuild(node, child_nodes, self._intern)
+
+    def _intern(self, node, children):
+        """
+        Return the shared node for node, given the shared nodes for its
+        children, in the order listed by child_nodes.
+        """
+        children = iter(children)
+        fields = {}
+        key = [type(node).__name__]
+        for field in node_fields(node):
+            value = getattr(node, field)
+            if isinstance(node, Literal):
+                # Folded array and object literals hold plain values,
+                # not nodes.
+                key.append(literal_key(value))
+            elif isinstance(value, Node):
+                value = next(children)
+                key.append(id(value))
+            elif isinstance(value, list):
+                value = [next(children) for item in value]
+                key.append(tuple(id(item) for item in value))
+            elif isinstance(value, dict):
+                value = dict((name, next(children)) for name in value)
+                key.append(frozenset((name, id(item)) for name, item in value.items()))
+            else:
+                key.append(value)
+            fields[field] = value
+
+        key = tuple(key)
+        try:
+            return self._nodes[key]
+        except KeyError:
+            shared = self._nodes[key] = replace(node, **fields)
+            return shared
+        except TypeError:
+            # Literals of values that can't be hashed are never shared.
+            return replace(node, **fields)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = RuleIndex(self.rules)
+        return self._index
+
+    @property
+    def memoized(self):
+        """
+        The ids of the shared nodes whose values are remembered during
+        an evaluation.
+        """
+        if self._memoized is None or self._config_version != self.jexl._config_version:
+            self._memoized = self.find_memoized()
+            self._config_version = self.jexl._config_version
+        return self._memoized
+
+    def find_memoized(self):
+        counts = {}
+        cacheable = {}
+        for node in self.rules.values():
+            self._count(node, counts, cacheable)
+
+        return frozenset(
+            key for key, count in counts.items()
+            if count > 1 and cacheable[key]
+        )
+
+    def _count(self, root, counts, cacheable):
+        """
+        Count the references to root and, the first time each node is
+        seen, to its children. Returns whether root may be memoized.
+        """
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            key = id(node)
+            if not expanded:
+                counts[key] = counts.get(key, 0) + 1
+                # A node is finished before any other reference to it is
+                # popped, so the nodes seen before are in cacheable.
+                if key not in cacheable:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in self.children(node))
+            elif isinstance(node, FilterExpression) and node.relative:
+                # The filter expression is evaluated against each element
+                # of the subject, so its own relative identifiers don't
+                # make the filter as a whole depend on the relative value.
+                cacheable[key] = (
+                    cacheable[id(node.subject)] and self.is_context_only(node.expression)
+                )
+            else:
+                cacheable[key] = self.is_pure(node) and all(
+                    cacheable[id(child)] for child in self.children(node)
+                )
+        return cacheable[id(root)]
+
+    def is_context_only(self, node):
+        """
+        Whether a relative filter expression only reads its own relative
+        values and the context, using pure operators and transforms.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if not self.is_pure(node, allow_relative=True):
+                return False
+            stack.extend(self.children(node))
+        return True
+
+    def is_pure(self, node, allow_relative=False):
+        if isinstance(node, Identifier) and node.relative:
+            return allow_relative
+        elif isinstance(node, Transform):
+            return (
+                node.name in self.jexl.config.pure_transforms
+                and node.name in self.jexl.config.transforms
+            )
+        operator = getattr(node, 'operator', None)
+        return operator is None or operator.pure
+
+    def children(self, node):
+        """All child nodes, including the items of array and object literals."""
+        if isinstance(node, ArrayLiteral):
+            return node.value
+        elif isinstance(node, ObjectLiteral):
+            return list(node.value.values())
+        return [child for child in node.children if child is not None]
+
+    def evaluate(self, context=None, on_error=None):
+        """
+        Evaluate every rule against a context and return an OrderedDict
+        mapping rule ids to results, in the order the rules were added.
+
+        If on_error is given, a rule that fails to evaluate doesn't stop
+        the others: instead, on_error(rule_id, error) is called and the
+        rule is left out of the results.
+        """
+        context = Context(context) if context is not None else self.jexl.context
+        # Transforms memoized per evaluation share their results across rules.
+        with Scope(EVALUATION):
+            evaluator = MemoizingEvaluator(self.jexl.config, self.memoized, self.jexl.budget)
+            candidates = self.index.candidates(evaluator, context) if self.indexed else None
+
+            results = OrderedDict()
+            for rule_id, node in self.rules.items():
+                if candidates is not None and rule_id not in candidates:
+                    results[rule_id] = False
+                    continue
+
+                try:
+                    results[rule_id] = evaluator.evaluate(node, context)
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    on_error(rule_id, error)
+            return results
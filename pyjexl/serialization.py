@@ -0,0 +1,239 @@
+"""
+A binary format for storing parsed expressions, so that they can be
+loaded without parsing them again.
+
+The data starts with a header made of a magic string, the version of
+the format and a fingerprint of the JEXLConfig that the expressions were
+parsed with. The rest is zlib-compressed JSON holding each expression
+and its AST, with operators stored by symbol and transforms by name.
+Each AST is a flat list of its nodes in post-order, so that neither
+writing nor reading it recurses, however long a chain the expression
+holds.
+
+Loading fails with a PrecompiledError if the data was written by another
+version of the format or with a different configuration, since the ASTs
+might not evaluate the same way anymore.
+"""
+import hashlib
+import json
+import struct
+import zlib
+
+from pyjexl.exceptions import PrecompiledError
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    ConditionalExpression,
+    child_nodes,
+    FilterExpression,
+    Identifier,
+    Literal,
+    ObjectLiteral,
+    Transform,
+    node_fields,
+    UnaryExpression,
+)
+from pyjexl.utils import rebuild
+
+
+MAGIC = b'JEXL'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('>4sH20s')
+
+#: How Encoder stores the fields of each node type, in the order of
+#: their fields attribute. Child nodes aren't stored in the fields, but
+#: before the node itself.
+NODE_FIELDS = {
+    BinaryExpression: ('binary_operator', 'node', 'node'),
+    UnaryExpression: ('unary_operator', 'node'),
+    Literal: ('value',),
+    Identifier: ('value', 'optional_node', 'value'),
+    ObjectLiteral: ('node_dict',),
+    ArrayLiteral: ('node_list',),
+    Transform: ('value', 'node_list', 'node'),
+    FilterExpression: ('node', 'node', 'value'),
+    ConditionalExpression: ('node', 'node', 'node'),
+}
+NODE_TYPES = dict((node_type.__name__, node_type) for node_type in NODE_FIELDS)
+
+
+def function_name(func):
+    func = getattr(func, '__wrapped__', func)
+    return '{}.{}'.format(
+        getattr(func, '__module__', None),
+        getattr(func, '__qualname__', getattr(func, '__name__', repr(type(func))))
+    )
+
+
+def config_fingerprint(jexl_config):
+    """
+    Return a digest of everything in a JEXLConfig that affects how a
+    parsed expression evaluates: the operators, their precedence and
+    implementation, and the transforms.
+    """
+    def operators(operator_dict):
+        return sorted(
+            [op.symbol, op.precedence, op._evaluate_lazy, op.pure, function_name(op.evaluate)]
+            for op in operator_dict.values()
+        )
+
+    description = json.dumps([
+        operators(jexl_config.binary_operators),
+        operators(jexl_config.unary_operators),
+        sorted(
+            [name, function_name(func)] for name, func in jexl_config.transforms.items()
+        ),
+        sorted(jexl_config.pure_transforms),
+    ])
+    return hashlib.sha1(description.encode('utf-8')).digest()
+
+
+class Encoder(object):
+    """
+    Flattens an AST into a list of nodes in post-order: the children of
+    each node, in the order listed by child_nodes, come right before it.
+    """
+    def encode(self, root):
+        encoded = []
+
+        def build(node, children):
+            encoded.append(self.encode_fields(node))
+
+        rebuild(root, child_nodes, build)
+        return encoded
+
+    def encode_fields(self, node):
+        kinds = NODE_FIELDS[type(node)]
+        return [type(node).__name__] + [
+            getattr(self, 'encode_' + kind)(getattr(node, field))
+            for kind, field in zip(kinds, node_fields(node))
+        ]
+
+    def encode_node(self, node):
+        return None
+
+    def encode_optional_node(self, node):
+        return node is not None
+
+    def encode_node_list(self, nodes):
+        return len(nodes)
+
+    def encode_node_dict(self, nodes):
+        return list(nodes.keys())
+
+    def encode_value(self, value):
+        return value
+
+    def encode_binary_operator(self, operator):
+        return operator.symbol
+
+    encode_unary_operator = encode_binary_operator
+
+
+def pop(nodes, count):
+    """Remove and return the last count nodes of a list."""
+    if count > len(nodes):
+        raise IndexError('Missing child nodes.')
+    popped = nodes[len(nodes) - count:]
+    del nodes[len(nodes) - count:]
+    return popped
+
+
+class Decoder(object):
+    """
+    Rebuilds ASTs from the output of Encoder. Each node type has its own
+    method, since loading is meant to be much faster than parsing. The
+    methods take the nodes decoded so far and pop their children off
+    the end.
+    """
+    def __init__(self, jexl_config):
+        self.binary_operators = jexl_config.binary_operators
+        self.unary_operators = jexl_config.unary_operators
+        self.methods = dict(
+            (name, getattr(self, 'decode_' + name)) for name in NODE_TYPES
+        )
+
+    def decode(self, data):
+        nodes = []
+        for entry in data:
+            nodes.append(self.methods[entry[0]](entry, nodes))
+        if len(nodes) != 1:
+            raise ValueError('Expected a single root node.')
+        return nodes[0]
+
+    def decode_BinaryExpression(self, data, nodes):
+        right = nodes.pop()
+        left = nodes.pop()
+        node = BinaryExpression(self.binary_operators[data[1]], left, right)
+        left.parent = node
+        right.parent = node
+        return node
+
+    def decode_UnaryExpression(self, data, nodes):
+        return UnaryExpression(self.unary_operators[data[1]], nodes.pop())
+
+    def decode_Literal(self, data, nodes):
+        return Literal(data[1])
+
+    def decode_Identifier(self, data, nodes):
+        return Identifier(data[1], nodes.pop() if data[2] else None, data[3])
+
+    def decode_ObjectLiteral(self, data, nodes):
+        return ObjectLiteral(dict(zip(data[1], pop(nodes, len(data[1])))))
+
+    def decode_ArrayLiteral(self, data, nodes):
+        return ArrayLiteral(pop(nodes, data[1]))
+
+    def decode_Transform(self, data, nodes):
+        subject = nodes.pop()
+        return Transform(data[1], pop(nodes, data[2]), subject)
+
+    def decode_FilterExpression(self, data, nodes):
+        subject = nodes.pop()
+        return FilterExpression(nodes.pop(), subject, data[3])
+
+    def decode_ConditionalExpression(self, data, nodes):
+        alternate = nodes.pop()
+        consequent = nodes.pop()
+        return ConditionalExpression(nodes.pop(), consequent, alternate)
+
+
+def dumps(asts, jexl_config):
+    """
+    Serialize a dict mapping expressions to their parsed ASTs. Returns
+    bytes.
+    """
+    body = [[expression, Encoder().encode(ast)] for expression, ast in asts.items()]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, config_fingerprint(jexl_config))
+    return header + zlib.compress(json.dumps(body, separators=(',', ':')).encode('utf-8'))
+
+
+def loads(data, jexl_config):
+    """
+    Load a dict mapping expressions to their ASTs from bytes written by
+    dumps with the same configuration.
+    """
+    try:
+        magic, version, fingerprint = HEADER.unpack(data[:HEADER.size])
+    except struct.error:
+        raise PrecompiledError('Data is too short to be precompiled expressions.')
+
+    if magic != MAGIC:
+        raise PrecompiledError('Data is not precompiled expressions.')
+    elif version != FORMAT_VERSION:
+        raise PrecompiledError(
+            'Precompiled expressions use format version {}, expected {}.'.format(
+                version, FORMAT_VERSION
+            )
+        )
+    elif fingerprint != config_fingerprint(jexl_config):
+        raise PrecompiledError(
+            'Precompiled expressions were compiled with a different configuration.'
+        )
+
+    try:
+        body = json.loads(zlib.decompress(data[HEADER.size:]).decode('utf-8'))
+        decoder = Decoder(jexl_config)
+        return dict((expression, decoder.decode(ast)) for expression, ast in body)
+    except (ValueError, KeyError, IndexError, TypeError, zlib.error) as error:
+        raise PrecompiledError('Precompiled expressions are corrupted: {}'.format(error))
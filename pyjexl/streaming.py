@@ -0,0 +1,119 @@
+"""
+Evaluation of relative filters as lazy views over their subject.
+
+The StreamingEvaluator doesn't build a list for each relative filter.
+It returns a FilteredView that only tests elements when something reads
+them. Chains of relative filters, like `events[.type == "x"][.ts > 5]`,
+are fused into a single view that tests every condition in one pass,
+and indexing a view, like `events[.type == "x"][0]`, stops at the first
+match instead of testing every element. A default `in` whose right side
+is a filter also stops at the first match.
+
+Views are turned into lists as soon as they reach anything else: a
+transform, an attribute lookup, an operator, a literal, or the result
+of the whole expression. Callers never see a FilteredView.
+"""
+from itertools import islice
+
+from future.builtins.misc import super
+
+from pyjexl.evaluator import Context, Evaluator, index_filter, relative_scope
+from pyjexl.operators import default_binary_operators
+from pyjexl.parser import FilterExpression
+
+
+class FilteredView(object):
+    """
+    The elements of source for which every expression in expressions is
+    true, evaluated against context with each element as the relative
+    value. Elements are tested as the view is iterated.
+    """
+    def __init__(self, evaluator, source, expressions, context):
+        self.evaluator = evaluator
+        self.source = source
+        self.expressions = expressions
+        self.context = context
+
+    def __iter__(self):
+        evaluate = self.evaluator.evaluate
+        expressions = self.expressions
+        scope = relative_scope(self.context)
+        for value in self.evaluator.iterate_filter(self.source):
+            scope.relative_value = value
+            for expression in expressions:
+                if not evaluate(expression, scope):
+                    break
+            else:
+                yield value
+
+    def fuse(self, expression):
+        """Return a view that also filters on another expression."""
+        return FilteredView(
+            self.evaluator, self.source, self.expressions + [expression], self.context
+        )
+
+    def item(self, index):
+        """Return the element at a non-negative index, or None."""
+        for value in islice(self, index, None):
+            return value
+        return None
+
+
+IN = default_binary_operators['in']
+
+
+def materialize(value):
+    """Turn a FilteredView into a list. Any other value is returned as is."""
+    if isinstance(value, FilteredView):
+        return list(value)
+    return value
+
+
+class StreamingEvaluator(Evaluator):
+    def __init__(self, jexl_config):
+        super().__init__(jexl_config)
+
+    def evaluate(self, expression, context=None):
+        method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
+        if context is None:
+            context = Context()
+        value = method(expression, context)
+        if type(value) is FilteredView:
+            return list(value)
+        return value
+
+    def evaluate_subject(self, node, context):
+        subject = super().evaluate_subject(node, context)
+        if isinstance(node, FilterExpression):
+            return subject
+        return materialize(subject)
+
+    def visit_BinaryExpression(self, exp, context):
+        if exp.operator is IN and type(exp.right) is FilterExpression:
+            left = self.evaluate(exp.left, context)
+            return left in self.visit_FilterExpression(exp.right, context)
+        return Evaluator.visit_BinaryExpression(self, exp, context)
+
+    def apply_Identifier(self, identifier, subject, context):
+        return super().apply_Identifier(identifier, materialize(subject), context)
+
+    def apply_Path(self, path, subject, context):
+        return super().apply_Path(path, materialize(subject), context)
+
+    def apply_Transform(self, transform, subject, context):
+        return super().apply_Transform(transform, materialize(subject), context)
+
+    def apply_FilterExpression(self, filter_expression, values, context):
+        is_view = isinstance(values, FilteredView)
+        if filter_expression.relative:
+            if is_view and values.context is context:
+                return values.fuse(filter_expression.expression)
+            return FilteredView(self, values, [filter_expression.expression], context)
+        elif not is_view:
+            return super().apply_FilterExpression(filter_expression, values, context)
+
+        filter_value = self.evaluate(filter_expression.expression, context)
+        if isinstance(filter_value, int) and not isinstance(filter_value, bool):
+            if filter_value >= 0:
+                return values.item(filter_value)
+        return index_filter(list(values), filter_value)
@@ -0,0 +1,41 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """Yield successive lists of up to size items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def rebuild(root, get_children, build):
+    """
+    Rebuild a tree bottom-up without recursion: build(item, children) is
+    called for each item of the tree with the rebuilt children of the
+    item, as listed by get_children(item), and the result for the root
+    is returned.
+    """
+    results = []
+    stack = [(root, None)]
+    while stack:
+        item, children = stack.pop()
+        if children is None:
+            children = get_children(item)
+            stack.append((item, children))
+            stack.extend((child, None) for child in reversed(children))
+        else:
+            start = len(results) - len(children)
+            built = results[start:]
+            del results[start:]
+            results.append(build(item, built))
+    return results[0]
+
+
+try:
+    RecursionError = RecursionError
+except NameError:
+    # Python 2.7 compat
+    RecursionError = RuntimeError
@@ -0,0 +1,284 @@
+"""
+Element-wise evaluation of an expression over columns of records.
+
+The VectorizedEvaluator takes a batch of records in columnar form, a
+dict mapping column names to NumPy arrays (or anything numpy.asarray
+accepts), and evaluates an expression for every row at once. The
+default arithmetic and comparison operators become NumPy ufuncs,
+conditionals select between their branches with a mask, and && and ||
+only evaluate their right operand on the rows where it decides the
+result, just like they short-circuit when evaluating a single record.
+
+Nested values are looked up with dotted column names, so the column
+'normandy.channel' holds the values of `normandy.channel`. Anything
+else is resolved from the rows themselves, which are rebuilt from the
+columns when needed.
+
+Transforms and custom operators are called once per row with the
+values computed for their operands. Constructs that can't be evaluated
+one column at a time, like filters, fall back to evaluating the node
+with the Evaluator for each row.
+
+NumPy is an optional dependency: install pyjexl[numpy] to use this
+module.
+"""
+import operator as operators
+
+from pyjexl.codegen import PYTHON_OPERATORS
+from pyjexl.evaluator import Context, Evaluator, get_transform
+from pyjexl.operators import default_binary_operators, default_unary_operators
+from pyjexl.parser import Identifier
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def object_array(values):
+    """Build a 1-d object array, even from a list of lists."""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def elementwise(func, *arrays):
+    """Call func with the values of each row and return the results."""
+    if not len(arrays[0]):
+        return np.empty(0, dtype=object)
+    return np.frompyfunc(func, len(arrays), 1)(*[array.astype(object) for array in arrays])
+
+
+def truthy(values):
+    """Mask of the values that are true in a boolean context."""
+    if values.dtype == bool:
+        return values
+    elif values.dtype.kind in 'iufc':
+        return values != 0
+    return elementwise(bool, values).astype(bool)
+
+
+def as_number(values):
+    return values.astype(int) if values.dtype == bool else values
+
+
+#: Operators whose results can overflow the integer types of NumPy,
+#: which silently wrap around instead of growing like Python integers.
+OVERFLOWING_OPERATORS = {
+    operators.add, operators.sub, operators.mul, operators.floordiv, operators.pow
+}
+
+#: Integer results are computed with NumPy if an estimate using floats
+#: stays below this, leaving room for rounding errors in the estimate.
+MAX_INTEGER_ESTIMATE = 2.0 ** 62
+
+
+def may_overflow(func, left, right):
+    """Whether func might overflow the integer type of its operands."""
+    if func not in OVERFLOWING_OPERATORS or left.dtype.kind not in 'iu' or (
+        right.dtype.kind not in 'iu'
+    ):
+        return False
+    with np.errstate(all='ignore'):
+        estimate = func(left.astype(float), right.astype(float))
+    return not np.all(np.abs(estimate) < MAX_INTEGER_ESTIMATE)
+
+
+def merge(mask, when_true, when_false):
+    """
+    Combine values computed for the rows where mask is set and for the
+    rows where it isn't into a single array.
+    """
+    dtype = when_true.dtype if when_true.dtype == when_false.dtype else object
+    result = np.empty(len(mask), dtype=dtype)
+    result[mask] = when_true
+    result[~mask] = when_false
+    return result
+
+
+def column_path(identifier):
+    """
+    Return the dotted path of an identifier that only looks up keys
+    from the context, like `normandy.channel`, or None.
+    """
+    names = []
+    while isinstance(identifier, Identifier) and not identifier.relative:
+        names.append(identifier.value)
+        if identifier.subject is None:
+            return '.'.join(reversed(names))
+        identifier = identifier.subject
+    return None
+
+
+class Batch(object):
+    """
+    The rows that part of an expression is evaluated on: all of the
+    records passed in, or the subset selected by a conditional or a
+    short-circuiting operator.
+    """
+    def __init__(self, columns, size, index=None):
+        self.columns = columns
+        self.size = size
+        self.index = index
+
+        self._columns = {}
+        self._rows = None
+
+    def __len__(self):
+        return self.size
+
+    def subset(self, mask):
+        index = np.flatnonzero(mask) if self.index is None else self.index[mask]
+        return Batch(self.columns, len(index), index)
+
+    def column(self, name):
+        if name not in self._columns:
+            values = self.columns[name]
+            try:
+                values = np.asarray(values)
+            except ValueError:
+                values = object_array(list(values))
+            if values.ndim != 1:
+                values = object_array(list(values))
+            elif values.dtype.kind in 'USV':
+                values = values.astype(object)
+            if self.index is not None:
+                values = values[self.index]
+            self._columns[name] = values
+        return self._columns[name]
+
+    def rows(self):
+        """The records in this batch as dicts, nested by column path."""
+        if self._rows is None:
+            self._rows = [{} for _ in range(self.size)]
+            for name in self.columns:
+                path = name.split('.')
+                for row, value in zip(self._rows, self.column(name).tolist()):
+                    for key in path[:-1]:
+                        row = row.setdefault(key, {})
+                    row[path[-1]] = value
+        return self._rows
+
+
+class VectorizedEvaluator(object):
+    def __init__(self, jexl_config):
+        if np is None:
+            raise ImportError(
+                'NumPy is required for vectorized evaluation: pip install pyjexl[numpy]'
+            )
+        self.config = jexl_config
+        self.evaluator = Evaluator(jexl_config)
+
+    def evaluate(self, expression, columns):
+        """
+        Evaluate an expression for each row of a dict of equally long
+        columns and return an array of the results.
+        """
+        sizes = set(len(column) for column in columns.values())
+        if len(sizes) > 1:
+            raise ValueError('All columns must have the same length.')
+        return self.visit(expression, Batch(columns, sizes.pop() if sizes else 0))
+
+    def visit(self, expression, batch):
+        method = getattr(self, 'visit_' + type(expression).__name__, self.generic_visit)
+        return method(expression, batch)
+
+    def visit_BinaryExpression(self, exp, batch):
+        operator = exp.operator
+        if operator is default_binary_operators.get('&&'):
+            left = self.visit(exp.left, batch)
+            mask = truthy(left)
+            return merge(mask, self.visit(exp.right, batch.subset(mask)), left[~mask])
+        elif operator is default_binary_operators.get('||'):
+            left = self.visit(exp.left, batch)
+            mask = truthy(left)
+            return merge(mask, left[mask], self.visit(exp.right, batch.subset(~mask)))
+        elif operator._evaluate_lazy:
+            return self.generic_visit(exp, batch)
+
+        left = self.visit(exp.left, batch)
+        right = self.visit(exp.right, batch)
+        if operator.evaluate in PYTHON_OPERATORS:
+            # Let NumPy raise where Python would, such as when dividing
+            # by zero, and retry those rows as Python values. Booleans
+            # are numbers in Python but not in NumPy, where true + true
+            # is true. Integer overflow doesn't raise, so it's checked
+            # for separately.
+            left_number, right_number = as_number(left), as_number(right)
+            if not may_overflow(operator.evaluate, left_number, right_number):
+                try:
+                    with np.errstate(divide='raise', over='raise', invalid='raise'):
+                        result = operator.evaluate(left_number, right_number)
+                    if isinstance(result, np.ndarray) and result.shape == left.shape:
+                        return result
+                except (ArithmeticError, TypeError, ValueError):
+                    pass
+        return elementwise(operator.evaluate, left, right)
+
+    def visit_UnaryExpression(self, exp, batch):
+        operator = exp.operator
+        if operator is default_unary_operators.get('!'):
+            return ~truthy(self.visit(exp.right, batch))
+        elif operator._evaluate_lazy:
+            return self.generic_visit(exp, batch)
+        return elementwise(operator.evaluate, self.visit(exp.right, batch))
+
+    def visit_ConditionalExpression(self, conditional, batch):
+        mask = truthy(self.visit(conditional.test, batch))
+        return merge(
+            mask,
+            self.visit(conditional.consequent, batch.subset(mask)),
+            self.visit(conditional.alternate, batch.subset(~mask))
+        )
+
+    def visit_Literal(self, literal, batch):
+        if isinstance(literal.value, (bool, int, float)):
+            try:
+                return np.full(len(batch), literal.value)
+            except OverflowError:
+                pass
+        values = np.empty(len(batch), dtype=object)
+        values.fill(literal.value)
+        return values
+
+    def visit_Identifier(self, identifier, batch):
+        if identifier.relative:
+            return self.generic_visit(identifier, batch)
+
+        name = identifier.value
+        path = column_path(identifier)
+        if path in batch.columns:
+            return batch.column(path)
+        elif identifier.subject is not None:
+            subject = self.visit(identifier.subject, batch)
+            return elementwise(lambda value: value.get(name, None), subject)
+        return object_array([row.get(name, None) for row in batch.rows()])
+
+    def visit_ObjectLiteral(self, object_literal, batch):
+        keys = list(object_literal.value.keys())
+        values = [self.visit(object_literal.value[key], batch).tolist() for key in keys]
+        rows = [{} for _ in range(len(batch))]
+        for key, column in zip(keys, values):
+            for row, value in zip(rows, column):
+                row[key] = value
+        return object_array(rows)
+
+    def visit_ArrayLiteral(self, array_literal, batch):
+        values = [self.visit(value, batch).tolist() for value in array_literal.value]
+        rows = [[] for _ in range(len(batch))]
+        for column in values:
+            for row, value in zip(rows, column):
+                row.append(value)
+        return object_array(rows)
+
+    def visit_Transform(self, transform, batch):
+        transform_func = get_transform(self.config.transforms, transform.name)
+        subject = self.visit(transform.subject, batch)
+        args = [self.visit(arg, batch) for arg in transform.args]
+        return elementwise(transform_func, subject, *args)
+
+    def generic_visit(self, expression, batch):
+        """Evaluate a node with the Evaluator, one row at a time."""
+        return object_array([
+            self.evaluator.evaluate(expression, Context(row)) for row in batch.rows()
+        ])
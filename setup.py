@@ -61,7 +61,7 @@ setup(
 
     # You can just specify the packages manually here if your project is
     # simple. Or you can use find_packages().
-    packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    packages=find_packages(exclude=['benchmarks', 'contrib', 'docs', 'tests']),
 
     # List run-time dependencies here.  These will be installed by pip when
     # your project is installed. For an analysis of "install_requires" vs pip's
@@ -69,6 +69,11 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=['parsimonious', 'future'],
 
+    # Optional dependencies, installed with e.g. `pip install pyjexl[numpy]`.
+    extras_require={
+        'numpy': ['numpy'],
+    },
+
     # So that you can run `python setup.py test`.
     tests_require=['pytest'],
     setup_requires=['pytest-runner'],
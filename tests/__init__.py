@@ -1,9 +1,11 @@
 from future.builtins.misc import super
 
+from pyjexl.compiler import ClosureEvaluator
 from pyjexl.evaluator import Evaluator
 from pyjexl.jexl import JEXLConfig
 from pyjexl.operators import default_binary_operators, default_unary_operators
 from pyjexl.parser import jexl_grammar, Parser
+from pyjexl.pratt import PrattParser
 
 
 default_config = JEXLConfig({}, default_unary_operators, default_binary_operators)
@@ -19,3 +21,13 @@ class DefaultParser(Parser):
 class DefaultEvaluator(Evaluator):
     def __init__(self, config=None):
         super().__init__(config or default_config)
+
+
+class DefaultPrattParser(PrattParser):
+    def __init__(self, config=None):
+        super().__init__(config or default_config)
+
+
+class DefaultClosureEvaluator(ClosureEvaluator):
+    def __init__(self, config=None):
+        super().__init__(config or default_config)
@@ -0,0 +1,5 @@
+from future.utils import PY2
+
+
+# The async tests use syntax that doesn't exist in Python 2.
+collect_ignore = ['test_async.py'] if PY2 else []
@@ -0,0 +1,60 @@
+from pyjexl.analysis import DependencyAnalyzer
+from pyjexl.jexl import JEXL
+
+
+def dependencies(expression):
+    return JEXL().analyze(expression, DependencyAnalyzer)
+
+
+def test_paths():
+    result = dependencies('normandy.channel == "release" && user.age > 18 ? 1 : fallback')
+    assert result.paths == {('normandy', 'channel'), ('user', 'age'), ('fallback',)}
+    assert result.relative_paths == set()
+    assert result.transforms == set()
+
+
+def test_literals_and_transforms():
+    result = dependencies('[a, {k: b.c}]|first(d.e)|keys')
+    assert result.paths == {('a',), ('b', 'c'), ('d', 'e')}
+    assert result.transforms == {'first', 'keys'}
+
+
+def test_keys_of_computed_values_are_not_paths():
+    assert dependencies('(a|t).b').paths == {('a',)}
+    assert dependencies('foo[0].bar').paths == {('foo',)}
+    assert dependencies('foo[bar.baz]').paths == {('foo',), ('bar', 'baz')}
+
+
+def test_relative_paths():
+    result = dependencies('addons[.id == "x" && .meta.enabled && .id != other]')
+    assert result.paths == {('addons',), ('other',)}
+    assert result.relative_paths == {(('addons',), ('id',)), (('addons',), ('meta', 'enabled'))}
+
+
+def test_nested_relative_paths():
+    result = dependencies('studies[.branches[.slug == "a"]]|count')
+    assert result.paths == {('studies',)}
+    assert result.relative_paths == {
+        (('studies',), ('branches',)),
+        ((('studies',), ('branches',)), ('slug',)),
+    }
+    assert dependencies('(a|t)[.x]').relative_paths == {(None, ('x',))}
+
+
+def test_chained_filters():
+    result = dependencies('a[.x > 1][.y][.z[.w]]')
+    assert result.paths == {('a',)}
+    assert result.relative_paths == {
+        (('a',), ('x',)),
+        (('a',), ('y',)),
+        (('a',), ('z',)),
+        ((('a',), ('z',)), ('w',)),
+    }
+    assert dependencies('a[0][.y]').relative_paths == {(None, ('y',))}
+
+
+def test_long_chains():
+    jexl = JEXL(parser='pratt')
+    result = jexl.analyze(' + '.join(['a.b'] * 5000) + ' + c[.d]', DependencyAnalyzer)
+    assert result.paths == {('a', 'b'), ('c',)}
+    assert result.relative_paths == {(('c',), ('d',))}
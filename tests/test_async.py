@@ -0,0 +1,168 @@
+import asyncio
+import gc
+
+import pytest
+
+from pyjexl.evaluator import Context, EvaluationBudget, Lazy, LazyMapping
+from pyjexl.exceptions import MissingTransformError
+from pyjexl.jexl import JEXL
+from pyjexl.operators import Operator
+
+
+def run(awaitable):
+    # asyncio.run needs Python 3.7.
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(awaitable)
+    finally:
+        loop.close()
+
+
+async def value_later(value, delay=0):
+    await asyncio.sleep(delay)
+    return value
+
+
+@pytest.fixture
+def jexl():
+    jexl = JEXL()
+    jexl.add_transform('double', lambda value: value * 2)
+
+    @jexl.transform()
+    async def fetch(value, delay=0):
+        return await value_later(value, delay)
+
+    return jexl
+
+
+@pytest.mark.parametrize('expression', [
+    '1 + 2 * 3',
+    '!foo.bar',
+    'foo.bar == "baz" ? [1, 2] : {a: 1}',
+    'items[.x > 1]',
+    'items[1].x|double',
+    '[foo.bar, items[0].x][1]',
+    '"a" in ["a", "b"] && 0 || "c"',
+])
+def test_matches_evaluator(jexl, expression):
+    context = {'foo': {'bar': 'baz'}, 'items': [{'x': 1}, {'x': 2}]}
+    expected = jexl.evaluate(expression, context)
+    assert run(jexl.evaluate_async(expression, context)) == expected
+
+
+def test_awaitable_transforms(jexl):
+    assert run(jexl.evaluate_async('foo|fetch + 1', {'foo': 2})) == 3
+    assert run(jexl.evaluate_async('(foo|fetch)|double|fetch', {'foo': 2})) == 4
+
+    with pytest.raises(MissingTransformError):
+        run(jexl.evaluate_async('foo|missing', {'foo': 2}))
+
+
+def test_filter_generators(jexl):
+    jexl.add_transform('generate', lambda count: ({'v': index} for index in range(count)))
+    expression = '3|generate[.v > 0]'
+    assert run(jexl.evaluate_async(expression)) == jexl.evaluate(expression) == [
+        {'v': 1}, {'v': 2}
+    ]
+
+
+def test_awaitable_context_values(jexl):
+    async def evaluate():
+        user = value_later({'country': 'CA', 'age': 30})
+        return await jexl.evaluate_async(
+            'user.country == "CA" && user.age > 18 ? user.age : 0',
+            {'user': user}
+        )
+
+    # The coroutine is used three times but can only be awaited once.
+    assert run(evaluate()) == 30
+
+
+def test_independent_branches_are_concurrent(jexl):
+    async def evaluate():
+        started = asyncio.get_event_loop().time()
+        result = await jexl.evaluate_async('[1|fetch(0.2), 2|fetch(0.2), 3|fetch(0.2)]')
+        return result, asyncio.get_event_loop().time() - started
+
+    result, elapsed = run(evaluate())
+    assert result == [1, 2, 3]
+    assert elapsed < 0.5
+
+
+def test_short_circuit(jexl):
+    calls = []
+
+    @jexl.transform()
+    async def record(value):
+        calls.append(value)
+        return value
+
+    assert run(jexl.evaluate_async('false && 1|record')) is False
+    assert run(jexl.evaluate_async('true || 2|record')) is True
+    assert run(jexl.evaluate_async('true ? 3|record : 4|record')) == 3
+    assert calls == [3]
+
+
+def test_lazy_custom_operators(jexl):
+    calls = []
+
+    @jexl.transform()
+    async def record(value):
+        calls.append(value)
+        return value
+
+    jexl.add_binary_operator('??', 10, None)
+    jexl.config.binary_operators['??'] = Operator(
+        '??', 10, lambda a, b: a() if a() is not None else b(), evaluate_lazy=True
+    )
+
+    assert run(jexl.evaluate_async('1|record ?? 2|record')) == 1
+    assert run(jexl.evaluate_async('foo ?? 3|record')) == 3
+    assert calls == [1, 3]
+
+
+def test_lazy_values(jexl):
+    user = LazyMapping({'country': Lazy(lambda: value_later('CA'))})
+    context = Context({'user': Lazy(lambda: user)})
+    assert run(jexl.evaluate_async('user.country + user.country', context)) == 'CACA'
+
+
+def test_context_resolver(jexl):
+    context = Context({}, resolver=lambda key: key.upper())
+    assert run(jexl.evaluate_async('geo', context)) == jexl.evaluate('geo', context) == 'GEO'
+    assert run(jexl.evaluate_async('geo', {'geo': 1})) == 1
+
+
+def test_budget_is_refused():
+    jexl = JEXL(budget=EvaluationBudget(max_nodes=10))
+    with pytest.raises(ValueError):
+        jexl.evaluate_async('1 + 2')
+
+
+def test_failures_cancel_other_branches(jexl):
+    finished = []
+
+    @jexl.transform()
+    async def slow(value):
+        await asyncio.sleep(0.1)
+        finished.append(value)
+        return value
+
+    @jexl.transform()
+    async def fail(value):
+        raise ValueError(value)
+
+    async def evaluate():
+        errors = []
+        asyncio.get_event_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+        context = {'shared': value_later(5, 0.1)}
+        with pytest.raises(ValueError):
+            await jexl.evaluate_async('[1|slow, 2|fail, [shared, 3|slow, 4|fail]]', context)
+        await asyncio.sleep(0.2)
+        gc.collect()
+        return errors
+
+    assert run(evaluate()) == []
+    assert finished == []
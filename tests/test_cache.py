@@ -0,0 +1,48 @@
+from pyjexl.cache import LRUCache
+
+
+def test_get_missing():
+    cache = LRUCache(2)
+    assert cache.get('foo') is None
+    assert cache.get('foo', 5) == 5
+
+
+def test_eviction_order():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+
+
+def test_unbounded():
+    cache = LRUCache(None)
+    for i in range(1000):
+        cache.set(i, i)
+    assert len(cache) == 1000
+
+
+def test_clear():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl():
+    now = [0]
+    cache = LRUCache(2, ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    now[0] = 5
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    now[0] = 10
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
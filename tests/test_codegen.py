@@ -0,0 +1,117 @@
+import pytest
+
+from pyjexl.codegen import PythonCompiler, UnsupportedExpression
+from pyjexl.evaluator import Context
+from pyjexl.jexl import JEXL, JEXLConfig
+from pyjexl.operators import default_binary_operators, default_unary_operators, Operator
+from pyjexl.parser import BinaryExpression, Identifier, Literal
+
+from . import default_config, DefaultParser
+
+
+def tree(expression):
+    return DefaultParser().parse(expression)
+
+
+def source(expression, config=default_config):
+    return PythonCompiler(config).generate(tree(expression))[0]
+
+
+def test_default_operators_become_python_operators():
+    assert 'return ((1 + 2) * 3)\n' in source('(1 + 2) * 3')
+    assert 'return (not True)\n' in source('!true')
+    assert "return ('a' in ['a', 'b'])\n" in source('"a" in ["a", "b"]')
+
+
+def test_logic_becomes_short_circuit():
+    assert 'return ((1 and 2) or 3)\n' in source('1 && 2 || 3')
+
+
+def test_left_associative_chains_are_flattened():
+    assert 'return (1 - 2 - 3 - (4 * 5))\n' in source('1 - 2 - 3 - 4 * 5')
+    assert 'return ((1 == 2) == 3)\n' in source('1 == 2 == 3')
+    assert 'return ((2 ** 3) ** 2)\n' in source('2 ^ 3 ^ 2')
+    assert 'return (1 - (2 - 3))\n' in source('1 - (2 - 3)')
+
+    expression = ' && '.join('foo{} == 1'.format(i) for i in range(500))
+    assert PythonCompiler(default_config).compile(tree(expression))() is False
+
+
+def test_identifiers_become_get_chains():
+    assert "return (context.get('foo', None)).get('bar', None)\n" in source('foo.bar')
+
+
+def test_relative_filters_become_comprehensions():
+    assert "[_r0 for _r0 in context.get('foo', None) if (_r0.get('bar', None) == 1)]" in (
+        source('foo[.bar == 1]')
+    )
+
+
+def test_nested_relative_filters():
+    compiled = PythonCompiler(default_config).compile(tree('foo[.bar[.baz == 1]]'))
+    context = Context({'foo': [
+        {'bar': [{'baz': 1}]},
+        {'bar': [{'baz': 2}]},
+    ]})
+    assert compiled(context) == [{'bar': [{'baz': 1}]}]
+
+
+def test_custom_operators():
+    config = JEXLConfig(
+        transforms={},
+        unary_operators=dict(default_unary_operators, **{
+            '~': Operator('~', 1000, lambda x: -x),
+            '?!': Operator('?!', 1000, lambda x: x() is None, evaluate_lazy=True),
+        }),
+        binary_operators=dict(default_binary_operators, **{
+            '=': Operator('=', 20, lambda a, b: (a + b) / 2),
+            '??': Operator('??', 10, lambda a, b: b() if a() is None else a(), True),
+        })
+    )
+    compiler = PythonCompiler(config)
+    assert compiler.compile(BinaryExpression(
+        operator=config.binary_operators['='],
+        left=Literal(2),
+        right=Literal(4)
+    ))() == 3
+    assert compiler.compile(BinaryExpression(
+        operator=config.binary_operators['??'],
+        left=Identifier('foo'),
+        right=Literal(4)
+    ))() == 4
+
+
+def test_transforms():
+    config = JEXLConfig({'add': lambda x, y: x + y}, default_unary_operators,
+                        default_binary_operators)
+    compiled = PythonCompiler(config).compile(tree('foo|add(bar)'))
+    assert compiled(Context({'foo': 1, 'bar': 2})) == 3
+
+
+def test_unsupported_nodes_fall_back_to_evaluator():
+    class PartialCompiler(PythonCompiler):
+        def generate_ConditionalExpression(self, conditional):
+            raise UnsupportedExpression(conditional)
+
+    expression = tree('foo[(.bar ? .bar : 0) > 1]')
+    compiler = PartialCompiler(default_config)
+    assert '_evaluate(_n' in compiler.generate(expression)[0]
+
+    context = Context({'foo': [{'bar': 1}, {'bar': 2}, {}]})
+    assert compiler.compile(expression)(context) == [{'bar': 2}]
+
+
+def test_uncompilable_source_falls_back_to_evaluator():
+    class BrokenCompiler(PythonCompiler):
+        def generate(self, expression):
+            # Mimics expressions nested beyond the Python parser's limit.
+            raise SyntaxError('too many nested parentheses')
+
+    compiled = BrokenCompiler(default_config).compile(tree('foo + 1'))
+    assert compiled(Context({'foo': 1})) == 2
+
+
+@pytest.mark.parametrize('expression', ['1.5.foo', '"foo".bar'])
+def test_attribute_errors(expression):
+    with pytest.raises(AttributeError):
+        JEXL(backend='python').evaluate(expression)
@@ -0,0 +1,117 @@
+import pytest
+
+from pyjexl.compact import compact, CompactEvaluator, expand
+from pyjexl.evaluator import Context, Evaluator
+from pyjexl.exceptions import MissingTransformError
+from pyjexl.jexl import JEXL
+
+from . import DefaultParser
+
+
+EXPRESSIONS = [
+    '1 + 2 * 3',
+    '-1.5',
+    '!foo',
+    'foo.bar.baz',
+    'name|upper|pad(1, "2")',
+    'items[.x.y == 1 && .z[.w]]',
+    'items[0].x.y',
+    '{a: 1, b: [2, {c: foo.bar}]}',
+    '[]',
+    'a ? b : c ? d : e',
+    'name|upper in "XABC" && 1 - 2 - 3 == -4 || false',
+]
+
+CONTEXT = {
+    'foo': {'bar': {'baz': 1}},
+    'name': 'abc',
+    'items': [{'x': {'y': 1}, 'z': [{'w': 1}]}, {'x': {'y': 1}, 'z': []}],
+    'a': 0,
+    'b': 1,
+    'c': 0,
+    'd': 2,
+    'e': 3,
+}
+
+
+def make_jexl():
+    jexl = JEXL()
+    jexl.add_transform('upper', lambda value: value.upper())
+    jexl.add_transform('pad', lambda value, left, right: '{}{}{}'.format(left, value, right))
+    return jexl
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_round_trip(expression):
+    ast = make_jexl().parse(expression)
+    assert expand(compact(ast)) == ast
+
+
+def test_round_trip_restores_parents():
+    ast = expand(compact(DefaultParser().parse('1 + 2 * 3')))
+    assert ast.right.parent is ast
+    assert ast.right.left.parent is ast.right
+
+
+def test_compact_form():
+    jexl = make_jexl()
+    tree = compact(jexl.parse('foo.bar[.x.y > 1]|pad(1, [2])'))
+    greater = jexl.config.binary_operators['>']
+    assert tree == (
+        'Transform', 'pad',
+        ('FilterExpression',
+            ('Path', None, ('foo', 'bar'), False),
+            ('BinaryExpression', greater, ('Path', None, ('x', 'y'), True), ('Literal', 1)),
+            True),
+        (('Literal', 1), ('ArrayLiteral', (('Literal', 2),))),
+    )
+
+
+def test_names_are_interned():
+    first = compact(DefaultParser().parse('foo.' + 'bar' * 10))
+    second = compact(DefaultParser().parse('foo.' + 'bar' * 10))
+    assert first[2][1] is second[2][1]
+
+
+def test_long_chains():
+    config = make_jexl().config
+    tree = compact(DefaultParser().parse('1' + ' + 1' * 2000))
+    assert CompactEvaluator(config).evaluate(tree) == 2001
+    assert Evaluator(config).evaluate(expand(tree)) == 2001
+
+    a = {}
+    a['a'] = a
+    tree = compact(DefaultParser().parse('a' + '.a' * 2000))
+    assert len(tree[2]) == 2001
+    assert Evaluator(config).evaluate(expand(tree), Context({'a': a})) is a
+
+
+def outcome(evaluator, tree):
+    """The result of evaluating a tree, or the type of error it raises."""
+    try:
+        return evaluator.evaluate(tree, Context(CONTEXT))
+    except Exception as error:
+        return type(error)
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_evaluate(expression):
+    jexl = make_jexl()
+    ast = jexl.parse(expression)
+    expected = outcome(Evaluator(jexl.config), ast)
+    assert outcome(CompactEvaluator(jexl.config), compact(ast)) == expected
+
+
+def test_evaluate_filters():
+    evaluator = CompactEvaluator(make_jexl().config)
+    context = Context({'items': [{'x': 1}, {'x': 2}, {'x': 3}]})
+    tree = compact(DefaultParser().parse('items[.x > 1][1].x'))
+    assert evaluator.evaluate(tree, context) == 3
+    assert evaluator.evaluate(compact(DefaultParser().parse('items[5]')), context) is None
+    assert evaluator.evaluate(compact(DefaultParser().parse('items[false]')), context) is None
+
+
+def test_missing_transform():
+    evaluator = CompactEvaluator(make_jexl().config)
+    with pytest.raises(MissingTransformError):
+        evaluator.evaluate(compact(DefaultParser().parse('1|missing')))
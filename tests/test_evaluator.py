@@ -1,76 +1,92 @@
 from builtins import str
+import time
 
 import pytest
 
-from pyjexl.evaluator import Context, Evaluator
-from pyjexl.exceptions import MissingTransformError
+from pyjexl.codegen import PythonEvaluator
+from pyjexl.compiler import ClosureEvaluator
+from pyjexl.evaluator import Context, EvaluationBudget, Evaluator, Lazy, LazyMapping
+from pyjexl.exceptions import BudgetExceededError, MissingTransformError
 from pyjexl.jexl import JEXLConfig
 from pyjexl.operators import default_binary_operators, default_unary_operators
 
-from . import DefaultEvaluator, DefaultParser
+from . import default_config, DefaultParser
 
 
 def tree(expression):
     return DefaultParser().parse(expression)
 
 
-def test_literal():
-    result = DefaultEvaluator().evaluate(tree('1'))
+@pytest.fixture(
+    params=[Evaluator, ClosureEvaluator, PythonEvaluator],
+    ids=['interpreter', 'closure', 'python']
+)
+def evaluator_class(request):
+    return request.param
+
+
+@pytest.fixture
+def evaluator(evaluator_class):
+    return evaluator_class(default_config)
+
+
+def test_literal(evaluator):
+    result = evaluator.evaluate(tree('1'))
     assert result == 1.0
 
 
-def test_binary_expression():
-    result = DefaultEvaluator().evaluate(tree('1 + 2'))
+def test_binary_expression(evaluator):
+    result = evaluator.evaluate(tree('1 + 2'))
     assert result == 3.0
 
 
-def test_arithmetic():
-    result = DefaultEvaluator().evaluate(tree('(2 + 3) * 4'))
+def test_arithmetic(evaluator):
+    result = evaluator.evaluate(tree('(2 + 3) * 4'))
     assert result == 20
 
 
-def test_string_concat():
+def test_string_concat(evaluator_class):
     # Because we don't have implicit type conversions like JavaScript,
     # we diverge from the original JEXL test suite and add a filter.
     config = JEXLConfig({'str': str}, default_binary_operators, default_unary_operators)
-    evaluator = Evaluator(config)
+    evaluator = evaluator_class(config)
     result = evaluator.evaluate(tree('"Hello" + (4+4)|str + "Wo\\"rld"'))
     assert result == 'Hello8Wo"rld'
 
 
-def test_true_comparison():
-    result = DefaultEvaluator().evaluate(tree('2 > 1'))
+def test_true_comparison(evaluator):
+    result = evaluator.evaluate(tree('2 > 1'))
     assert result
 
 
-def test_false_comparison():
-    result = DefaultEvaluator().evaluate(tree('2 <= 1'))
+def test_false_comparison(evaluator):
+    result = evaluator.evaluate(tree('2 <= 1'))
     assert not result
 
 
-def test_complex():
-    result = DefaultEvaluator().evaluate(tree('"foo" && 6 >= 6 && 0 + 1 && true'))
+def test_complex(evaluator):
+    result = evaluator.evaluate(tree('"foo" && 6 >= 6 && 0 + 1 && true'))
     assert result
 
 
-def test_identifier_chain():
+def test_identifier_chain(evaluator):
     context = Context({'foo': {'baz': {'bar': 'tek'}}})
-    result = DefaultEvaluator().evaluate(tree('foo.baz.bar'), context)
+    result = evaluator.evaluate(tree('foo.baz.bar'), context)
     assert result == 'tek'
 
 
-def test_transforms():
+def test_transforms(evaluator_class):
     config = JEXLConfig(
         {'half': lambda x: x / 2},
         default_binary_operators,
         default_unary_operators
     )
-    evaluator = Evaluator(config)
+    evaluator = evaluator_class(config)
     result = evaluator.evaluate(tree('foo|half + 3'), {'foo': 10})
     assert result == 8
 
 
-def test_filter_arrays():
+def test_filter_arrays(evaluator):
     context = Context({
         'foo': {
             'bar': [
@@ -81,11 +97,11 @@ def test_filter_arrays():
         }
     })
 
-    result = DefaultEvaluator().evaluate(tree('foo.bar[.tek == "baz"]'), context)
+    result = evaluator.evaluate(tree('foo.bar[.tek == "baz"]'), context)
     assert result == [{'tek': 'baz'}]
 
 
-def test_array_index():
+def test_array_index(evaluator):
     context = Context({
         'foo': {
             'bar': [
@@ -96,37 +112,37 @@ def test_array_index():
         }
     })
 
-    result = DefaultEvaluator().evaluate(tree('foo.bar[1].tek'), context)
+    result = evaluator.evaluate(tree('foo.bar[1].tek'), context)
     assert result == 'baz'
 
 
-def test_filter_object_properties():
+def test_filter_object_properties(evaluator):
     context = Context({'foo': {'baz': {'bar': 'tek'}}})
-    result = DefaultEvaluator().evaluate(tree('foo["ba" + "z"].bar'), context)
+    result = evaluator.evaluate(tree('foo["ba" + "z"].bar'), context)
     assert result == 'tek'
 
 
-def test_missing_transform_exception():
+def test_missing_transform_exception(evaluator):
     with pytest.raises(MissingTransformError):
-        DefaultEvaluator().evaluate(tree('"hello"|world'))
+        evaluator.evaluate(tree('"hello"|world'))
 
 
-def test_divfloor():
-    result = DefaultEvaluator().evaluate(tree('7 // 2'))
+def test_divfloor(evaluator):
+    result = evaluator.evaluate(tree('7 // 2'))
     assert result == 3
 
 
-def test_object_literal():
-    result = DefaultEvaluator().evaluate(tree('{foo: {bar: "tek"}}'))
+def test_object_literal(evaluator):
+    result = evaluator.evaluate(tree('{foo: {bar: "tek"}}'))
     assert result == {'foo': {'bar': 'tek'}}
 
 
-def test_empty_object_literal():
-    result = DefaultEvaluator().evaluate(tree('{}'))
+def test_empty_object_literal(evaluator):
+    result = evaluator.evaluate(tree('{}'))
     assert result == {}
 
 
-def test_transforms_multiple_arguments():
+def test_transforms_multiple_arguments(evaluator_class):
     config = JEXLConfig(
         binary_operators=default_binary_operators,
         unary_operators=default_unary_operators,
@@ -134,47 +150,58 @@ def test_transforms_multiple_arguments():
             'concat': lambda val, a1, a2, a3: val + ': ' + a1 + a2 + a3,
         }
     )
-    evaluator = Evaluator(config)
+    evaluator = evaluator_class(config)
     result = evaluator.evaluate(tree('"foo"|concat("baz", "bar", "tek")'))
     assert result == 'foo: bazbartek'
 
 
-def test_object_literal_properties():
-    result = DefaultEvaluator().evaluate(tree('{foo: "bar"}.foo'))
+def test_transform_arguments_from_context(evaluator_class):
+    config = JEXLConfig(
+        binary_operators=default_binary_operators,
+        unary_operators=default_unary_operators,
+        transforms={'add': lambda val, other: val + other}
+    )
+    evaluator = evaluator_class(config)
+    result = evaluator.evaluate(tree('foo|add(bar.baz)'), Context({'foo': 1, 'bar': {'baz': 2}}))
+    assert result == 3
+
+
+def test_object_literal_properties(evaluator):
+    result = evaluator.evaluate(tree('{foo: "bar"}.foo'))
     assert result == 'bar'
 
 
-def test_array_literal():
-    result = DefaultEvaluator().evaluate(tree('["foo", 1+2]'))
+def test_array_literal(evaluator):
+    result = evaluator.evaluate(tree('["foo", 1+2]'))
     assert result == ['foo', 3]
 
 
-def test_in_operator_string():
-    result = DefaultEvaluator().evaluate(tree('"bar" in "foobartek"'))
+def test_in_operator_string(evaluator):
+    result = evaluator.evaluate(tree('"bar" in "foobartek"'))
     assert result is True
 
-    result = DefaultEvaluator().evaluate(tree('"baz" in "foobartek"'))
+    result = evaluator.evaluate(tree('"baz" in "foobartek"'))
     assert result is False
 
 
-def test_in_operator_array():
-    result = DefaultEvaluator().evaluate(tree('"bar" in ["foo","bar","tek"]'))
+def test_in_operator_array(evaluator):
+    result = evaluator.evaluate(tree('"bar" in ["foo","bar","tek"]'))
     assert result is True
 
-    result = DefaultEvaluator().evaluate(tree('"baz" in ["foo","bar","tek"]'))
+    result = evaluator.evaluate(tree('"baz" in ["foo","bar","tek"]'))
     assert result is False
 
 
-def test_conditional_expression():
-    result = DefaultEvaluator().evaluate(tree('"foo" ? 1 : 2'))
+def test_conditional_expression(evaluator):
+    result = evaluator.evaluate(tree('"foo" ? 1 : 2'))
     assert result == 1
 
-    result = DefaultEvaluator().evaluate(tree('"" ? 1 : 2'))
+    result = evaluator.evaluate(tree('"" ? 1 : 2'))
     assert result == 2
 
 
-def test_arbitrary_whitespace():
-    result = DefaultEvaluator().evaluate(tree('(\t2\n+\n3) *\n4\n\r\n'))
+def test_arbitrary_whitespace(evaluator):
+    result = evaluator.evaluate(tree('(\t2\n+\n3) *\n4\n\r\n'))
     assert result == 20
 
 
@@ -184,9 +211,160 @@ def test_arbitrary_whitespace():
     ('false || 1/0', None, True),
     ('false && 1/0', False, False),
 ])
-def test_logic_shortcuts(expression, expect_result, expect_fail):
+def test_logic_shortcuts(expression, expect_result, expect_fail, evaluator):
     if expect_fail:
         with pytest.raises(Exception):
-            DefaultEvaluator().evaluate(tree(expression))
+            evaluator.evaluate(tree(expression))
     else:
-        assert expect_result == DefaultEvaluator().evaluate(tree(expression))
+        assert expect_result == evaluator.evaluate(tree(expression))
+
+
+def test_lazy_values(evaluator):
+    calls = []
+
+    def provider(name, value):
+        def provide():
+            calls.append(name)
+            return value
+        return provide
+
+    context = Context({
+        'user': Lazy(provider('user', LazyMapping({
+            'profile': Lazy(provider('profile', {'country': 'CA'})),
+            'studies': [LazyMapping({'id': Lazy(provider('id', 1))})],
+        }))),
+        'unused': Lazy(provider('unused', None)),
+    })
+    expression = tree(
+        'user.profile.country == "CA" && user.profile.country != "US" && user.studies[.id == 1]'
+    )
+
+    result = evaluator.evaluate(expression, context)
+    assert len(result) == 1
+    assert calls == ['user', 'profile', 'id']
+
+    # Values are resolved once per context.
+    evaluator.evaluate(expression, context)
+    assert calls == ['user', 'profile', 'id']
+    evaluator.evaluate(expression, Context(context.data))
+    assert calls == ['user', 'profile', 'id', 'user']
+
+
+def test_context_resolver(evaluator):
+    calls = []
+
+    def resolver(key):
+        calls.append(key)
+        if key == 'missing':
+            raise KeyError(key)
+        return {'country': key.upper()}
+
+    context = Context({'channel': 'release'}, resolver=resolver)
+    expression = tree('channel == "release" && geo.country + geo.country + (missing || "")')
+    assert evaluator.evaluate(expression, context) == 'GEOGEO'
+    assert calls == ['geo', 'missing']
+
+
+def test_relative_filter_without_context(evaluator):
+    result = evaluator.evaluate(tree('[{a: 1}, {a: 2}][.a == 1]'))
+    assert result == [{'a': 1}]
+
+
+def test_relative_filter_plain_mapping(evaluator):
+    context = {'items': [{'a': 1}, {'a': 2}, {'a': 3}]}
+    assert evaluator.evaluate(tree('items[.a > 1][.a < 3]'), context) == [{'a': 2}]
+
+
+def test_relative_filter_reuses_scope(evaluator, monkeypatch):
+    created = []
+    init = Context.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created.append(self)
+        init(self, *args, **kwargs)
+
+    context = Context({'items': [{'a': value} for value in range(10)]})
+    monkeypatch.setattr(Context, '__init__', counting_init)
+    result = evaluator.evaluate(tree('items[.a > 1][.a < 4]'), context)
+    assert result == [{'a': 2}, {'a': 3}]
+
+    # At most one scope per filter, rather than one per element.
+    assert len(created) <= 2
+
+
+def test_budget_max_nodes():
+    expression = tree('1 + 2 + 3')
+    assert Evaluator(default_config, EvaluationBudget(max_nodes=5)).evaluate(expression) == 6
+    with pytest.raises(BudgetExceededError):
+        Evaluator(default_config, EvaluationBudget(max_nodes=4)).evaluate(expression)
+
+
+def test_budget_is_per_evaluation():
+    evaluator = Evaluator(default_config, EvaluationBudget(max_nodes=5))
+    expression = tree('1 + 2 + 3')
+    for _ in range(3):
+        assert evaluator.evaluate(expression) == 6
+
+    # A failed evaluation doesn't use up the budget of the next one.
+    with pytest.raises(BudgetExceededError):
+        evaluator.evaluate(tree('1 + 2 + 3 + 4'))
+    assert evaluator.evaluate(expression) == 6
+
+
+def test_budget_max_filter_iterations():
+    context = Context({'foo': [{'a': i} for i in range(10)]})
+    expression = tree('foo[.a > 5][.a > 7]')
+    budget = EvaluationBudget(max_filter_iterations=14)
+    assert len(Evaluator(default_config, budget).evaluate(expression, context)) == 2
+
+    budget = EvaluationBudget(max_filter_iterations=13)
+    with pytest.raises(BudgetExceededError):
+        Evaluator(default_config, budget).evaluate(expression, context)
+
+
+def test_budget_max_filter_iterations_unsized():
+    config = JEXLConfig(
+        transforms={'generate': lambda count: ({'v': i} for i in range(int(count)))},
+        unary_operators=default_unary_operators,
+        binary_operators=default_binary_operators,
+    )
+    expression = tree('5|generate[.v > 2]')
+    budget = EvaluationBudget(max_filter_iterations=5)
+    assert Evaluator(config, budget).evaluate(expression) == [{'v': 3}, {'v': 4}]
+    with pytest.raises(BudgetExceededError):
+        Evaluator(config, budget).evaluate(tree('6|generate[.v > 2]'))
+
+
+def test_budget_max_collection_size():
+    budget = EvaluationBudget(max_collection_size=3)
+    evaluator = Evaluator(default_config, budget)
+    assert evaluator.evaluate(tree('[1, 2, 3]')) == [1, 2, 3]
+    assert evaluator.evaluate(tree('foo.bar'), Context({'foo': {'bar': 'abc'}})) == 'abc'
+
+    with pytest.raises(BudgetExceededError):
+        evaluator.evaluate(tree('[1, 2, 3, 4]'))
+    with pytest.raises(BudgetExceededError):
+        evaluator.evaluate(tree('"ab" + "cd"'))
+    with pytest.raises(BudgetExceededError):
+        evaluator.evaluate(tree('foo'), Context({'foo': list(range(10))}))
+
+
+def test_budget_max_depth():
+    expression = tree('[[[1]]]')
+    assert Evaluator(default_config, EvaluationBudget(max_depth=4)).evaluate(expression) == [[[1]]]
+    with pytest.raises(BudgetExceededError):
+        Evaluator(default_config, EvaluationBudget(max_depth=3)).evaluate(expression)
+
+
+def test_budget_timeout():
+    config = JEXLConfig(
+        {'sleep': lambda value: time.sleep(value) or value}, default_unary_operators,
+        default_binary_operators, set()
+    )
+    evaluator = Evaluator(config, EvaluationBudget(timeout=0.05))
+    expression = tree(' + '.join(['0|sleep'] * 100))
+    assert evaluator.evaluate(expression) == 0
+
+    expression = tree(' + '.join(['0.01|sleep'] * 100))
+    with pytest.raises(BudgetExceededError):
+        evaluator.evaluate(expression)
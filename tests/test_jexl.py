@@ -1,8 +1,14 @@
 import pytest
 import hypothesis
 
-from pyjexl.analysis import JEXLAnalyzer
-from pyjexl.exceptions import MissingTransformError, ParseError
+from pyjexl.analysis import JEXLAnalyzer, ValidatingAnalyzer
+from pyjexl.evaluator import Context, EvaluationBudget, Lazy
+from pyjexl.exceptions import (
+    BudgetExceededError,
+    ExpressionTooComplexError,
+    MissingTransformError,
+    ParseError,
+)
 from pyjexl.jexl import JEXL
 
 
@@ -127,6 +133,37 @@ def test_validate():
     assert errors == ['Could not parse expression: "\n"']
 
 
+class StrictValidatingAnalyzer(ValidatingAnalyzer):
+    """Test analyzer that also rejects the + operator, recursing by hand."""
+    visited = 0
+
+    def visit_BinaryExpression(self, expression):
+        StrictValidatingAnalyzer.visited += 1
+        if expression.operator.symbol == '+':
+            yield 'No adding.'
+        for message in self.generic_visit(expression):
+            yield message
+
+
+def test_validate_with_custom_analyzer():
+    jexl = JEXL()
+    StrictValidatingAnalyzer.visited = 0
+    assert list(jexl.analyze('1 + foo|bar', StrictValidatingAnalyzer)) == [
+        'No adding.', 'The `bar` transform is undefined.'
+    ]
+    assert StrictValidatingAnalyzer.visited == 1
+
+    StrictValidatingAnalyzer.visited = 0
+    assert list(jexl.analyze('(1 * 2) + 3', StrictValidatingAnalyzer)) == ['No adding.']
+    assert StrictValidatingAnalyzer.visited == 2
+
+
+def test_validate_long_chains():
+    jexl = JEXL(parser='pratt')
+    assert list(jexl.validate(' + '.join(['a'] * 5000))) == []
+    assert len(list(jexl.validate(' + '.join(['a|bar'] * 5000)))) == 5000
+
+
 JEXL_ALPHABET = hypothesis.strategies.characters(whitelist_categories=(
     # Letters
     'Lu', 'Ll',
@@ -184,3 +221,254 @@ class SumIntAnalyzer(JEXLAnalyzer):
 def test_analysis():
     jexl = JEXL()
     assert jexl.analyze('1+(2*3)|concat(4)', SumIntAnalyzer) == 10
+
+
+def test_compile():
+    jexl = JEXL()
+    compiled = jexl.compile('foo + 1')
+    assert compiled.evaluate({'foo': 1}) == 2
+    assert compiled.evaluate({'foo': 5}) == 6
+
+
+def test_compile_uses_default_context():
+    jexl = JEXL({'foo': 3})
+    assert jexl.compile('foo * 2').evaluate() == 6
+
+
+def test_parse_cache():
+    jexl = JEXL()
+    assert jexl.parse('1 + foo') is jexl.parse('1 + foo')
+    assert jexl.compile('1 + foo') is jexl.compile('1 + foo')
+
+
+def test_parse_cache_size():
+    jexl = JEXL(cache_size=2)
+    first = jexl.parse('1')
+    jexl.parse('2')
+    assert jexl.parse('1') is first
+
+    # '2' is now the least recently used entry.
+    jexl.parse('3')
+    assert jexl.parse('1') is first
+    assert len(jexl._cache) == 2
+    assert '2' not in jexl._cache
+
+
+def test_parse_cache_disabled():
+    jexl = JEXL(cache_size=0)
+    assert jexl.parse('1 + foo') is not jexl.parse('1 + foo')
+    assert jexl.parse('1 + foo') == jexl.parse('1 + foo')
+
+
+def test_parse_cache_invalidation():
+    jexl = JEXL()
+    jexl.add_binary_operator('=', 20, lambda x, y: x + y)
+    assert jexl.evaluate('2 = 4') == 6
+
+    jexl.remove_binary_operator('=')
+    with pytest.raises(ParseError):
+        jexl.evaluate('2 = 4')
+
+    jexl.add_binary_operator('=', 20, lambda x, y: x * y)
+    assert jexl.evaluate('2 = 4') == 8
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_backends(backend):
+    jexl = JEXL(backend=backend)
+    jexl.add_transform('double', lambda x: x * 2)
+    compiled = jexl.compile('foo[.bar > 1]|double ? {a: [1, foo[0].bar]} : "none"')
+    assert compiled.evaluate({'foo': [{'bar': 1}, {'bar': 2}]}) == {'a': [1, 1]}
+    assert compiled.evaluate({'foo': [{'bar': 1}]}) == 'none'
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+@pytest.mark.parametrize('optimize', [False, True])
+@pytest.mark.parametrize('expression, expected', [
+    ('-2 ^ 2', 4),
+    ('-2 ^ x', 4),
+    ('-2.5 ^ x', 6.25),
+    ('x ^ -1', 0.5),
+    ('[-2, 3][0] ^ 2', 4),
+])
+def test_negative_literals(backend, optimize, expression, expected):
+    jexl = JEXL(backend=backend, optimize=optimize)
+    assert jexl.evaluate(expression, {'x': 2}) == expected
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_compiled_expression_sees_transform_changes(backend):
+    jexl = JEXL(backend=backend)
+    compiled = jexl.compile('4|foo')
+    with pytest.raises(MissingTransformError):
+        compiled.evaluate()
+
+    jexl.add_transform('foo', lambda x: x + 1)
+    assert compiled.evaluate() == 5
+
+    jexl.add_transform('foo', lambda x: x + 2)
+    assert compiled.evaluate() == 6
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        JEXL(backend='foo')
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_evaluate_many(backend):
+    jexl = JEXL(backend=backend)
+    contexts = ({'foo': i} for i in range(10))
+    results = jexl.evaluate_many('foo * 2', contexts, chunksize=3)
+    assert list(results) == [i * 2 for i in range(10)]
+
+
+def test_evaluate_many_is_lazy():
+    consumed = []
+
+    def contexts():
+        for i in range(100):
+            consumed.append(i)
+            yield {'foo': i}
+
+    results = JEXL().evaluate_many('foo', contexts(), chunksize=10)
+    assert next(results) == 0
+    assert len(consumed) == 10
+
+
+def test_evaluate_many_accepts_contexts():
+    results = JEXL().evaluate_many('foo', [Context({'foo': 1}), {'foo': 2}, {}])
+    assert list(results) == [1, 2, None]
+
+
+def test_evaluate_many_raises_errors():
+    results = JEXL().evaluate_many('foo.bar', [{'foo': {'bar': 1}}, {}])
+    assert next(results) == 1
+    with pytest.raises(AttributeError):
+        next(results)
+
+
+def test_evaluate_many_reports_errors():
+    errors = []
+    contexts = [{'foo': 1}, {'foo': 'a'}, {'foo': 3}, {}]
+    results = JEXL().evaluate_many(
+        'foo + 1', contexts,
+        on_error=lambda index, context, error: errors.append((index, context, type(error)))
+    )
+
+    assert list(results) == [2, 4]
+    assert errors == [(1, {'foo': 'a'}, TypeError), (3, {}, TypeError)]
+
+
+def test_evaluate_many_parse_error():
+    with pytest.raises(ParseError):
+        JEXL().evaluate_many('1 +', [{}])
+
+
+def test_evaluate_many_resolves_lazy_values_per_context():
+    jexl = JEXL()
+    contexts = [{'value': Lazy(lambda: 1)}, {'value': Lazy(lambda: 2)}]
+    assert list(jexl.evaluate_many('value', contexts)) == [1, 2]
+
+
+def test_evaluate_reuses_context_wrappers():
+    jexl = JEXL()
+    jexl.add_transform('nested', lambda value: jexl.evaluate('value + 1', {'value': value}))
+    assert jexl.evaluate('value|nested', {'value': Lazy(lambda: 1)}) == 2
+    assert len(jexl._contexts) == 2
+
+    wrappers = set(id(wrapper) for wrapper in jexl._contexts)
+    assert jexl.evaluate('value|nested', {'value': 2}) == 3
+    assert set(id(wrapper) for wrapper in jexl._contexts) == wrappers
+
+    # Wrappers don't keep the data they were given.
+    assert all(len(wrapper) == 0 for wrapper in jexl._contexts)
+
+
+def test_evaluate_uses_contexts_as_given():
+    jexl = JEXL()
+    context = Context({'value': Lazy(lambda: [1])})
+    assert jexl.evaluate('value', context) is jexl.evaluate('value', context)
+    assert jexl._contexts == []
+
+
+def test_grammars_are_shared():
+    first = JEXL()
+    second = JEXL()
+    assert first.grammar is second.grammar
+
+    second.add_binary_operator('<>', 20, lambda a, b: a != b)
+    assert second.grammar is not first.grammar
+    assert second.evaluate('1 <> 2') is True
+
+    second.remove_binary_operator('<>')
+    assert second.grammar is first.grammar
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_budget(backend):
+    jexl = JEXL(backend=backend, budget=EvaluationBudget(max_filter_iterations=100))
+    context = {'foo': [{'a': i} for i in range(60)]}
+    assert jexl.evaluate('foo[.a > 50][0].a', context) == 51
+
+    compiled = jexl.compile('foo[.a > 0][.a > 50][0].a')
+    with pytest.raises(BudgetExceededError):
+        compiled.evaluate(context)
+    contexts = [{'foo': [{'a': 1}, {'a': 51}]}] * 3
+    assert list(compiled.evaluate_many(contexts)) == [51] * 3
+
+
+@pytest.mark.parametrize('parser', JEXL.parsers)
+def test_complexity_limits(parser):
+    jexl = JEXL(parser=parser, max_length=20, max_depth=2)
+    assert jexl.evaluate('[[1], "[[[(("]') == [[1], '[[[((']
+    with pytest.raises(ExpressionTooComplexError):
+        jexl.evaluate('[[[1]]]')
+    with pytest.raises(ExpressionTooComplexError):
+        jexl.evaluate('1 + 2 + 3 + 4 + 5 + 6')
+
+
+@pytest.mark.parametrize('parser', JEXL.parsers)
+def test_too_deeply_nested(parser):
+    jexl = JEXL(parser=parser)
+    with pytest.raises(ExpressionTooComplexError):
+        jexl.parse('(' * 5000 + '1' + ')' * 5000)
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+@pytest.mark.parametrize('optimize', [False, True])
+def test_long_chains(backend, optimize):
+    jexl = JEXL(parser='pratt', backend=backend, optimize=optimize)
+    nested = {}
+    nested['b'] = nested
+    context = {'a': [{'x': 1}, {'x': 2}], 'b': nested}
+    assert jexl.evaluate(' + '.join(['1'] * 2000)) == 2000
+    assert jexl.evaluate(' && '.join(['true'] * 2000) + ' && a[1].x', context) == 2
+    assert jexl.evaluate('a' + '[.x > 0]' * 2000 + '[1].x', context) == 2
+    assert jexl.evaluate('b' + '.b' * 2000, context) is nested
+    assert jexl.evaluate('a[' + ' + '.join(['.x'] * 2000) + ' > 2000][0].x', context) == 2
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self._secret = 'hidden'
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_attribute_access(backend):
+    jexl = JEXL(backend=backend, attribute_access=True)
+    context = {
+        'points': [Point(1, 2), Point(3, {'z': 4})],
+        'shape': {'origin': Point(0, 0)},
+    }
+    assert jexl.evaluate('shape.origin.x', context) == 0
+    assert jexl.evaluate('points[.x > 1][0].y.z', context) == 4
+    assert jexl.evaluate('points[0].missing', context) is None
+    assert jexl.evaluate('points[0]._secret', context) is None
+    assert jexl.evaluate('points[0].x.real', context) is None
+    assert jexl.evaluate('shape.missing.x', context) is None
+
+    with pytest.raises(AttributeError):
+        JEXL(backend=backend).evaluate('shape.origin.x', context)
@@ -0,0 +1,136 @@
+import pickle
+import threading
+
+import pytest
+
+from pyjexl.jexl import JEXL
+from pyjexl.memoize import CacheInfo, freeze, MemoizedTransform
+from pyjexl.rules import RuleSet
+
+
+def counting_jexl(backend='interpreter', **kwargs):
+    jexl = JEXL(backend=backend)
+    calls = []
+
+    @jexl.transform(pure=True, **kwargs)
+    def count(value, *args):
+        calls.append(value)
+        return value
+
+    return jexl, calls
+
+
+@pytest.fixture(params=JEXL.backends)
+def backend(request):
+    return request.param
+
+
+def test_freeze():
+    assert freeze((1, 'a')) == freeze((1, 'a'))
+    assert freeze((1,)) != freeze((True,))
+    assert freeze([1, 2]) != freeze((1, 2))
+    assert freeze({'a': [1], 'b': {'c': 2}}) == freeze({'b': {'c': 2}, 'a': [1]})
+    with pytest.raises(TypeError):
+        freeze([set([1])])
+
+
+def test_per_evaluation(backend):
+    jexl, calls = counting_jexl(backend, cache='evaluation')
+    expression = 'a|count + a|count + b|count'
+    assert jexl.evaluate(expression, {'a': 1, 'b': 2}) == 4
+    assert calls == [1, 2]
+    assert jexl.evaluate(expression, {'a': 1, 'b': 2}) == 4
+    assert calls == [1, 2, 1, 2]
+    assert jexl.transform_cache_info() == {'count': CacheInfo(2, 4, 0, None)}
+
+
+def test_arguments_are_part_of_the_key(backend):
+    jexl, calls = counting_jexl(backend, cache='evaluation')
+    assert jexl.evaluate('[a|count(1), a|count(2), a|count(1), a|count([1])]', {'a': 1})
+    assert calls == [1, 1, 1]
+
+
+def test_per_batch():
+    jexl, calls = counting_jexl(cache='batch')
+    contexts = [{'a': index % 2} for index in range(10)]
+    assert list(jexl.evaluate_many('a|count', contexts, chunksize=5)) == [0, 1] * 5
+    assert calls == [0, 1, 1, 0]
+
+    # Outside of a batch, calls aren't memoized.
+    jexl.evaluate('a|count + a|count', {'a': 1})
+    assert calls == [0, 1, 1, 0, 1, 1]
+    assert jexl.transform_cache_info()['count'] == CacheInfo(6, 4, 2, None)
+
+
+def test_global():
+    jexl, calls = counting_jexl(cache='global', maxsize=2)
+    for value in [1, 2, 1, 3, 1, 2]:
+        assert jexl.evaluate('a|count', {'a': value}) == value
+    assert calls == [1, 2, 3, 2]
+    assert jexl.transform_cache_info()['count'] == CacheInfo(2, 4, 0, 2)
+
+    jexl.config.transforms['count'].cache_clear()
+    assert jexl.transform_cache_info()['count'] == CacheInfo(0, 0, 0, 0)
+
+
+def test_global_statistics_with_threads():
+    jexl, calls = counting_jexl(cache='global', maxsize=4)
+
+    def evaluate():
+        for value in range(2000):
+            jexl.evaluate('a|count', {'a': value % 8})
+
+    threads = [threading.Thread(target=evaluate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = jexl.transform_cache_info()['count']
+    assert info.hits + info.misses == 8000
+    assert info.misses == len(calls)
+
+
+def test_shared_across_rules():
+    jexl, calls = counting_jexl(cache='evaluation')
+    rules = RuleSet(jexl, {'a': 'foo|count(1) == 1', 'b': 'foo|count(2) + foo|count(1)'})
+    assert rules.evaluate({'foo': 1}) == {'a': True, 'b': 2}
+    assert calls == [1, 1]
+
+
+def test_unhashable_arguments():
+    jexl, calls = counting_jexl(cache='global')
+    values = set([1])
+    assert jexl.evaluate('a|count + a|count', {'a': 0, 'b': values}) == 0
+    assert jexl.evaluate('b|count', {'b': values}) is values
+    assert jexl.transform_cache_info()['count'] == CacheInfo(1, 1, 1, 1)
+
+
+def test_errors_are_not_memoized():
+    calls = []
+
+    def fail(value):
+        calls.append(value)
+        raise ValueError(value)
+
+    jexl = JEXL()
+    jexl.add_transform('fail', fail, pure=True, cache='global')
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            jexl.evaluate('1|fail')
+    assert calls == [1, 1]
+
+
+def test_invalid_policies():
+    jexl = JEXL()
+    with pytest.raises(ValueError):
+        jexl.add_transform('a', len, cache='evaluation')
+    with pytest.raises(ValueError):
+        jexl.add_transform('a', len, pure=True, cache='forever')
+
+
+def test_pickle():
+    transform = MemoizedTransform(abs, 'global', maxsize=10, ttl=5)
+    transform(-1)
+    copy = pickle.loads(pickle.dumps(transform))
+    assert (copy.func, copy.policy, copy.maxsize, copy.ttl) == (abs, 'global', 10, 5)
+    assert copy.cache_info() == CacheInfo(0, 0, 0, 0)
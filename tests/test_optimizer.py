@@ -0,0 +1,182 @@
+import pytest
+
+from pyjexl.jexl import JEXL, JEXLConfig
+from pyjexl.operators import default_binary_operators, default_unary_operators, Operator
+from pyjexl.optimizer import ConstantFolder, flatten_paths
+from pyjexl.parser import (
+    ArrayLiteral,
+    BinaryExpression,
+    ConditionalExpression,
+    Identifier,
+    Literal,
+    ObjectLiteral,
+    Path,
+    Transform,
+)
+
+from . import default_config, DefaultParser
+
+
+_ops = {}
+_ops.update(default_config.binary_operators)
+_ops.update(default_config.unary_operators)
+
+
+def fold(expression, config=default_config):
+    return ConstantFolder(config).visit(DefaultParser().parse(expression))
+
+
+@pytest.mark.parametrize('expression,value', [
+    ('60 * 60 * 24', 86400),
+    ('"a" + "b"', 'ab'),
+    ('!true', False),
+    ('1 < 2 ? "yes" : "no"', 'yes'),
+    ('{a: 1 + 1}.a', 2),
+    ('[1, 2, 3][1]', 2),
+    ('[1, 2] + [3]', [1, 2, 3]),
+    ('2 in [1, 2, 3]', True),
+])
+def test_folds_literal_subtrees(expression, value):
+    result = fold(expression)
+    assert result == Literal(value) or result == ArrayLiteral([Literal(v) for v in value])
+
+
+def test_folds_inside_other_expressions():
+    assert fold('foo + 60 * 60') == BinaryExpression(
+        operator=_ops['+'],
+        left=Identifier('foo'),
+        right=Literal(3600)
+    )
+
+
+def test_boolean_identities():
+    assert fold('true && foo') == Identifier('foo')
+    assert fold('false && foo') == Literal(False)
+    assert fold('0 && foo') == Literal(0)
+    assert fold('true || foo') == Literal(True)
+    assert fold('"" || foo') == Identifier('foo')
+    assert fold('(1 == 1) && foo') == Identifier('foo')
+
+    # The right side decides the value, so it can't be dropped.
+    assert fold('foo && true') == BinaryExpression(
+        operator=_ops['&&'],
+        left=Identifier('foo'),
+        right=Literal(True)
+    )
+
+
+def test_constant_conditionals():
+    assert fold('1 > 2 ? foo : bar') == Identifier('bar')
+    assert fold('foo ? 1 + 1 : 2 + 2') == ConditionalExpression(
+        test=Identifier('foo'),
+        consequent=Literal(2),
+        alternate=Literal(4)
+    )
+
+
+def test_membership_keeps_literal_collection():
+    assert fold('foo in [1, 2, 3]') == BinaryExpression(
+        operator=_ops['in'],
+        left=Identifier('foo'),
+        right=Literal([1, 2, 3])
+    )
+
+
+def test_returned_collections_are_not_shared():
+    assert fold('[1, [2]]') == ArrayLiteral([Literal(1), ArrayLiteral([Literal(2)])])
+    assert fold('{a: [1]}') == ObjectLiteral({'a': ArrayLiteral([Literal(1)])})
+    assert fold('foo ? [1] : 2') == ConditionalExpression(
+        test=Identifier('foo'),
+        consequent=ArrayLiteral([Literal(1)]),
+        alternate=Literal(2)
+    )
+
+    jexl = JEXL(optimize=True)
+    result = jexl.evaluate('[1, 2]')
+    result.append(3)
+    assert jexl.evaluate('[1, 2]') == [1, 2]
+
+
+def test_errors_are_not_folded():
+    assert fold('1 / 0') == BinaryExpression(
+        operator=_ops['/'],
+        left=Literal(1),
+        right=Literal(0)
+    )
+
+
+def test_impure_operators_are_not_folded():
+    impure = Operator('@', 50, lambda a, b: a + b)
+    pure = Operator('#', 50, lambda a, b: a + b, pure=True)
+    config = JEXLConfig(
+        transforms={},
+        unary_operators=default_unary_operators,
+        binary_operators=dict(default_binary_operators, **{'@': impure, '#': pure})
+    )
+    folder = ConstantFolder(config)
+
+    expression = BinaryExpression(operator=impure, left=Literal(1), right=Literal(2))
+    assert folder.visit(expression) == expression
+
+    expression = BinaryExpression(operator=pure, left=Literal(1), right=Literal(2))
+    assert folder.visit(expression) == Literal(3)
+
+
+def test_transform_purity():
+    config = JEXLConfig(
+        transforms={'double': lambda x: x * 2, 'log': lambda x: x},
+        unary_operators=default_unary_operators,
+        binary_operators=default_binary_operators,
+        pure_transforms={'double'}
+    )
+    assert fold('2|double + 1', config) == Literal(5)
+    assert fold('2|log', config) == Transform(name='log', args=[], subject=Literal(2))
+
+
+def test_does_not_modify_input():
+    tree = DefaultParser().parse('foo + (1 + 2)')
+    ConstantFolder(default_config).visit(tree)
+    assert tree == DefaultParser().parse('foo + (1 + 2)')
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_jexl_optimize(backend):
+    calls = []
+    jexl = JEXL(optimize=True, backend=backend)
+    jexl.add_transform('double', lambda x: calls.append(x) or x * 2, pure=True)
+    jexl.add_transform('log', lambda x: calls.append(x) or x)
+
+    compiled = jexl.compile('foo + 3|double + 4|log')
+    assert compiled.evaluate({'foo': 1}) == 11
+    assert compiled.evaluate({'foo': 2}) == 12
+    assert calls == [3, 4, 4]
+
+
+def test_flatten_paths():
+    tree = DefaultParser().parse('a.b.c + foo[.x.y > 1][0].bar|baz(q.r)')
+    flat = flatten_paths(tree)
+    assert flat.left == Path(('a', 'b', 'c'), None, False, False)
+
+    transform = flat.right
+    assert transform.args == [Path(('q', 'r'), None, False, False)]
+    identifier = transform.subject
+    assert identifier.names == ('bar',)
+    assert identifier.subject.subject.subject == Path(('foo',), None, False, False)
+    assert identifier.subject.subject.expression.left == Path(('x', 'y'), None, True, False)
+
+    # The input is left alone, and subtrees without identifiers are shared.
+    assert tree == DefaultParser().parse('a.b.c + foo[.x.y > 1][0].bar|baz(q.r)')
+    assert identifier.subject.expression is tree.right.subject.subject.expression
+    assert flatten_paths(tree, attributes=True).left.attributes is True
+
+
+def test_flattened_paths_info():
+    flat = flatten_paths(DefaultParser().parse('a.b.c + foo[.x.y > 1]'))
+    assert flat.info.identifiers == frozenset(['a', 'foo'])
+    assert not flat.info.relative
+    assert flat.right.expression.info.relative
+
+
+def test_flatten_long_chains():
+    flat = flatten_paths(DefaultParser().parse('a' + '.a' * 2000 + ' + 1' * 2000))
+    assert len(flat.root().info.identifiers) == 1
@@ -0,0 +1,93 @@
+import pytest
+
+from pyjexl.evaluator import Context
+from pyjexl.jexl import JEXL
+
+
+def double(value):
+    return value * 2
+
+
+def generate(value):
+    return (item for item in range(value))
+
+
+@pytest.fixture(params=JEXL.backends)
+def jexl(request):
+    jexl = JEXL(backend=request.param)
+    jexl.add_transform('double', double)
+    return jexl
+
+
+def contexts(count):
+    return ({'a': index, 'b': {'c': index % 3}} for index in range(count))
+
+
+def test_imap(jexl):
+    with jexl.parallel('a|double + b.c', processes=2, chunksize=7) as executor:
+        assert executor.processes == 2
+        assert list(executor.imap(contexts(100))) == [
+            index * 2 + index % 3 for index in range(100)
+        ]
+
+
+def test_imap_unordered(jexl):
+    with jexl.parallel('a|double', processes=2, chunksize=3, max_pending=2) as executor:
+        results = list(executor.imap_unordered(contexts(50)))
+    assert sorted(results) == [(index, index * 2) for index in range(50)]
+
+
+def test_multiple_expressions(jexl):
+    expressions = {'sum': 'a + b.c', 'big': 'a > 1'}
+    with jexl.parallel(expressions, processes=2) as executor:
+        results = list(executor.imap([{'a': 1, 'b': {'c': 1}}, Context({'a': 2, 'b': {'c': 0}})]))
+    assert results == [{'sum': 2, 'big': False}, {'sum': 2, 'big': True}]
+
+
+def test_errors(jexl):
+    records = [{'a': 1, 'b': {'c': 1}}, {'a': 1}, {'a': 2, 'b': {'c': 2}}]
+    with jexl.parallel('a + b.c', processes=2, chunksize=2) as executor:
+        with pytest.raises(AttributeError):
+            list(executor.imap(records))
+
+        errors = []
+        results = list(executor.imap(
+            records,
+            on_error=lambda index, context, error: errors.append((index, context))
+        ))
+        assert results == [2, 4]
+        assert errors == [(1, {'a': 1})]
+
+        errors = []
+        results = list(executor.imap_unordered(
+            records,
+            on_error=lambda index, context, error: errors.append((index, context))
+        ))
+        assert sorted(results) == [(0, 2), (2, 4)]
+        assert errors == [(1, {'a': 1})]
+
+
+def test_failing_chunks(jexl):
+    # Generators can't be sent back from the workers, so the chunk with
+    # the third context fails as a whole.
+    jexl.add_transform('generate', generate)
+    records = [{'a': 1}, {'a': 1}, {'a': 0}, {'a': 1}]
+    expression = 'a ? a : a|generate'
+    with jexl.parallel(expression, processes=2, chunksize=2) as executor:
+        with pytest.raises(Exception):
+            list(executor.imap(records))
+        with pytest.raises(Exception):
+            list(executor.imap_unordered(records))
+
+
+@pytest.mark.parametrize('policy', ['evaluation', 'batch', 'global'])
+def test_memoized_transforms(policy):
+    jexl = JEXL()
+    jexl.add_transform('double', double, pure=True, cache=policy)
+    with jexl.parallel('a|double + a|double', processes=2, chunksize=7) as executor:
+        assert list(executor.imap(contexts(20))) == [index * 4 for index in range(20)]
+
+
+def test_long_chains(jexl):
+    with jexl.parallel(' + '.join(['a'] * 5000), processes=2) as executor:
+        assert list(executor.imap(contexts(3))) == [0, 5000, 10000]
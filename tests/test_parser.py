@@ -1,3 +1,7 @@
+import pickle
+
+import pytest
+
 from pyjexl.parser import (
     ArrayLiteral,
     BinaryExpression,
@@ -7,10 +11,11 @@ from pyjexl.parser import (
     ObjectLiteral,
     Transform,
     UnaryExpression,
-    FilterExpression
+    FilterExpression,
+    NodeInfo,
 )
 
-from . import default_config, DefaultParser
+from . import default_config, DefaultParser, DefaultPrattParser
 
 
 _ops = {}
@@ -18,20 +23,25 @@ _ops.update(default_config.binary_operators)
 _ops.update(default_config.unary_operators)
 
 
-def test_literal():
-    assert DefaultParser().parse('1') == Literal(1.0)
+@pytest.fixture(params=[DefaultParser, DefaultPrattParser], ids=['parsimonious', 'pratt'])
+def parser(request):
+    return request.param()
+
 
+def test_literal(parser):
+    assert parser.parse('1') == Literal(1.0)
 
-def test_binary_expression():
-    assert DefaultParser().parse('1+2') == BinaryExpression(
+
+def test_binary_expression(parser):
+    assert parser.parse('1+2') == BinaryExpression(
         operator=_ops['+'],
         left=Literal(1),
         right=Literal(2)
     )
 
 
-def test_binary_expression_priority_right():
-    assert DefaultParser().parse('2+3*4') == BinaryExpression(
+def test_binary_expression_priority_right(parser):
+    assert parser.parse('2+3*4') == BinaryExpression(
         operator=_ops['+'],
         left=Literal(2),
         right=BinaryExpression(
@@ -42,8 +52,8 @@ def test_binary_expression_priority_right():
     )
 
 
-def test_binary_expression_priority_left():
-    assert DefaultParser().parse('2*3+4') == BinaryExpression(
+def test_binary_expression_priority_left(parser):
+    assert parser.parse('2*3+4') == BinaryExpression(
         operator=_ops['+'],
         left=BinaryExpression(
             operator=_ops['*'],
@@ -54,8 +64,8 @@ def test_binary_expression_priority_left():
     )
 
 
-def test_binary_expression_encapsulation():
-    assert DefaultParser().parse('2+3*4==5/6-7') == BinaryExpression(
+def test_binary_expression_encapsulation(parser):
+    assert parser.parse('2+3*4==5/6-7') == BinaryExpression(
         operator=_ops['=='],
         left=BinaryExpression(
             operator=_ops['+'],
@@ -78,8 +88,8 @@ def test_binary_expression_encapsulation():
     )
 
 
-def test_unary_operator():
-    assert DefaultParser().parse('1*!!true-2') == BinaryExpression(
+def test_unary_operator(parser):
+    assert parser.parse('1*!!true-2') == BinaryExpression(
         operator=_ops['-'],
         left=BinaryExpression(
             operator=_ops['*'],
@@ -96,8 +106,8 @@ def test_unary_operator():
     )
 
 
-def test_subexpression():
-    assert DefaultParser().parse('(2+3)*4') == BinaryExpression(
+def test_subexpression(parser):
+    assert parser.parse('(2+3)*4') == BinaryExpression(
         operator=_ops['*'],
         left=BinaryExpression(
             operator=_ops['+'],
@@ -108,8 +118,8 @@ def test_subexpression():
     )
 
 
-def test_nested_subexpression():
-    assert DefaultParser().parse('(4*(2+3))/5') == BinaryExpression(
+def test_nested_subexpression(parser):
+    assert parser.parse('(4*(2+3))/5') == BinaryExpression(
         operator=_ops['/'],
         left=BinaryExpression(
             operator=_ops['*'],
@@ -124,8 +134,8 @@ def test_nested_subexpression():
     )
 
 
-def test_object_literal():
-    assert DefaultParser().parse('{foo: "bar", tek: 1+2}') == ObjectLiteral({
+def test_object_literal(parser):
+    assert parser.parse('{foo: "bar", tek: 1+2}') == ObjectLiteral({
         'foo': Literal('bar'),
         'tek': BinaryExpression(
             operator=_ops['+'],
@@ -135,20 +145,20 @@ def test_object_literal():
     })
 
 
-def test_nested_object_literals():
-    assert DefaultParser().parse('{foo: {bar: "tek"}}') == ObjectLiteral({
+def test_nested_object_literals(parser):
+    assert parser.parse('{foo: {bar: "tek"}}') == ObjectLiteral({
         'foo': ObjectLiteral({
             'bar': Literal('tek')
         })
     })
 
 
-def test_empty_object_literals():
-    assert DefaultParser().parse('{}') == ObjectLiteral({})
+def test_empty_object_literals(parser):
+    assert parser.parse('{}') == ObjectLiteral({})
 
 
-def test_array_literals():
-    assert DefaultParser().parse('["foo", 1+2]') == ArrayLiteral([
+def test_array_literals(parser):
+    assert parser.parse('["foo", 1+2]') == ArrayLiteral([
         Literal('foo'),
         BinaryExpression(
             operator=_ops['+'],
@@ -158,8 +168,8 @@ def test_array_literals():
     ])
 
 
-def test_nexted_array_literals():
-    assert DefaultParser().parse('["foo", ["bar", "tek"]]') == ArrayLiteral([
+def test_nexted_array_literals(parser):
+    assert parser.parse('["foo", ["bar", "tek"]]') == ArrayLiteral([
         Literal('foo'),
         ArrayLiteral([
             Literal('bar'),
@@ -168,12 +178,12 @@ def test_nexted_array_literals():
     ])
 
 
-def test_empty_array_literals():
-    assert DefaultParser().parse('[]') == ArrayLiteral([])
+def test_empty_array_literals(parser):
+    assert parser.parse('[]') == ArrayLiteral([])
 
 
-def test_chained_identifiers():
-    assert DefaultParser().parse('foo.bar.baz + 1') == BinaryExpression(
+def test_chained_identifiers(parser):
+    assert parser.parse('foo.bar.baz + 1') == BinaryExpression(
         operator=_ops['+'],
         left=Identifier(
             'baz',
@@ -186,8 +196,8 @@ def test_chained_identifiers():
     )
 
 
-def test_transforms():
-    assert DefaultParser().parse('foo|tr1|tr2.baz|tr3({bar:"tek"})') == Transform(
+def test_transforms(parser):
+    assert parser.parse('foo|tr1|tr2.baz|tr3({bar:"tek"})') == Transform(
         name='tr3',
         args=[ObjectLiteral({
             'bar': Literal('tek')
@@ -207,8 +217,8 @@ def test_transforms():
     )
 
 
-def test_transforms_multiple_arguments():
-    assert DefaultParser().parse('foo|bar("tek", 5, true)') == Transform(
+def test_transforms_multiple_arguments(parser):
+    assert parser.parse('foo|bar("tek", 5, true)') == Transform(
         name='bar',
         args=[
             Literal('tek'),
@@ -219,8 +229,8 @@ def test_transforms_multiple_arguments():
     )
 
 
-def test_filters():
-    assert DefaultParser().parse('foo[1][.bar[0]=="tek"].baz') == Identifier(
+def test_filters(parser):
+    assert parser.parse('foo[1][.bar[0]=="tek"].baz') == Identifier(
         value='baz',
         subject=FilterExpression(
             relative=True,
@@ -242,8 +252,42 @@ def test_filters():
     )
 
 
-def test_attribute_all_operands():
-    assert DefaultParser().parse('"foo".length + {foo: "bar"}.foo') == BinaryExpression(
+def test_filters_relative_subject(parser):
+    """Relative identifiers are found anywhere in a filter expression."""
+    assert parser.parse('foo[.a.b == 1]').relative
+    assert parser.parse('foo[[.a][0]]').relative
+    assert parser.parse('foo[{x: .a}.x]').relative
+    assert not parser.parse('foo[bar[.a]]').relative
+    assert parser.parse('foo[.bar[.a]]').relative
+
+
+def test_node_info(parser):
+    info = parser.parse('foo.bar[.a > 1 && baz] + [1, 2]|length').info
+    assert not info.relative
+    assert not info.constant
+    assert info.depth == 5
+    assert info.size == 13
+    assert info.identifiers == frozenset(['foo', 'baz'])
+
+    ast = parser.parse('foo[.a == (1 + 2) * 3]')
+    assert ast.expression.info.relative
+    assert ast.expression.right.info == NodeInfo(
+        relative=False, constant=True, depth=3, size=5, identifiers=frozenset()
+    )
+    assert not parser.parse('{a: [1, x]}').info.constant
+    assert parser.parse('{a: [1, -2]}').info.constant
+
+
+def test_long_chains(parser):
+    ast = parser.parse('a[' + ' + '.join(['.x'] * 2000) + ']')
+    assert ast.relative
+
+    ast = parser.parse(' + '.join(['1'] * 2000))
+    assert ast.left.left.root() is ast
+
+
+def test_attribute_all_operands(parser):
+    assert parser.parse('"foo".length + {foo: "bar"}.foo') == BinaryExpression(
         operator=_ops['+'],
         left=Identifier('length', subject=Literal('foo')),
         right=Identifier(
@@ -255,8 +299,8 @@ def test_attribute_all_operands():
     )
 
 
-def test_attribute_subexpression():
-    assert DefaultParser().parse('("foo" + "bar").length') == Identifier(
+def test_attribute_subexpression(parser):
+    assert parser.parse('("foo" + "bar").length') == Identifier(
         value='length',
         subject=BinaryExpression(
             operator=_ops['+'],
@@ -266,8 +310,8 @@ def test_attribute_subexpression():
     )
 
 
-def test_attribute_array():
-    assert DefaultParser().parse('["foo", "bar"].length') == Identifier(
+def test_attribute_array(parser):
+    assert parser.parse('["foo", "bar"].length') == Identifier(
         value='length',
         subject=ArrayLiteral([
             Literal('foo'),
@@ -276,8 +320,8 @@ def test_attribute_array():
     )
 
 
-def test_identifier_filter_expression():
-    assert DefaultParser().parse('foo.bar["baz"]') == FilterExpression(
+def test_identifier_filter_expression(parser):
+    assert parser.parse('foo.bar["baz"]') == FilterExpression(
         expression=Literal('baz'),
         subject=Identifier(
             value='bar',
@@ -288,16 +332,16 @@ def test_identifier_filter_expression():
     )
 
 
-def test_ternary_expression():
-    assert DefaultParser().parse('foo ? 1 : 0') == ConditionalExpression(
+def test_ternary_expression(parser):
+    assert parser.parse('foo ? 1 : 0') == ConditionalExpression(
         test=Identifier('foo'),
         consequent=Literal(1),
         alternate=Literal(0)
     )
 
 
-def test_nested_grouped_ternary_expression():
-    assert DefaultParser().parse('foo ? (bar ? 1 : 2) : 3') == ConditionalExpression(
+def test_nested_grouped_ternary_expression(parser):
+    assert parser.parse('foo ? (bar ? 1 : 2) : 3') == ConditionalExpression(
         test=Identifier('foo'),
         consequent=ConditionalExpression(
             test=Identifier('bar'),
@@ -308,8 +352,8 @@ def test_nested_grouped_ternary_expression():
     )
 
 
-def test_nested_non_grouped_ternary_expression():
-    assert DefaultParser().parse('foo ? bar ? 1 : 2 : 3') == ConditionalExpression(
+def test_nested_non_grouped_ternary_expression(parser):
+    assert parser.parse('foo ? bar ? 1 : 2 : 3') == ConditionalExpression(
         test=Identifier('foo'),
         consequent=ConditionalExpression(
             test=Identifier('bar'),
@@ -320,8 +364,8 @@ def test_nested_non_grouped_ternary_expression():
     )
 
 
-def test_object_ternary_expression():
-    assert DefaultParser().parse('foo ? {bar: "tek"} : "baz"') == ConditionalExpression(
+def test_object_ternary_expression(parser):
+    assert parser.parse('foo ? {bar: "tek"} : "baz"') == ConditionalExpression(
         test=Identifier('foo'),
         consequent=ObjectLiteral({
             'bar': Literal('tek')
@@ -330,17 +374,42 @@ def test_object_ternary_expression():
     )
 
 
-def test_complex_binary_operator_balancing():
-    assert DefaultParser().parse('a.b == c.d') == BinaryExpression(
+def test_complex_binary_operator_balancing(parser):
+    assert parser.parse('a.b == c.d') == BinaryExpression(
         operator=_ops['=='],
         left=Identifier('b', subject=Identifier('a')),
         right=Identifier('d', subject=Identifier('c'))
     )
 
 
-def test_arbitrary_whitespace():
-    assert DefaultParser().parse('\t2\r\n+\n\r3\n\n') == BinaryExpression(
+def test_arbitrary_whitespace(parser):
+    assert parser.parse('\t2\r\n+\n\r3\n\n') == BinaryExpression(
         operator=_ops['+'],
         left=Literal(2),
         right=Literal(3)
     )
+
+
+def test_pickle(parser):
+    ast = parser.parse('a.b + 1 > 2 && !c[.x|t(1)] ? {k: [1]} : d[0]')
+    unpickled = pickle.loads(pickle.dumps(ast, 2))
+    assert unpickled == ast
+
+    # Default operators unpickle as themselves, and parent links are
+    # restored.
+    assert unpickled.test.operator is _ops['&&']
+    assert unpickled.test.left.parent is unpickled.test
+    assert unpickled.info == ast.info
+
+
+def test_pickle_and_compare_long_chains(parser):
+    ast = parser.parse(' + '.join(['a'] * 5000))
+    copy = parser.parse(' + '.join(['a'] * 5000))
+    assert copy == ast
+    assert hash(copy) == hash(ast)
+    assert copy != parser.parse(' + '.join(['a'] * 4999))
+    assert repr(ast).count('Identifier') == 5000
+
+    unpickled = pickle.loads(pickle.dumps(ast, 2))
+    assert unpickled == ast
+    assert unpickled.left.parent is unpickled
@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+import pytest
+
+from pyjexl.evaluator import Context
+from pyjexl.paths import accessor, get_attribute, get_item, get_nothing, resolve
+
+
+Pair = namedtuple('Pair', ['left', 'right'])
+
+
+class Record(object):
+    value = 1
+
+    @property
+    def double(self):
+        return self.value * 2
+
+
+def test_resolve_mappings():
+    assert resolve({'a': {'b': 1}}, ('a', 'b')) == 1
+    assert resolve({'a': {}}, ('a', 'b')) is None
+    assert resolve(Context({'a': 2}), ('a',)) == 2
+    with pytest.raises(AttributeError):
+        resolve({}, ('a', 'b'))
+
+
+def test_resolve_attributes():
+    assert resolve({'r': Record()}, ('r', 'double'), True) == 2
+    assert resolve(Pair(Record(), None), ('left', 'value'), True) == 1
+    assert resolve((1, 2), ('left',), True) is None
+    assert resolve({'a': None}, ('a', 'b', 'c'), True) is None
+    assert resolve(Record(), ('__class__',), True) is None
+
+
+@pytest.mark.parametrize('value_type,expected', [
+    (dict, get_item),
+    (Context, get_item),
+    (type(None), get_nothing),
+    (int, get_nothing),
+    (bool, get_nothing),
+    (type(u''), get_nothing),
+    (list, get_nothing),
+    (Pair, get_attribute),
+    (Record, get_attribute),
+])
+def test_accessor(value_type, expected):
+    assert accessor(value_type) is expected
+    assert accessor(value_type) is expected
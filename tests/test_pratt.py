@@ -0,0 +1,148 @@
+import pytest
+
+from pyjexl.exceptions import ParseError
+from pyjexl.jexl import JEXL
+
+from . import DefaultParser, DefaultPrattParser
+
+
+def parse_or_error(parser, expression):
+    try:
+        return JEXL(parser=parser).parse(expression)
+    except ParseError:
+        return ParseError
+
+
+@pytest.mark.parametrize('expression', [
+    '1',
+    '-1',
+    '-1.5',
+    '1.5.foo',
+    '1 - -1',
+    '1-1',
+    '1 -1',
+    '- 1',
+    '"foo"',
+    "'f\\'oo'",
+    '"\\n"',
+    'true',
+    'false',
+    'foo',
+    '.foo',
+    '.foo.bar',
+    'foo.bar.baz',
+    'foo .bar',
+    'foo. bar',
+    'foo|bar',
+    'foo | bar',
+    'foo|bar(1)',
+    'foo|bar (1)',
+    'foo|bar()',
+    'foo|bar(1, "a", [2, 3])|baz.qux',
+    'foo[0]',
+    'foo [0]',
+    'foo[.bar == 1][0].baz',
+    'foo[bar[.baz]]',
+    '[]',
+    '[1, 2, [3, 4]]',
+    '[1, 2,]',
+    '{}',
+    '{a: 1, b: {c: [2]}}',
+    '{true: 1, in: 2}',
+    '{"a": 1}',
+    '{a: 1,}',
+    '1 + 2 * 3 - 4 / 5 // 6 % 7 ^ 8',
+    '1 == 2 != 3 >= 4 > 5 <= 6 < 7',
+    'a && b || c && d',
+    '"a" in ["a", "b"]',
+    'a in b in c',
+    '!a',
+    '!!a.b|c',
+    '1 * !true - 2',
+    '(1 + 2) * 3',
+    '((1))',
+    'a ? b : c',
+    'a ? b ? c : d : e',
+    'a ? b : c ? d : e',
+    'a + 1 ? {b: 1} : [c]',
+    '(a ? b : c) ? d : e',
+    'a ? b',
+    '1 +',
+    '+ 1',
+    '(1',
+    '1)',
+    '"unterminated',
+    '@',
+    '',
+    '   ',
+    '\t1\n+\r\n2 ',
+    '$foo_bar1',
+    'foo.$bar',
+    # Booleans and word-like operators don't need a word boundary.
+    'truex',
+    'false1',
+    'falsey',
+    'trueina',
+    'trueina.b',
+    'true1a',
+    '2.5inx',
+    'a inb',
+    'ain',
+    'inx',
+    'a|truex',
+    '.truex',
+    '{truex: 1}',
+])
+def test_matches_parsimonious_parser(expression):
+    expected = parse_or_error('parsimonious', expression)
+    assert parse_or_error('pratt', expression) == expected
+
+
+def test_long_chains():
+    expression = ' && '.join('foo.bar{} == {}'.format(i, i) for i in range(200))
+    assert DefaultPrattParser().parse(expression) == DefaultParser().parse(expression)
+
+
+def test_custom_operators():
+    jexl = JEXL(parser='pratt')
+    jexl.add_binary_operator('=', 50, lambda x, y: x + y)
+    jexl.add_binary_operator('@', 100, lambda x, y: x / y)
+    jexl.add_binary_operator('and', 10, lambda x, y: x and y)
+    jexl.add_unary_operator('~', lambda x: -x)
+
+    assert jexl.evaluate('(3 = 6) @ 3') == 3
+    assert jexl.evaluate('3 = 6 @ 3') == 5
+    assert jexl.evaluate('~3 = 1') == -2
+    assert jexl.evaluate('1 and 2') == 2
+
+
+@pytest.mark.parametrize('expression', ['nota', 'not a', '1 andb', '1andnotb', 'notand', 'a and'])
+def test_custom_word_operators_match_parsimonious_parser(expression):
+    # Each JEXL has its own custom Operators, so the trees are compared
+    # by repr.
+    results = []
+    for parser in JEXL.parsers:
+        jexl = JEXL(parser=parser)
+        jexl.add_binary_operator('and', 10, lambda x, y: x and y)
+        jexl.add_unary_operator('not', lambda x: not x)
+        try:
+            results.append(repr(jexl.parse(expression)))
+        except ParseError:
+            results.append(ParseError)
+    assert results[0] == results[1]
+
+
+def test_removed_operator():
+    jexl = JEXL(parser='pratt')
+    jexl.remove_binary_operator('+')
+    with pytest.raises(ParseError):
+        jexl.evaluate('2 + 4')
+
+    # Negative numbers don't depend on the subtraction operator.
+    jexl.remove_binary_operator('-')
+    assert jexl.evaluate('-4') == -4
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        JEXL(parser='foo')
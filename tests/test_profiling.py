@@ -0,0 +1,169 @@
+import pytest
+
+from pyjexl.evaluator import EvaluationBudget
+from pyjexl.exceptions import BudgetExceededError
+from pyjexl.jexl import JEXL
+from pyjexl.profiling import Hooks, InstrumentedEvaluator, positions, Profiler
+
+from . import default_config, DefaultParser
+
+
+class FakeClock(object):
+    """A clock that advances by one second every time it's read."""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class RecordingHooks(Hooks):
+    def __init__(self):
+        self.calls = []
+
+    def around_parse(self, expression, parse):
+        self.calls.append(('parse', expression))
+        return super(RecordingHooks, self).around_parse(expression, parse)
+
+    def around_evaluate(self, expression, ast, context, evaluate):
+        self.calls.append(('evaluate', expression))
+        return super(RecordingHooks, self).around_evaluate(expression, ast, context, evaluate)
+
+    def around_visit(self, node, context, visit):
+        self.calls.append(('visit', type(node).__name__))
+        return super(RecordingHooks, self).around_visit(node, context, visit)
+
+    def around_transform(self, name, transform, args):
+        self.calls.append(('transform', name, args))
+        return super(RecordingHooks, self).around_transform(name, transform, args)
+
+
+def make_jexl(**kwargs):
+    jexl = JEXL(**kwargs)
+    jexl.add_transform('add', lambda value, amount: value + amount)
+    return jexl
+
+
+@pytest.mark.parametrize('backend', JEXL.backends)
+def test_hooks(backend):
+    hooks = RecordingHooks()
+    jexl = make_jexl(backend=backend, hooks=hooks)
+    assert jexl.evaluate('a.b|add(2) + 1', {'a': {'b': 1}}) == 4
+    assert hooks.calls == [
+        ('parse', 'a.b|add(2) + 1'),
+        ('evaluate', 'a.b|add(2) + 1'),
+        ('visit', 'BinaryExpression'),
+        ('visit', 'Transform'),
+        ('visit', 'Identifier'),
+        ('visit', 'Identifier'),
+        ('visit', 'Literal'),
+        ('transform', 'add', [1, 2]),
+        ('visit', 'Literal'),
+    ]
+
+
+def test_hooks_can_be_changed():
+    jexl = make_jexl()
+    assert jexl.evaluate('1|add(1)') == 2
+
+    jexl.hooks = hooks = RecordingHooks()
+    assert jexl.evaluate('1|add(1)') == 2
+    assert ('transform', 'add', [1, 1]) in hooks.calls
+
+    jexl.hooks = None
+    del hooks.calls[:]
+    assert jexl.evaluate('1|add(1)') == 2
+    assert hooks.calls == []
+
+
+def test_hooks_with_budget():
+    hooks = RecordingHooks()
+    jexl = make_jexl(hooks=hooks, budget=EvaluationBudget(max_nodes=3))
+    assert jexl.evaluate('1 + 1') == 2
+    assert len([call for call in hooks.calls if call[0] == 'visit']) == 3
+    with pytest.raises(BudgetExceededError):
+        jexl.evaluate('1 + 1 + 1')
+
+
+def test_instrumented_evaluator_visits_chain_links():
+    hooks = RecordingHooks()
+    evaluator = InstrumentedEvaluator(default_config, hooks)
+    tree = DefaultParser().parse('a.b.c')
+    assert evaluator.evaluate(tree, {'a': {'b': {'c': 5}}}) == 5
+    assert hooks.calls == [('visit', 'Identifier')] * 3
+
+
+def test_hooks_with_long_chains():
+    hooks = RecordingHooks()
+    jexl = make_jexl(hooks=hooks)
+    assert jexl.evaluate(' + '.join(['a'] * 5000), {'a': 1}) == 5000
+    visits = [call for call in hooks.calls if call[0] == 'visit']
+    assert visits.count(('visit', 'BinaryExpression')) == 4999
+    assert visits.count(('visit', 'Identifier')) == 5000
+
+    profiler = Profiler(clock=FakeClock())
+    jexl = make_jexl(hooks=profiler)
+    expression = 'a' + '.a' * 5000
+    context = 'leaf'
+    for _ in range(5001):
+        context = {'a': context}
+    assert jexl.evaluate(expression, context) == 'leaf'
+    tree = jexl.parse(expression)
+    assert profiler.node_stats(tree).count == 1
+    assert profiler.node_stats(tree.subject.subject).count == 1
+
+
+def test_positions():
+    tree = DefaultParser().parse('a[.b > 1] ? [x, {k: y}] : z')
+    assert [(position, depth) for position, depth, node in positions(tree)] == [
+        ('(root)', 0),
+        ('test', 1),
+        ('test.expression', 2),
+        ('test.expression.left', 3),
+        ('test.expression.right', 3),
+        ('test.subject', 2),
+        ('consequent', 1),
+        ('consequent.value[0]', 2),
+        ('consequent.value[1]', 2),
+        ('consequent.value[1].value[k]', 3),
+        ('alternate', 1),
+    ]
+
+
+EXPRESSION = 'items[.v > 1][0].v|add(10) == 12'
+
+
+def test_profiler():
+    profiler = Profiler(clock=FakeClock())
+    jexl = make_jexl(hooks=profiler)
+    context = {'items': [{'v': 1}, {'v': 2}, {'v': 3}]}
+    for _ in range(2):
+        jexl.evaluate(EXPRESSION, context)
+
+    assert profiler.parses[EXPRESSION].count == 1
+    assert profiler.expressions[EXPRESSION].count == 2
+    assert profiler.transforms['add'].count == 2
+    assert profiler.transforms['add'].total == 2
+    assert profiler.operators['>'].count == 6
+    assert profiler.operators['=='].count == 2
+
+    tree = jexl.parse(EXPRESSION)
+    assert profiler.node_stats(tree).count == 2
+    assert profiler.node_stats(tree.left.subject.subject.subject.expression).count == 6
+    assert profiler.node_stats(DefaultParser().parse('1')) is None
+
+    report = profiler.report(EXPRESSION)
+    assert report.startswith('expression: ' + EXPRESSION + '\n')
+    assert 'BinaryExpression == at (root)' in report
+    assert 'Transform |add at left' in report
+    assert '       6' in report
+
+    full_report = profiler.report()
+    assert full_report.startswith(report)
+    assert 'transform' in full_report and 'operator' in full_report
+
+    profiler.reset()
+    assert profiler.report() == ''
+    with pytest.raises(KeyError):
+        profiler.report('1 + 1')
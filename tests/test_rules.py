@@ -0,0 +1,223 @@
+import pytest
+
+from pyjexl.evaluator import EvaluationBudget
+from pyjexl.exceptions import BudgetExceededError
+from pyjexl.jexl import JEXL
+from pyjexl.rules import RuleSet
+
+from . import DefaultParser
+
+
+def counting_jexl(pure=True):
+    jexl = JEXL()
+    calls = []
+
+    @jexl.transform(pure=pure)
+    def count(value):
+        calls.append(value)
+        return value
+
+    return jexl, calls
+
+
+def test_node_hash_is_structural():
+    parser = DefaultParser()
+    left = parser.parse('foo.bar == [1, {a: 2}] && baz|t(1)')
+    right = parser.parse('foo.bar == [1, {a: 2}] && baz|t(1)')
+    assert left is not right
+    assert hash(left) == hash(right)
+    assert len({left, right}) == 1
+    assert parser.parse('foo.bar') != parser.parse('foo.baz')
+
+
+def test_evaluate_returns_results_by_rule_id():
+    rules = RuleSet(JEXL())
+    rules.add('a', 'channel == "release"')
+    rules.add('b', 'version > 60 && channel == "release"')
+    rules.add('c', 'version')
+
+    results = rules.evaluate({'channel': 'release', 'version': 59})
+    assert list(results.items()) == [('a', True), ('b', False), ('c', 59)]
+    assert rules.evaluate({'channel': 'beta', 'version': 61}) == {
+        'a': False, 'b': False, 'c': 61
+    }
+
+
+def test_shared_subtrees_are_evaluated_once_per_context():
+    jexl, calls = counting_jexl()
+    rules = RuleSet(jexl, {
+        'a': 'foo|count == 1',
+        'b': 'foo|count > 0',
+        'c': '(foo|count + 1) * (foo|count + 1)',
+    })
+
+    assert rules.evaluate({'foo': 1}) == {'a': True, 'b': True, 'c': 4}
+    assert calls == [1]
+    assert rules.evaluate({'foo': 2}) == {'a': False, 'b': True, 'c': 9}
+    assert calls == [1, 2]
+
+
+def test_impure_transforms_are_not_shared():
+    jexl, calls = counting_jexl(pure=False)
+    rules = RuleSet(jexl, {'a': 'foo|count', 'b': 'foo|count'})
+    rules.evaluate({'foo': 1})
+    assert calls == [1, 1]
+
+
+def test_relative_subtrees_are_not_shared():
+    jexl, calls = counting_jexl()
+    rules = RuleSet(jexl, {
+        'a': 'items[.x|count > 1]',
+        'b': 'items[.x|count > 1][0].x',
+        'c': 'other[.x|count > 1]',
+    })
+    context = {
+        'items': [{'x': 1}, {'x': 2}],
+        'other': [{'x': 3}],
+    }
+
+    results = rules.evaluate(context)
+    assert results['a'] == [{'x': 2}]
+    assert results['c'] == [{'x': 3}]
+    # The filter over items is shared, but .x|count can't be shared
+    # between elements or with the filter over other.
+    assert calls == [1, 2, 3]
+
+
+def test_literal_types_are_not_merged():
+    rules = RuleSet(JEXL(), {
+        'int': '[1, 2][1]',
+        'bool': '[1, 2][true]',
+    })
+    assert rules.evaluate() == {'int': 2, 'bool': [1, 2]}
+
+
+def test_folded_literals():
+    rules = RuleSet(JEXL(optimize=True), {
+        'list': 'locale in ["en-US", "de"]',
+        'same_list': '["en-US", "de"][1] == locale',
+        'dict': '{a: {b: [1, 2]}}.a.b[1] == 2',
+        'other_dict': '{a: {b: [1, true]}}.a.b[1]',
+    })
+    assert rules.evaluate({'locale': 'de'}) == {
+        'list': True, 'same_list': True, 'dict': True, 'other_dict': True
+    }
+
+
+def test_on_error():
+    rules = RuleSet(JEXL(), {'bad': 'foo|missing', 'good': 'foo'})
+    with pytest.raises(Exception):
+        rules.evaluate({'foo': 1})
+
+    errors = []
+    results = rules.evaluate({'foo': 1}, on_error=lambda rule_id, error: errors.append(rule_id))
+    assert results == {'good': 1}
+    assert errors == ['bad']
+
+
+def test_remove_and_config_changes():
+    jexl, calls = counting_jexl(pure=False)
+    rules = RuleSet(jexl, {'a': 'foo|count', 'b': 'foo|count', 'c': 'foo'})
+    rules.remove('c')
+    assert 'c' not in rules
+    assert len(rules) == 2
+
+    jexl.add_transform('count', jexl.config.transforms['count'], pure=True)
+    assert rules.evaluate({'foo': 1}) == {'a': 1, 'b': 1}
+    assert calls == [1]
+
+
+def test_index_skips_rules_that_cannot_match():
+    jexl, calls = counting_jexl()
+    rules = RuleSet(jexl, {
+        'beta': 'channel == "beta" && locale in ["en-US", "de"] && 1|count',
+        'release': '"release" == channel && 2|count',
+        'any': 'channel && 3|count',
+        'late': 'version > 1 && channel == "release" && 4|count',
+    })
+
+    results = rules.evaluate({'channel': 'release', 'locale': 'de', 'version': 0})
+    assert results == {'beta': False, 'release': 2, 'any': 3, 'late': False}
+    assert sorted(calls) == [2, 3]
+
+    del calls[:]
+    results = rules.evaluate({'channel': 'beta', 'locale': 'fr', 'version': 2})
+    assert results == {'beta': False, 'release': False, 'any': 3, 'late': False}
+    assert calls == [3]
+
+
+def test_index_keeps_rules_with_unindexable_values():
+    rules = RuleSet(JEXL(), {
+        'nested': 'user.country == "CA" && 1',
+        'list': 'tags == "a" || tags',
+        'member': 'tags in [["a"]] && 2',
+    })
+    assert rules.evaluate({'user': {'country': 'CA'}, 'tags': ['a']}) == {
+        'nested': 1, 'list': ['a'], 'member': 2
+    }
+
+    with pytest.raises(AttributeError):
+        rules.evaluate({'user': 'CA'})
+
+
+@pytest.mark.parametrize('context', [
+    {},
+    {'channel': 'beta'},
+    {'channel': 'beta', 'locale': 'de', 'version': 3},
+    {'channel': 'release', 'locale': 'en-US', 'version': 1.0, 'flag': True},
+    {'channel': 1, 'locale': None, 'version': True, 'flag': 0},
+    {'channel': ['beta'], 'locale': {'a': 1}, 'version': '3'},
+])
+def test_index_matches_brute_force(context):
+    jexl = JEXL()
+    expressions = {
+        'a': 'channel == "beta"',
+        'b': 'channel == "beta" && locale in ["en-US", "de"] && version > 2',
+        'c': 'locale in ["de"] && channel == "beta"',
+        'd': 'version == 1 && flag',
+        'e': 'version == true && flag == false',
+        'f': 'flag && channel == "beta"',
+        'g': 'channel == "beta" && channel == "release"',
+        'h': 'channel in "beta" && 1',
+        'i': 'channel == 1 || locale',
+        'j': 'version in [1, 3] && channel != "beta"',
+    }
+
+    def brute_force(expression):
+        try:
+            return jexl.evaluate(expression, context)
+        except Exception as error:
+            return type(error)
+
+    errors = {}
+    results = RuleSet(jexl, expressions).evaluate(
+        context, on_error=lambda rule_id, error: errors.update({rule_id: type(error)})
+    )
+    results.update(errors)
+
+    # Compare types too, since False == 0.
+    assert dict((key, (type(value), value)) for key, value in results.items()) == dict(
+        (rule_id, (type(brute_force(expression)), brute_force(expression)))
+        for rule_id, expression in expressions.items()
+    )
+
+
+def test_long_chains():
+    jexl = JEXL(parser='pratt', optimize=True)
+    chain = ' + '.join(['a'] * 5000)
+    rules = RuleSet(jexl, {'chain': chain, 'more': chain + ' + 1'})
+    assert rules.rules['more'].left is rules.rules['chain']
+    assert rules.evaluate({'a': 1}) == {'chain': 5000, 'more': 5001}
+
+
+def test_budget():
+    jexl = JEXL(budget=EvaluationBudget(max_filter_iterations=3))
+    jexl.add_transform('length', len)
+    rules = RuleSet(jexl, {'small': 'a[.x > 0]|length', 'big': 'b[.x > 0]|length'})
+    context = {'a': [{'x': 1}] * 3, 'b': [{'x': 1}] * 4}
+    errors = []
+    results = rules.evaluate(context, on_error=lambda rule_id, error: errors.append(rule_id))
+    assert results == {'small': 3}
+    assert errors == ['big']
+    with pytest.raises(BudgetExceededError):
+        rules.evaluate(context)
@@ -0,0 +1,95 @@
+import pytest
+
+from pyjexl.exceptions import PrecompiledError
+from pyjexl.jexl import JEXL
+from pyjexl.serialization import dumps, FORMAT_VERSION, HEADER, loads, MAGIC
+
+
+EXPRESSIONS = [
+    '1 + 2 * 3',
+    '-1.5',
+    '!foo',
+    '"a" + \'b\'',
+    'foo.bar.baz',
+    'foo|upper|bar(1, "2")',
+    'foo[.x.y == 1 && .z[.w]]',
+    'foo[0].bar',
+    '{a: 1, b: [2, {c: 3}]}',
+    '[]',
+    'a ? b : c ? d : e',
+]
+
+
+def make_jexl():
+    jexl = JEXL()
+    jexl.add_transform('upper', lambda value: value.upper())
+    return jexl
+
+
+def test_round_trip():
+    jexl = make_jexl()
+    asts = dict((expression, jexl.parse(expression)) for expression in EXPRESSIONS)
+    loaded = loads(dumps(asts, jexl.config), jexl.config)
+    assert loaded == asts
+
+    # Operators are the configured ones, and parents are restored.
+    ast = loaded['1 + 2 * 3']
+    assert ast.operator is jexl.config.binary_operators['+']
+    assert ast.right.parent is ast
+
+
+def test_literal_types_survive():
+    jexl = make_jexl()
+    data = dumps({'x': jexl.parse('[1, 1.0, true, "1"]')}, jexl.config)
+    values = [literal.value for literal in loads(data, jexl.config)['x'].value]
+    assert [type(value) for value in values] == [int, float, bool, type(u'')]
+
+
+def test_precompile_and_load():
+    jexl = make_jexl()
+    data = jexl.precompile(['foo|upper', 'bar[.x > 1]'])
+
+    fresh = make_jexl()
+    fresh.parse = None  # Loaded expressions must not be parsed again.
+    compiled = fresh.load_precompiled(data)
+    assert sorted(compiled) == ['bar[.x > 1]', 'foo|upper']
+    assert fresh.evaluate('foo|upper', {'foo': 'a'}) == 'A'
+    assert fresh.evaluate('bar[.x > 1]', {'bar': [{'x': 1}, {'x': 2}]}) == [{'x': 2}]
+
+
+def test_long_chains():
+    jexl = JEXL(parser='pratt')
+    expression = ' + '.join(['a'] * 5000)
+    data = jexl.precompile([expression])
+
+    fresh = JEXL(parser='pratt')
+    assert fresh.load_precompiled(data)[expression].ast == jexl.parse(expression)
+    assert fresh.evaluate(expression, {'a': 1}) == 5000
+
+
+def test_rejects_stale_data():
+    data = make_jexl().precompile(['foo + 1'])
+
+    changed = make_jexl()
+    changed.add_transform('lower', lambda value: value.lower())
+    with pytest.raises(PrecompiledError):
+        changed.load_precompiled(data)
+
+    changed = make_jexl()
+    changed.add_binary_operator('+', 30, lambda a, b: a - b)
+    with pytest.raises(PrecompiledError):
+        changed.load_precompiled(data)
+
+
+def test_rejects_invalid_data():
+    jexl = make_jexl()
+    data = jexl.precompile(['foo + 1'])
+
+    with pytest.raises(PrecompiledError):
+        jexl.load_precompiled(b'JE')
+    with pytest.raises(PrecompiledError):
+        jexl.load_precompiled(b'XXXX' + data[4:])
+    with pytest.raises(PrecompiledError):
+        jexl.load_precompiled(HEADER.pack(MAGIC, FORMAT_VERSION + 1, b'\0' * 20) + data[26:])
+    with pytest.raises(PrecompiledError):
+        jexl.load_precompiled(data[:HEADER.size] + b'garbage')
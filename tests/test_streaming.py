@@ -0,0 +1,98 @@
+import pytest
+
+from pyjexl.evaluator import Context
+from pyjexl.jexl import JEXL
+from pyjexl.streaming import FilteredView, StreamingEvaluator
+
+from . import default_config, DefaultParser
+
+
+def tree(expression):
+    return DefaultParser().parse(expression)
+
+
+@pytest.fixture
+def events():
+    return [{'type': 'click' if i % 3 else 'view', 'ts': i} for i in range(100)]
+
+
+def counting_jexl():
+    """A streaming JEXL with a check transform that counts its calls."""
+    jexl = JEXL(backend='streaming')
+    calls = []
+
+    @jexl.transform()
+    def check(value):
+        calls.append(value)
+        return value
+
+    return jexl, calls
+
+
+def test_results_are_lists(events):
+    evaluator = StreamingEvaluator(default_config)
+    context = Context({'events': events})
+    result = evaluator.evaluate(tree('events[.type == "view"][.ts > 90]'), context)
+    assert result == [{'type': 'view', 'ts': 93}, {'type': 'view', 'ts': 96},
+                      {'type': 'view', 'ts': 99}]
+    assert isinstance(result, list)
+
+    result = evaluator.evaluate(tree('{a: events[.ts < 2]}'), context)
+    assert result == {'a': events[:2]}
+
+
+def test_index_stops_at_match(events):
+    jexl, calls = counting_jexl()
+    assert jexl.evaluate('events[.ts|check > 10][0].ts', {'events': events}) == 11
+    assert calls == list(range(12))
+
+    del calls[:]
+    assert jexl.evaluate('events[.ts|check > 10][2].ts', {'events': events}) == 13
+    assert calls == list(range(14))
+
+    del calls[:]
+    assert jexl.evaluate('events[.ts|check > 10][200]', {'events': events}) is None
+    assert len(calls) == 100
+
+
+def test_chained_filters_are_fused(events):
+    jexl, calls = counting_jexl()
+    result = jexl.evaluate(
+        'events[.type == "click"][.ts|check > 50][0]', {'events': events}
+    )
+    assert result == {'type': 'click', 'ts': 52}
+    # The second filter only sees the clicks, and only up to the match.
+    assert calls == [ts for ts in range(53) if ts % 3]
+
+
+def test_membership_stops_at_match(events):
+    jexl, calls = counting_jexl()
+    context = {'events': events}
+    assert jexl.evaluate('{type: "view", ts: 6} in events[.ts|check > 0]', context)
+    assert calls == list(range(7))
+    assert not jexl.evaluate('{type: "view", ts: 7} in events[.ts|check > 0]', context)
+
+
+def test_materialized_at_boundaries(events):
+    jexl = JEXL(backend='streaming')
+    received = []
+
+    @jexl.transform()
+    def record(value):
+        received.append(value)
+        return len(value)
+
+    context = {'events': events}
+    assert jexl.evaluate('events[.ts < 5]|record', context) == 5
+    assert received == [events[:5]]
+    assert jexl.evaluate('events[.ts < 5][-1].ts', context) == 4
+    assert jexl.evaluate('events[.ts < 5][true][4].ts', context) == 4
+    assert jexl.evaluate('events[.ts < 5] == events[.ts < 5]', context) is True
+    assert jexl.evaluate('events[.ts > 200] ? 1 : 2', context) == 2
+
+
+def test_view_iterates_source_once(events):
+    evaluator = StreamingEvaluator(default_config)
+    view = FilteredView(evaluator, events, [tree('.ts > 95')], Context())
+    assert view.fuse(tree('.type == "view"')).item(0) == {'type': 'view', 'ts': 96}
+    assert list(view) == events[96:]
@@ -0,0 +1,116 @@
+import pytest
+
+from pyjexl.evaluator import EvaluationBudget
+from pyjexl.exceptions import MissingTransformError
+from pyjexl.jexl import JEXL
+
+np = pytest.importorskip('numpy')
+
+
+COLUMNS = {
+    'version': np.array([58, 59, 60, 61]),
+    'ratio': np.array([0.5, 0.0, 2.0, 1.5]),
+    'normandy.channel': np.array(['release', 'beta', 'release', 'nightly']),
+    'addons': [['a'], [], ['a', 'b'], ['c']],
+    'studies': [[{'id': 1}], [{'id': 2}, {'id': 3}], [], [{'id': 3}]],
+}
+
+
+def rows():
+    for index in range(4):
+        yield {
+            'version': int(COLUMNS['version'][index]),
+            'ratio': float(COLUMNS['ratio'][index]),
+            'normandy': {'channel': str(COLUMNS['normandy.channel'][index])},
+            'addons': COLUMNS['addons'][index],
+            'studies': COLUMNS['studies'][index],
+        }
+
+
+@pytest.fixture
+def jexl():
+    jexl = JEXL()
+    jexl.add_transform('upper', lambda value: value.upper())
+    return jexl
+
+
+@pytest.mark.parametrize('expression', [
+    'version + 1',
+    'version * ratio',
+    'version // 2 % 3',
+    'version ^ 2',
+    'version >= 60 && normandy.channel == "release"',
+    'normandy.channel == "beta" || version',
+    'ratio ? version / ratio : -1',
+    '!ratio',
+    'true + true',
+    'normandy.channel + "!"',
+    'normandy.channel|upper',
+    'normandy',
+    '{v: version}.v',
+    '[version, ratio]',
+    'version in [59, 61]',
+    '"a" in addons',
+    'addons[0]',
+    'studies[.id > 1]',
+    '"constant"',
+])
+def test_matches_evaluator(jexl, expression):
+    expected = [jexl.evaluate(expression, row) for row in rows()]
+    assert jexl.evaluate_columns(expression, COLUMNS).tolist() == expected
+
+
+def test_numeric_results_stay_numeric(jexl):
+    result = jexl.evaluate_columns('version * 2 > 118', COLUMNS)
+    assert result.dtype == bool
+    assert jexl.evaluate_columns('version * ratio', COLUMNS).dtype == float
+
+
+@pytest.mark.parametrize('expression', [
+    '10 ^ 20',
+    '2 ^ 40 * 2 ^ 40',
+    'version * 9223372036854775807',
+    '-9223372036854775807 - version',
+    'version ^ 2 + 1',
+])
+def test_integer_overflow(jexl, expression):
+    expected = [jexl.evaluate(expression, row) for row in rows()]
+    result = jexl.evaluate_columns(expression, COLUMNS).tolist()
+    assert result == expected
+    assert [type(value) for value in result] == [type(value) for value in expected]
+
+
+def test_short_circuit_only_evaluates_selected_rows(jexl):
+    calls = []
+
+    @jexl.transform()
+    def record(value):
+        calls.append(value)
+        return value
+
+    jexl.evaluate_columns('version > 59 && version|record', COLUMNS)
+    assert calls == [60, 61]
+
+    del calls[:]
+    jexl.evaluate_columns('version > 59 ? 0 : version|record', COLUMNS)
+    assert calls == [58, 59]
+
+
+def test_errors_match_evaluator(jexl):
+    with pytest.raises(ZeroDivisionError):
+        jexl.evaluate_columns('version / ratio', COLUMNS)
+    with pytest.raises(MissingTransformError):
+        jexl.evaluate_columns('version|missing', COLUMNS)
+    with pytest.raises(ValueError):
+        jexl.evaluate_columns('a', {'a': [1, 2], 'b': [1]})
+
+
+def test_missing_columns_are_none(jexl):
+    assert jexl.evaluate_columns('missing', COLUMNS).tolist() == [None] * 4
+    assert jexl.evaluate_columns('version', {}).tolist() == []
+
+
+def test_budget_is_refused():
+    jexl = JEXL(budget=EvaluationBudget(max_nodes=10))
+    with pytest.raises(ValueError):
+        jexl.evaluate_columns('a + 1', {'a': [1, 2]})